@@ -1,25 +1,108 @@
+import io
+import json
 import os
+import queue
 import sys
 import time
 import subprocess
 import socket
 import re
 import signal
+import shutil
+import tempfile
+import threading
 import uuid
+import zipfile
 import random # Added for random confidence generation
 from pathlib import Path
-from flask import Flask, render_template, request, url_for
+from flask import Flask, Response, render_template, request, stream_with_context, url_for, jsonify
 from PIL import Image, ImageDraw
 import numpy as np
 
+from reference_detector import ReferenceDetector, window_size
+from detections import non_max_suppression, parse_windows
+from emotion_client import MOCK_MODEL, EmotionClient, wait_until_ready
+from sim_pool import SimulationPool
+from sim_daemon import SimulationDaemon
+from image_corpus import write_hex
+from result_cache import ResultCache
+from jobs import FINISHED_STATES, JobManager, QueueFullError
+import metrics
+
 # Configure paths
 BASE_DIR = Path(__file__).resolve().parent
 STATIC_DIR = BASE_DIR / 'static'
 UPLOAD_DIR = STATIC_DIR / 'uploads'
 SIM_DIR = BASE_DIR / 'sim'
-PREPARED_IMAGES_DIR = SIM_DIR / 'prepared_images'
 VPI_DIR = BASE_DIR / 'vpi'
 EMOTION_SERVER_SCRIPT = BASE_DIR / 'emotion_server.py'
+EMOTION_SERVER_LOG = BASE_DIR / 'emotion_server.log'
+
+# Detection backend: 'reference' (NumPy model of the RTL, fast),
+# 'rtl' (one Icarus Verilog co-simulation per upload),
+# 'verilator' (the same RTL compiled to a native simulator, sim/verilator) or
+# 'daemon' (warm Icarus simulators fed from a job queue, see sim_daemon.py)
+DETECTOR_BACKENDS = ('reference', 'rtl', 'verilator', 'daemon')
+# Simulator executable and interpreter of the per-upload backends
+SIM_EXECS = {'rtl': (SIM_DIR / 'run_sim', 'vvp'),
+             'verilator': (SIM_DIR / 'run_verilator', None)}
+DETECTOR_BACKEND = os.environ.get('DETECTOR_BACKEND', 'reference')
+SIM_TIMEOUT = 15  # Per-simulation timeout in seconds
+# 'first' stops at the first face window; 'all' scans the whole frame in one
+# run, merges overlapping windows (detections.py) and classifies every face
+DETECTION_MODES = ('first', 'all')
+DETECTION_MODE = os.environ.get('DETECTION_MODE', 'first')
+# Extra plusargs for RTL runs. Each run's scratch directory is deleted when
+# it ends, so a trace needs an absolute +WAVE_FILE (every traced run
+# overwrites it), e.g. "+WAVE=control +WAVE_STOP=200000 +WAVE_FILE=/tmp/run.vcd"
+SIM_PLUSARGS = os.environ.get('SIM_PLUSARGS', '').split()
+
+# Result cache: in-memory LRU size, and an optional directory that keeps
+# entries across restarts
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 512))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+
+# Job queue (POST /jobs): analysis workers (0: one per simulation pool
+# worker), uploads allowed to wait before POSTs get "503 busy", the
+# Retry-After hint in seconds, and the server-sent events keepalive interval
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 0))
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', 32))
+JOB_RETRY_AFTER = 5
+JOB_EVENT_KEEPALIVE = 15
+
+# Batch uploads (POST /batch): images per request, files or zip archive
+# members, bytes per image and per batch (uncompressed), and concurrent
+# analyses (0: one per simulation pool worker)
+BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 256))
+BATCH_MAX_IMAGE_BYTES = int(os.environ.get('BATCH_MAX_IMAGE_BYTES', 16 << 20))
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 256 << 20))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 0))
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.gif', '.pgm', '.ppm', '.tif', '.tiff')
+
+# The emotion server's Prometheus metrics port (unset or 0: off), and how
+# long to wait for it to load and warm up its model
+EMOTION_METRICS_PORT = int(os.environ.get('EMOTION_METRICS_PORT') or 0)
+EMOTION_READY_TIMEOUT = int(os.environ.get('EMOTION_READY_TIMEOUT', 60))
+
+# Prometheus metrics (GET /metrics). Stages: save (upload to disk), prepare
+# (prepare_image), simulate (detector run; RTL runs include the VPI
+# emotion call), classify (emotion server calls made from Python), parse
+# (simulator output) and render (result image)
+STAGE_SECONDS = metrics.Histogram('facedet_stage_seconds', 'Latency per pipeline stage', ['stage'])
+ANALYSES = metrics.Counter('facedet_analyses_total', 'Analyzed frames, by result cache hit',
+                           ['cached'])
+SIM_TIMEOUTS = metrics.Counter('facedet_sim_timeouts_total', 'Detector runs that timed out',
+                               ['backend'])
+SIM_ERRORS = metrics.Counter('facedet_sim_errors_total',
+                             'Detector runs that failed, were rejected or cancelled', ['backend'])
+FALLBACK_HITS = metrics.Counter('facedet_fallback_hits_total',
+                                'Timed-out simulations answered from FALLBACK_DATA')
+BATCH_IMAGES = metrics.Histogram('facedet_batch_images', 'Images per /batch request',
+                                 buckets=metrics.SIZE_BUCKETS)
+QUEUE_DEPTH = metrics.Gauge('facedet_queue_depth', 'Waiting and running work per queue',
+                            ['queue', 'state'])
+CACHE_EVENTS = metrics.Counter('facedet_result_cache_total', 'Result cache lookups and evictions',
+                               ['event'])
 
 # Fallback Data for when simulation times out
 FALLBACK_DATA = {
@@ -57,37 +140,103 @@ FALLBACK_DATA = {
 
 # Ensure directories exist
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-PREPARED_IMAGES_DIR.mkdir(parents=True, exist_ok=True)
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = str(UPLOAD_DIR)
+# Any request body, batches included; larger ones get 413. The slack
+# covers the multipart headers.
+app.config['MAX_CONTENT_LENGTH'] = BATCH_MAX_BYTES + (1 << 20)
+
+def parse_detection_output(stdout):
+    """
+    Extracts the face boxes and emotions from simulator-style output.
+    Returns a list of ([x, y, size], emotion or None), in output order.
+    """
+    faces = []
+    for line in stdout.splitlines():
+        # tb_emotion_classifier.v prints: "✓ Face detected at ( 24,  20) size 24"
+        bbox_match = re.search(r"Face detected at \(\s*(\d+),\s*(\d+)\)(?: size (\d+))?", line)
+        # "VPI: Received Result: Happy (confidence: 99.99%)"
+        emotion_match = re.search(r"VPI: Received Result: (.*)", line)
+        if bbox_match:
+            # Fallback data carries no size; those are 24x24 windows
+            size = int(bbox_match.group(3) or 24)
+            faces.append(([int(bbox_match.group(1)), int(bbox_match.group(2)), size], None))
+        elif emotion_match and faces and faces[-1][1] is None:
+            faces[-1] = (faces[-1][0], emotion_match.group(1).strip())
+    return faces
 
 class SystemManager:
-    def __init__(self):
+    def __init__(self, backend=DETECTOR_BACKEND, mode=DETECTION_MODE):
+        if backend not in DETECTOR_BACKENDS:
+            raise ValueError(f"Unknown detector backend: {backend}")
+        if mode not in DETECTION_MODES:
+            raise ValueError(f"Unknown detection mode: {mode}")
+        if mode == 'all' and backend == 'daemon':
+            raise ValueError("The daemon backend reports the first face only; "
+                             "use DETECTION_MODE=first or another backend")
+        self.mode = mode
         self.server_process = None
+        self._server_lock = threading.Lock()
+        self._server_ready = False
+        # Fingerprint of the served model, fetched whenever a server is
+        # (re)started; None while unknown
+        self.model_fingerprint = None
         self.port = 8888
+        self.backend = backend
+        self.reference_detector = None
+        # Worker threads are only spawned once the first simulation is queued
+        sim_exec, interpreter = SIM_EXECS.get(backend, SIM_EXECS['rtl'])
+        self.sim_pool = SimulationPool(sim_exec=sim_exec, vpi_dir=VPI_DIR, timeout=SIM_TIMEOUT,
+                                       interpreter=interpreter)
+        self.sim_daemon = None
+        self._daemon_lock = threading.Lock()
+        # One persistent emotion server connection per request thread
+        self._emotion_clients = threading.local()
+        self.result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_DIR)
 
     def is_port_open(self, port):
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             return s.connect_ex(('localhost', port)) == 0
 
     def start_emotion_server(self):
+        # Concurrent job workers must not launch two servers
+        with self._server_lock:
+            self._start_emotion_server()
+
+    def emotion_server_command(self):
+        cmd = [sys.executable, str(EMOTION_SERVER_SCRIPT), '--port', str(self.port)]
+        if EMOTION_METRICS_PORT:
+            cmd += ['--metrics-port', str(EMOTION_METRICS_PORT)]
+        return cmd
+
+    def _start_emotion_server(self):
         if self.is_port_open(self.port):
-            print(f"Port {self.port} is already in use. Assuming Emotion Server is running.")
+            if not self._server_ready:
+                # A server started elsewhere may still be loading its model
+                print(f"Port {self.port} is already in use. Waiting for the Emotion Server...")
+                wait_until_ready(port=self.port, timeout=EMOTION_READY_TIMEOUT)
+                self._server_ready = True
+                self.model_fingerprint = self.emotion_model()
             return
 
         print(f"Starting Emotion Server on port {self.port}...")
-        self.server_process = subprocess.Popen(
-            [sys.executable, str(EMOTION_SERVER_SCRIPT), '--port', str(self.port)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        # Give it a moment to start
-        time.sleep(2)
-        if self.server_process.poll() is not None:
-            stdout, stderr = self.server_process.communicate()
-            raise RuntimeError(f"Failed to start emotion server:\n{stderr}")
+        # Log to a file: an unread pipe fills up and stalls the server
+        with open(EMOTION_SERVER_LOG, 'w') as log:
+            self.server_process = subprocess.Popen(
+                self.emotion_server_command(),
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                text=True
+            )
+        # Returns once the model is loaded and warmed up
+        try:
+            wait_until_ready(port=self.port, timeout=EMOTION_READY_TIMEOUT,
+                             process=self.server_process)
+        except RuntimeError:
+            raise RuntimeError(f"Failed to start emotion server:\n{EMOTION_SERVER_LOG.read_text()}")
+        self._server_ready = True
+        self.model_fingerprint = self.emotion_model()
         print("Emotion Server started.")
 
     def stop_server(self):
@@ -99,190 +248,599 @@ class SystemManager:
             except subprocess.TimeoutExpired:
                 self.server_process.kill()
             self.server_process = None
+            self._server_ready = False
+            self.model_fingerprint = None
 
-    def prepare_image(self, image_path, unique_id):
-        """Converts image to Verilog-compatible hex format."""
+    def shutdown(self):
+        """Stops the emotion server and cancels queued simulations."""
+        self.stop_server()
+        self.sim_pool.shutdown(cancel_pending=True)
+        if self.sim_daemon:
+            self.sim_daemon.stop()
+            self.sim_daemon = None
+
+    def prepare_image(self, image_path):
+        """Converts image to the 64x64 grayscale frame the detector scans."""
         try:
             img = Image.open(image_path).convert('L')
-            img = img.resize((64, 64), Image.Resampling.LANCZOS)
-            arr = np.array(img)
-            
-            output_filename = f"face_{unique_id}.txt"
-            output_path = PREPARED_IMAGES_DIR / output_filename
-            
-            with open(output_path, 'w') as f:
-                for y in range(64):
-                    for x in range(64):
-                        f.write(f"{arr[y, x]:02x}\n")
-            
-            return output_path, img
+            return img.resize((64, 64), Image.Resampling.LANCZOS)
         except Exception as e:
             raise RuntimeError(f"Failed to prepare image: {e}")
 
+    def write_verilog_input(self, image_array, unique_id):
+        """
+        Writes the frame as the Verilog-compatible hex file run_sim reads,
+        in a private scratch directory under the pool's scratch root (never
+        sim/prepared_images, where it would join the test corpus). Returns
+        (scratch dir, hex file); remove the directory when done.
+        """
+        scratch = Path(tempfile.mkdtemp(prefix=f'upload_{unique_id}_',
+                                        dir=self.sim_pool.scratch_root))
+        output_path = scratch / f"face_{unique_id}.txt"
+        write_hex(image_array, output_path)
+        return scratch, output_path
+
     def run_verilog_simulation(self, image_txt_path, original_filename=None):
-        """Runs the Verilog simulation via VPI."""
-        
-        target_image_txt = SIM_DIR / "image.txt"
-        
-        # Copy content
-        with open(image_txt_path, 'r') as src, open(target_image_txt, 'w') as dst:
-            dst.write(src.read())
-            
-        cmd = [
-            "vvp",
-            f"-M{VPI_DIR}",
-            "-mverilog_python_interface",
-            "run_sim"
-        ]
-        
-        print(f"Running simulation: {' '.join(cmd)}", flush=True)
-        
+        """
+        Runs the Verilog simulation (vvp with the VPI module, or the Verilator
+        executable) in an isolated scratch directory.
+        """
         try:
-            result = subprocess.run(
-                cmd,
-                cwd=SIM_DIR,
-                capture_output=True,
-                text=True,
-                timeout=15 # Timeout in seconds
-            )
-            return result.stdout, result.stderr
-        except subprocess.TimeoutExpired as e:
-            print("Simulation timed out!", flush=True)
-            
-            # Check for fallback
-            if original_filename and original_filename in FALLBACK_DATA:
-                print(f"sto", flush=True)
-                x, y, emotion = FALLBACK_DATA[original_filename]
-                
-                # Generate random confidence between 60 and 90
-                random_confidence = random.uniform(60.0, 90.0)
-                
-                # Construct fallback stdout matching the parser's expectation
-                fallback_stdout = (
-                    f"Face detected at ({x}, {y})\n"
-                    f"VPI: Received Result: {emotion} (confidence: {random_confidence:.2f}%)\n"
-                )
-                return fallback_stdout, ""
-            
-            # Attempt to recover partial output if face was detected
-            partial_stdout = e.stdout if e.stdout else ""
-            if "Face detected at" in partial_stdout:
-                 print("Recovering face detection from partial output...", flush=True)
-                 return partial_stdout, "Simulation timed out, but face was detected."
-
-            return None, "Simulation timed out"
+            plusargs = [f'+EMOTION_PORT={self.port}', *SIM_PLUSARGS]
+            if self.mode == 'all':
+                plusargs.append('+ALL_FACES')
+            job = self.sim_pool.submit(image_txt_path, plusargs=plusargs, block=False)
+            print(f"Queued simulation {job.id} ({self.sim_pool.queued} queued, "
+                  f"{self.sim_pool.running} running)", flush=True)
+            with STAGE_SECONDS.time(stage='simulate'):
+                result = job.result()
         except Exception as e:
+            SIM_ERRORS.inc(backend=self.backend)
             return None, str(e)
 
+        if result.cancelled:
+            SIM_ERRORS.inc(backend=self.backend)
+            return None, "Simulation cancelled"
+
+        if not result.timed_out:
+            return result.stdout, result.stderr
+
+        print("Simulation timed out!", flush=True)
+        SIM_TIMEOUTS.inc(backend=self.backend)
+
+        # Check for fallback
+        if original_filename and original_filename in FALLBACK_DATA:
+            print(f"sto", flush=True)
+            x, y, emotion = FALLBACK_DATA[original_filename]
+            FALLBACK_HITS.inc()
+
+            # Generate random confidence between 60 and 90
+            random_confidence = random.uniform(60.0, 90.0)
+
+            # Construct fallback stdout matching the parser's expectation
+            fallback_stdout = (
+                f"Face detected at ({x}, {y})\n"
+                f"VPI: Received Result: {emotion} (confidence: {random_confidence:.2f}%)\n"
+            )
+            return fallback_stdout, "Simulation timed out, using fallback data."
+
+        # Attempt to recover partial output if face was detected
+        partial_stdout = result.stdout or ""
+        if "Face detected at" in partial_stdout:
+            print("Recovering face detection from partial output...", flush=True)
+            return partial_stdout, "Simulation timed out, but face was detected."
+
+        return None, "Simulation timed out"
+
+    def run_reference_detection(self, image_array):
+        """Runs the NumPy model of the RTL and classifies the ROI."""
+        if self.reference_detector is None:
+            self.reference_detector = ReferenceDetector()
+
+        if self.mode == 'all':
+            with STAGE_SECONDS.time(stage='simulate'):
+                windows = self.reference_detector.detect_all(image_array)
+            return self._classify_windows(image_array, windows)
+        with STAGE_SECONDS.time(stage='simulate'):
+            result = self.reference_detector.detect(image_array)
+        if not result.face_detected:
+            return "No face detected.\n", ""
+        return self._classify_detection(image_array, result.face_x, result.face_y,
+                                        window_size(result.face_scale))
+
+    def start_sim_daemon(self):
+        """Starts the warm simulator(s) once; later calls reuse them."""
+        with self._daemon_lock:
+            if self.sim_daemon is None:
+                print("Starting simulation daemon...", flush=True)
+                self.sim_daemon = SimulationDaemon(frame_timeout=SIM_TIMEOUT).start()
+        return self.sim_daemon
+
+    def run_daemon_detection(self, image_array):
+        """Runs the frame on a warm simulator and classifies the ROI."""
+        try:
+            with STAGE_SECONDS.time(stage='simulate'):
+                result = self.start_sim_daemon().detect(image_array, timeout=2 * SIM_TIMEOUT)
+        except Exception as e:
+            SIM_ERRORS.inc(backend=self.backend)
+            return None, f"Simulation daemon error: {e}"
+
+        if result.timed_out:
+            SIM_TIMEOUTS.inc(backend=self.backend)
+            return None, f"Simulation timed out after {result.cycles} cycles"
+        if not result.face_detected:
+            return "No face detected.\n", ""
+        return self._classify_detection(image_array, result.face_x, result.face_y,
+                                        window_size(result.face_scale))
+
+    def emotion_client(self):
+        """Returns this thread's persistent emotion server connection."""
+        client = getattr(self._emotion_clients, 'client', None)
+        if client is None:
+            client = EmotionClient(port=self.port)
+            self._emotion_clients.client = client
+        return client
+
+    def close_emotion_client(self):
+        """Closes this thread's emotion server connection, if it has one."""
+        client = getattr(self._emotion_clients, 'client', None)
+        if client is not None:
+            self._emotion_clients.client = None
+            client.close()
+
+    def emotion_model(self):
+        """The emotion server's model fingerprint, or None if it is unknown."""
+        try:
+            return self.emotion_client().model()
+        except OSError:
+            return None
+
+    @staticmethod
+    def _crop(image_array, x, y, size):
+        """The size x size window at (x, y), zero-padded past the image edge like the VPI module."""
+        roi = np.zeros((size, size), dtype=np.uint8)
+        window = image_array[y:y + size, x:x + size]
+        roi[:window.shape[0], :window.shape[1]] = window
+        return roi
+
+    def _classify_detection(self, image_array, x, y, size=24):
+        """Sends the detected face window to the emotion server."""
+        # Same output format as tb_emotion_classifier.v and the VPI module
+        stdout = f"Face detected at ({x}, {y}) size {size}\n"
+        try:
+            with STAGE_SECONDS.time(stage='classify'):
+                response = self.emotion_client().classify(x, y, size, size,
+                                                          self._crop(image_array, x, y, size))
+            stdout += f"VPI: Received Result: {response}\n"
+            return stdout, ""
+        except OSError as e:
+            return stdout, f"Emotion server error: {e}"
+
+    def _classify_windows(self, image_array, windows, stdout=""):
+        """
+        Merges all-faces windows with non-max suppression and classifies
+        every remaining face in one pipelined request.
+        """
+        faces, _ = non_max_suppression(windows)
+        faces = faces.tolist()
+        stdout += f"{len(windows)} windows passed, {len(faces)} faces after non-max suppression\n"
+        if not faces:
+            return stdout + "No face detected.\n", ""
+
+        rois = [(x, y, s, s, self._crop(image_array, x, y, s)) for x, y, s in faces]
+        try:
+            with STAGE_SECONDS.time(stage='classify'):
+                responses = self.emotion_client().classify_many(rois)
+        except OSError as e:
+            stdout += ''.join(f"Face detected at ({x}, {y}) size {s}\n" for x, y, s in faces)
+            return stdout, f"Emotion server error: {e}"
+        for (x, y, s), response in zip(faces, responses):
+            stdout += f"Face detected at ({x}, {y}) size {s}\nVPI: Received Result: {response}\n"
+        return stdout, ""
+
+    def run_detection(self, image_array, unique_id, original_filename=None):
+        """Runs face detection + emotion classification on the selected backend."""
+        if self.backend == 'reference':
+            return self.run_reference_detection(image_array)
+        if self.backend == 'daemon':
+            return self.run_daemon_detection(image_array)
+        scratch, image_txt_path = self.write_verilog_input(image_array, unique_id)
+        try:
+            # The pool copies the file into its own workdir; the job has
+            # finished (or was never queued) once this returns
+            stdout, stderr = self.run_verilog_simulation(image_txt_path,
+                                                         original_filename=original_filename)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        # A complete all-faces run ends with "<n> windows passed"; timeouts
+        # and fallback data are passed on as they are
+        if self.mode == 'all' and stdout and 'windows passed' in stdout:
+            with STAGE_SECONDS.time(stage='parse'):
+                windows = parse_windows(stdout)
+            return self._classify_windows(image_array, windows, stdout)
+        return stdout, stderr
+
+    def analyze(self, image_array, unique_id, original_filename=None):
+        """
+        Returns the detection and emotion for a prepared 64x64 frame as a
+        dict (face, emotion, faces, stdout, stderr, cached). face and emotion
+        are those of the first face; faces lists every face as {box,
+        emotion}. Identical frames are served from the result cache.
+        """
+        # Emotions depend on the served model as much as on the design
+        model = self.model_fingerprint
+        key = self.result_cache.key(image_array, f"{self.backend}/{self.mode}/{model}")
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            ANALYSES.inc(cached='true')
+            return dict(cached, stderr='', cached=True)
+        ANALYSES.inc(cached='false')
+
+        stdout, stderr = self.run_detection(image_array, unique_id, original_filename)
+        if not stdout:
+            raise RuntimeError(f"Simulation failed: {stderr}")
+
+        with STAGE_SECONDS.time(stage='parse'):
+            faces = parse_detection_output(stdout)
+        face, emotion = faces[0] if faces else (None, None)
+        result = {'face': face, 'emotion': emotion, 'stdout': stdout,
+                  'faces': [{'box': box, 'emotion': e} for box, e in faces]}
+
+        # Only cache complete, real results: a known, real model (the MOCK
+        # classifier answers at random), no timeout / fallback data and an
+        # emotion for every detected face
+        complete = (model not in (None, MOCK_MODEL) and
+                    not stderr.startswith('Simulation timed out') and
+                    all(e for _, e in faces))
+        if complete:
+            self.result_cache.put(key, result)
+        return dict(result, stderr=stderr, cached=False)
+
 system_manager = SystemManager()
 
 @app.route('/', methods=['GET'])
 def index():
     return render_template('index.html')
 
-@app.route('/predict', methods=['POST'])
-def predict():
+def render_result(processed_pil_img, result, filename):
+    """
+    Saves the result image under static/uploads. Returns (result filename,
+    emotion text, faces).
+    """
+    if result['face']:
+        # The coordinates (x, y) are the top-left of a square window in the
+        # 64x64 input, so draw on that version and display it: scaling back
+        # to the original might be misaligned if the aspect ratio changed.
+
+        # Convert grayscale back to RGB for colored boxes, one per face
+        result_img = processed_pil_img.convert("RGB")
+        draw = ImageDraw.Draw(result_img)
+        for face in result['faces']:
+            x, y, s = face['box']
+            draw.rectangle([x, y, x + s, y + s], outline="lime", width=2)
+
+        # Save result
+        result_filename = f"result_{filename}"
+        result_img.save(UPLOAD_DIR / result_filename)
+
+        emotion_result = result['emotion'] or "Unknown (Analysis incomplete)"
+        faces = result['faces']
+    else:
+        # Just show the resized image if no face found
+        result_filename = f"processed_{filename}"
+        processed_pil_img.save(UPLOAD_DIR / result_filename)
+        emotion_result = None
+        faces = []
+    return result_filename, emotion_result, faces
+
+def process_upload(filepath, unique_id, original_filename, progress=None):
+    """
+    Prepares, analyzes and renders one saved upload. Returns a
+    JSON-serializable dict (result_filename, emotion, faces, debug_info);
+    progress, if given, is called with the name of each step.
+    """
+    progress = progress or (lambda stage: None)
+    filename = Path(filepath).name
+
+    # Ensure server is running
+    system_manager.start_emotion_server()
+
+    # 1. Prepare Image
+    progress('preparing')
+    with STAGE_SECONDS.time(stage='prepare'):
+        processed_pil_img = system_manager.prepare_image(filepath)
+
+    # 2. Run Detection (RTL simulation or reference model), or reuse the
+    # result of an identical frame
+    progress('detecting')
+    result = system_manager.analyze(
+        np.array(processed_pil_img), unique_id, original_filename=original_filename)
+
+    # 3. Render Output
+    progress('rendering')
+    stdout, stderr = result['stdout'], result['stderr']
+    debug_info = f"STDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"
+    if result['cached']:
+        debug_info = "(cached result)\n\n" + debug_info
+
+    with STAGE_SECONDS.time(stage='render'):
+        result_filename, emotion_result, faces = render_result(processed_pil_img, result, filename)
+
+    return {'result_filename': result_filename, 'emotion': emotion_result,
+            'faces': faces, 'debug_info': debug_info}
+
+def save_upload():
+    """
+    Saves the uploaded file under a unique name. Returns (filepath,
+    unique_id, original filename), or (None, error message) if there is none.
+    """
     if 'file' not in request.files:
-        return render_template('index.html', error="No file part")
-    
+        return None, "No file part"
+
     file = request.files['file']
     if file.filename == '':
-        return render_template('index.html', error="No selected file")
+        return None, "No selected file"
 
     unique_id = uuid.uuid4().hex[:8]
-    filename = f"{unique_id}_{file.filename}"
-    filepath = UPLOAD_DIR / filename
-    file.save(filepath)
+    filepath = UPLOAD_DIR / f"{unique_id}_{file.filename}"
+    with STAGE_SECONDS.time(stage='save'):
+        file.save(filepath)
+    return (filepath, unique_id, file.filename), None
+
+def result_image_url(rendered):
+    return url_for('static', filename=f"uploads/{rendered['result_filename']}")
+
+# Uploads are analyzed by a bounded pool of job workers, so HTTP threads
+# only save the file and report progress; web capacity does not depend on
+# how long simulations take
+job_manager = JobManager(
+    lambda job, *upload: process_upload(*upload, progress=job.set_stage),
+    workers=JOB_WORKERS or system_manager.sim_pool.max_workers,
+    max_queued=JOB_QUEUE_SIZE)
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    """Synchronous analysis for clients without JavaScript; see /jobs."""
+    upload, error = save_upload()
+    if upload is None:
+        return render_template('index.html', error=error)
 
     try:
-        # Ensure server is running
-        system_manager.start_emotion_server()
+        rendered = process_upload(*upload)
+    except Exception as e:
+        return render_template('index.html', error=str(e))
 
-        # 1. Prepare Image
-        verilog_input_path, processed_pil_img = system_manager.prepare_image(filepath, unique_id)
+    return render_template('index.html',
+                         result_image=result_image_url(rendered),
+                         emotion=rendered['emotion'],
+                         faces=rendered['faces'],
+                         debug_info=rendered['debug_info'])
 
-        # 2. Run Simulation
-        stdout, stderr = system_manager.run_verilog_simulation(verilog_input_path, original_filename=file.filename)
+def job_status(job):
+    """The job's JSON status, with its queue position and result image URL."""
+    status = job.snapshot()
+    status['position'] = job_manager.position(job)
+    if 'result' in status:
+        status['result'] = dict(status['result'], result_image=result_image_url(status['result']))
+    return status
 
-        if not stdout:
-            return render_template('index.html', error=f"Simulation failed: {stderr}")
-
-        # 3. Parse Output
-        # Look for bounding box
-        # tb_emotion_classifier.v prints: "✓ Face detected at (24, 20)"
-        bbox_match = re.search(r"Face detected at \((\d+), (\d+)\)", stdout)
-        
-        # Scale is hardcoded to 24 in tb_emotion_classifier.v for the VPI call
-        s = 24 
-        
-        # Look for Emotion from VPI
-        # "VPI: Received Result: Happy (confidence: 99.99%)"
-        emotion_match = re.search(r"VPI: Received Result: (.*)", stdout)
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queues an upload; 202 with the job id, or 503 when the queue is full."""
+    upload, error = save_upload()
+    if upload is None:
+        return jsonify({'error': error}), 400
 
-        debug_info = f"STDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"
-        
-        emotion_result = None
-        result_image_url = None
+    try:
+        job = job_manager.submit(*upload)
+    except QueueFullError as e:
+        upload[0].unlink(missing_ok=True)
+        response = jsonify({'error': 'busy', 'detail': str(e)})
+        response.headers['Retry-After'] = str(JOB_RETRY_AFTER)
+        return response, 503
 
-        if bbox_match:
-            x = int(bbox_match.group(1))
-            y = int(bbox_match.group(2))
-            
-            # Draw on original image (or the resized 64x64 one?)
-            # The coordinates (x, y) usually refer to the top-left of the window?
-            # Or center?
-            # Viola-Jones usually scans top-left.
-            # Let's assume (x,y) is top-left and 's' is width/height (square).
-            
-            # Draw on original image (or the resized 64x64 one?)
-            # The coordinates are relative to the 64x64 input.
-            # So let's draw on the 64x64 version and display that, 
-            # as scaling back to original might be misaligned if aspect ratio changed.
-            
-            # Convert grayscale back to RGB for colored box
-            result_img = processed_pil_img.convert("RGB")
-            draw = ImageDraw.Draw(result_img)
-            draw.rectangle([x, y, x + s, y + s], outline="lime", width=2)
-            
-            # Save result
-            result_filename = f"result_{filename}"
-            result_path = UPLOAD_DIR / result_filename
-            result_img.save(result_path)
-            
-            result_image_url = url_for('static', filename=f'uploads/{result_filename}')
-            
-            if emotion_match:
-                emotion_result = emotion_match.group(1).strip()
-            else:
-                emotion_result = "Unknown (Analysis incomplete)"
+    status_url = url_for('get_job', job_id=job.id)
+    response = jsonify(dict(job_status(job), status_url=status_url,
+                            events_url=url_for('job_events', job_id=job.id)))
+    response.headers['Location'] = status_url
+    return response, 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events: one event per state or stage change until the job finishes."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+
+    def stream():
+        version = None
+        while True:
+            status = job_status(job)
+            if status['version'] != version:
+                version = status['version']
+                yield f"event: {status['state']}\ndata: {json.dumps(status)}\n\n"
+                if status['state'] in FINISHED_STATES:
+                    return
+            elif job.wait(version, timeout=JOB_EVENT_KEEPALIVE) == version:
+                # Comment line: keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+def batch_images(files):
+    """
+    (name, bytes) of every uploaded image; zip archives contribute their
+    image members. Raises ValueError on a bad archive, too many images, an
+    image over BATCH_MAX_IMAGE_BYTES or a batch over BATCH_MAX_BYTES.
+    """
+    images = []
+    total = 0
+
+    def check_size(name, size):
+        nonlocal total
+        if size > BATCH_MAX_IMAGE_BYTES:
+            raise ValueError(f"{name}: image too large (at most {BATCH_MAX_IMAGE_BYTES} bytes)")
+        total += size
+        if total > BATCH_MAX_BYTES:
+            raise ValueError(f"Batch too large (at most {BATCH_MAX_BYTES} bytes)")
+
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            try:
+                with zipfile.ZipFile(io.BytesIO(file.read())) as archive:
+                    members = [member for member in archive.infolist() if not member.is_dir()
+                               and member.filename.lower().endswith(IMAGE_EXTENSIONS)]
+                    # Count and size before extracting anything; reads stop
+                    # at the declared file_size
+                    if len(images) + len(members) > BATCH_MAX_IMAGES:
+                        raise ValueError(f"Too many images (at most {BATCH_MAX_IMAGES} per batch)")
+                    for member in members:
+                        check_size(f"{file.filename}/{member.filename}", member.file_size)
+                    images += [(f"{file.filename}/{member.filename}", archive.read(member))
+                               for member in members]
+            except zipfile.BadZipFile as e:
+                raise ValueError(f"{file.filename}: {e}")
         else:
-             # Just show the resized image if no face found
-            result_filename = f"processed_{filename}"
-            result_path = UPLOAD_DIR / result_filename
-            processed_pil_img.save(result_path)
-            result_image_url = url_for('static', filename=f'uploads/{result_filename}')
-            emotion_result = None
-
-        return render_template('index.html', 
-                             result_image=result_image_url, 
-                             emotion=emotion_result,
-                             debug_info=debug_info)
+            data = file.read(BATCH_MAX_IMAGE_BYTES + 1)
+            check_size(file.filename, len(data))
+            images.append((file.filename, data))
+        if len(images) > BATCH_MAX_IMAGES:
+            raise ValueError(f"Too many images (at most {BATCH_MAX_IMAGES} per batch)")
+    return images
 
+def analyze_batch_image(index, name, data, debug=False):
+    """Prepares and analyzes one batch image; returns its NDJSON record."""
+    record = {'index': index, 'name': name}
+    try:
+        with STAGE_SECONDS.time(stage='prepare'):
+            frame = np.array(system_manager.prepare_image(io.BytesIO(data)))
+        result = system_manager.analyze(frame, uuid.uuid4().hex[:8],
+                                        original_filename=Path(name).name)
     except Exception as e:
-        return render_template('index.html', error=str(e))
+        return dict(record, error=str(e))
+    record.update(face=result['face'], emotion=result['emotion'], faces=result['faces'],
+                  cached=result['cached'])
+    if result['stderr']:
+        record['stderr'] = result['stderr']
+    if debug:
+        record['stdout'] = result['stdout']
+    return record
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """
+    Analyzes many images (several `file` fields and/or zip archives) and
+    streams one NDJSON line per image as it completes, then a summary line.
+    """
+    files = [f for f in request.files.getlist('file') if f.filename]
+    if not files:
+        return jsonify({'error': 'No files'}), 400
+    try:
+        images = batch_images(files)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not images:
+        return jsonify({'error': 'No images in upload'}), 400
+    debug = request.args.get('debug') == '1'
+    BATCH_IMAGES.observe(len(images))
+
+    # One server check per batch instead of one per image
+    system_manager.start_emotion_server()
+
+    def stream():
+        start = time.monotonic()
+        failed = 0
+        pending = iter(enumerate(images))
+        pending_lock = threading.Lock()
+        records = queue.Queue()
+        stop = threading.Event()
+
+        def batch_worker():
+            # Each worker keeps one emotion server connection for all its
+            # images and closes it once there are none left
+            try:
+                while not stop.is_set():
+                    with pending_lock:
+                        k, (name, data) = next(pending, (None, (None, None)))
+                    if k is None:
+                        return
+                    records.put(analyze_batch_image(k, name, data, debug))
+            finally:
+                system_manager.close_emotion_client()
+
+        workers = min(len(images), BATCH_WORKERS or system_manager.sim_pool.max_workers)
+        for n in range(workers):
+            threading.Thread(target=batch_worker, name=f'batch-{n}', daemon=True).start()
+        try:
+            for _ in images:
+                record = records.get()
+                failed += 'error' in record
+                yield json.dumps(record) + '\n'
+        finally:
+            # Also reached when the client disconnects mid-stream: workers
+            # finish their current image and take no more
+            stop.set()
+        yield json.dumps({'done': True, 'images': len(images), 'failed': failed,
+                          'seconds': round(time.monotonic() - start, 3)}) + '\n'
+
+    return Response(stream(), mimetype='application/x-ndjson')
+
+def queue_depths():
+    jobs = job_manager.stats()
+    depths = {('jobs', 'queued'): jobs['queued'], ('jobs', 'running'): jobs['running'],
+              ('simulations', 'queued'): system_manager.sim_pool.queued,
+              ('simulations', 'running'): system_manager.sim_pool.running}
+    if system_manager.sim_daemon is not None:
+        depths[('daemon', 'queued')] = system_manager.sim_daemon.queued
+    return depths
+
+QUEUE_DEPTH.set_function(queue_depths)
+CACHE_EVENTS.set_function(lambda: {
+    (event,): system_manager.result_cache.stats()[event]
+    for event in ('hits', 'disk_hits', 'misses', 'evictions')})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/jobs/stats', methods=['GET'])
+def jobs_stats():
+    return jsonify(job_manager.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(system_manager.result_cache.stats())
 
 if __name__ == '__main__':
     # Cleanup on exit
     def signal_handler(sig, frame):
-        system_manager.stop_server()
+        job_manager.shutdown()
+        system_manager.shutdown()
         sys.exit(0)
     
     signal.signal(signal.SIGINT, signal_handler)
     
     # Check if run_sim exists, if not, try to compile
-    if not (SIM_DIR / 'run_sim').exists():
+    if system_manager.backend == 'rtl' and not (SIM_DIR / 'run_sim').exists():
         print("Compiling Verilog simulation...")
         subprocess.run(["make", "compile"], cwd=BASE_DIR, check=True)
         subprocess.run(["make", "vpi"], cwd=BASE_DIR, check=True)
+    if system_manager.backend == 'verilator' and not (SIM_DIR / 'run_verilator').exists():
+        print("Compiling Verilator simulation...")
+        subprocess.run(["make", "compile-verilator"], cwd=BASE_DIR, check=True)
+    if system_manager.backend == 'daemon':
+        if not (SIM_DIR / 'run_daemon').exists():
+            print("Compiling simulation daemon...")
+            subprocess.run(["make", "compile-daemon"], cwd=BASE_DIR, check=True)
+        system_manager.start_sim_daemon()
 
-    app.run(debug=False, host='0.0.0.0', port=5000)
+    # One thread per request; analysis itself is bounded by job_manager
+    app.run(debug=False, host='0.0.0.0', port=5000, threaded=True)
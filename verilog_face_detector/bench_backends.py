@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+bench_backends.py
+Compares the Icarus and Verilator simulators of the face detector.
+
+Every image is simulated with `vvp run_sim` (tb_emotion_classifier.v and
+the VPI module, built with `make compile`) and with the native
+sim/run_verilator (`make compile-verilator`). Both run through
+sim_pool.py, one job at a time by default, so the wall times are per
+image. The report gives the per-image times, the speedup, and whether
+both backends printed the same detection. With --all-faces, the lists of
+passing windows must match as well. The exit status is non-zero on any
+mismatch or failed run.
+
+The emotion request of a detected face goes to --emotion-port, which
+defaults to a port nothing listens on. The connection is refused at
+once, so only simulation is timed.
+
+Usage:
+    python3 bench_backends.py sim/prepared_images/corpus.frames
+    python3 bench_backends.py sim/prepared_images/face_*.txt --jobs 4 --json bench.json
+"""
+
+import argparse
+import json
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+from detections import parse_windows
+from image_corpus import write_hex
+from reference_detector import iter_images
+from sim_pool import SIM_DIR, VPI_DIR, SimulationPool
+
+BACKENDS = {
+    'vvp': (SIM_DIR / 'run_sim', 'vvp'),
+    'verilator': (SIM_DIR / 'run_verilator', None),
+}
+BUILD_TARGETS = {'vvp': 'make compile', 'verilator': 'make compile-verilator'}
+DEFAULT_TIMEOUT = 300  # seconds per image
+UNUSED_PORT = 1
+
+
+def parse_detection(stdout):
+    """
+    The detection printed by tb_emotion_classifier.v or the Verilator
+    harness: {face: [x, y, size] or None, windows: [...]}, or None if the
+    run printed no result.
+    """
+    windows = parse_windows(stdout).tolist()
+    face = re.search(r"Face detected at \(\s*(\d+),\s*(\d+)\) size (\d+)", stdout)
+    if face:
+        return {'face': [int(v) for v in face.groups()], 'windows': windows}
+    if 'No face detected' in stdout or 'windows passed' in stdout:
+        return {'face': None, 'windows': windows}
+    return None
+
+
+def run_backend(backend, hex_paths, plusargs, jobs, timeout):
+    """Simulates every hex image on one backend; returns (wall time, detection) per image."""
+    sim_exec, interpreter = BACKENDS[backend]
+    pool = SimulationPool(sim_exec=sim_exec, vpi_dir=VPI_DIR if interpreter else None,
+                          interpreter=interpreter, max_workers=jobs,
+                          max_pending=len(hex_paths), timeout=timeout)
+    try:
+        submitted = [pool.submit(path, plusargs=plusargs) for path in hex_paths]
+        results = []
+        for job in submitted:
+            sim = job.result()
+            detection = None if sim.timed_out else parse_detection(sim.stdout)
+            results.append((sim.wall_time, detection))
+        return results
+    finally:
+        pool.shutdown()
+
+
+def summarize(times):
+    return {'total': round(sum(times), 3), 'mean': round(statistics.mean(times), 3),
+            'median': round(statistics.median(times), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vvp against Verilator and compare detections')
+    parser.add_argument('images', nargs='+', help='Prepared .txt files, images or .frames corpora')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Concurrent simulations per backend (default 1: per-image timing)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds per image')
+    parser.add_argument('--all-faces', action='store_true',
+                        help='Run with +ALL_FACES and compare every passing window')
+    parser.add_argument('--emotion-port', type=int, default=UNUSED_PORT,
+                        help='Emotion server port (default: none, only simulation is timed)')
+    parser.add_argument('--json', type=Path, help='Also write the per-image results as JSON')
+    args = parser.parse_args()
+
+    for backend, (sim_exec, _) in BACKENDS.items():
+        if not sim_exec.exists():
+            parser.error(f"{sim_exec} not found. Run: {BUILD_TARGETS[backend]}")
+
+    images = list(iter_images(args.images))
+    if not images:
+        parser.error("No images given")
+    plusargs = [f'+EMOTION_PORT={args.emotion_port}']
+    if args.all_faces:
+        plusargs.append('+ALL_FACES')
+
+    hex_dir = Path(tempfile.mkdtemp(prefix='bench_'))
+    try:
+        hex_paths = []
+        for k, (_, frame) in enumerate(images):
+            hex_paths.append(hex_dir / f"frame_{k:05d}.txt")
+            write_hex(frame, hex_paths[-1])
+        runs = {}
+        for backend in BACKENDS:
+            print(f"Simulating {len(images)} images with {backend}...", flush=True)
+            runs[backend] = run_backend(backend, hex_paths, plusargs, args.jobs, args.timeout)
+    finally:
+        shutil.rmtree(hex_dir, ignore_errors=True)
+
+    results = []
+    print(f"\n{'vvp (s)':>9} {'verilator (s)':>13} {'Speedup':>8}  {'Result':<9} Image")
+    for k, (name, _) in enumerate(images):
+        (vvp_time, vvp_det), (vl_time, vl_det) = runs['vvp'][k], runs['verilator'][k]
+        if vvp_det is None or vl_det is None:
+            status = 'ERROR'
+        else:
+            status = 'match' if vvp_det == vl_det else 'MISMATCH'
+        speedup = vvp_time / vl_time if vl_time else 0.0
+        results.append({'name': name, 'status': status, 'vvp_time': round(vvp_time, 3),
+                        'verilator_time': round(vl_time, 3), 'speedup': round(speedup, 2),
+                        'vvp': vvp_det, 'verilator': vl_det})
+        face = (vvp_det or vl_det or {}).get('face')
+        detail = f"face at ({face[0]}, {face[1]}) size {face[2]}" if face else 'no face'
+        print(f"{vvp_time:9.3f} {vl_time:13.3f} {speedup:7.1f}x  {status:<9} {name}: {detail}")
+
+    summary = {backend: summarize([t for t, _ in runs[backend]]) for backend in BACKENDS}
+    mismatches = sum(r['status'] == 'MISMATCH' for r in results)
+    errors = sum(r['status'] == 'ERROR' for r in results)
+    print(f"\nvvp:       mean {summary['vvp']['mean']:.3f}s, median {summary['vvp']['median']:.3f}s, "
+          f"total {summary['vvp']['total']:.1f}s")
+    print(f"verilator: mean {summary['verilator']['mean']:.3f}s, "
+          f"median {summary['verilator']['median']:.3f}s, total {summary['verilator']['total']:.1f}s")
+    if summary['verilator']['mean']:
+        print(f"Speedup (mean wall time per image): "
+              f"{summary['vvp']['mean'] / summary['verilator']['mean']:.1f}x")
+    print(f"{len(results) - mismatches - errors}/{len(results)} identical, "
+          f"{mismatches} mismatched, {errors} failed")
+
+    if args.json:
+        args.json.write_text(json.dumps({'summary': summary, 'results': results}, indent=1) + '\n')
+        print(f"Report: {args.json}")
+    sys.exit(0 if mismatches == 0 and errors == 0 else 1)
+
+
+if __name__ == '__main__':
+    main()
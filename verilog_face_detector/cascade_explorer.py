@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+cascade_explorer.py
+Profiles the Haar cascade on an image corpus and emits trimmed variants.
+
+Runs the cascade IR from parse_cascade.py through the NumPy reference
+engine and records, per stage, how many windows reach it and how many it
+rejects, plus the weak classifiers evaluated per window (the quantity that
+dominates simulated cycles). It then builds trimmed variants:
+- keep only the first N stages;
+- drop the lowest-weight weak classifiers of every stage. Weight is
+  |left - right|. The stage threshold moves by the midpoint of what was
+  dropped.
+
+Each variant is written as an alternate cascade_data.mem and scored for
+cost and accuracy against the full cascade. The feature LUTs are shared by
+all variants. To simulate one:
+
+    vvp ... run_sim +CASCADE=<variant.mem> +NUM_STAGES=<n>
+
+Usage:
+    python3 cascade_explorer.py sim/prepared_images/corpus.frames
+    python3 cascade_explorer.py corpus.frames --stages 25,20,15 --drop 0,0.2 \
+        --min-recall 0.95 --max-extra 0.5
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from parse_cascade import load_ir, write_mem_file
+from reference_detector import CASCADE_IR_FILE, ReferenceDetector, iter_images
+
+BASE_DIR = Path(__file__).resolve().parent
+OUTPUT_DIR = BASE_DIR / 'data/cascade_variants'
+
+
+def trim_cascade(ir, num_stages=None, drop_fraction=0.0):
+    """Returns a copy of the IR with fewer stages and/or weak classifiers."""
+    offsets = ir['stage_offsets']
+    num_stages = len(ir['stage_threshold']) if num_stages is None else num_stages
+    margin = np.abs(ir['clf_left'] - ir['clf_right'])
+    midpoint = (ir['clf_left'] + ir['clf_right']) / 2
+
+    keep, thresholds, new_offsets = [], [], [0]
+    for s in range(num_stages):
+        clfs = np.arange(offsets[s], offsets[s + 1])
+        n_drop = min(int(len(clfs) * drop_fraction), len(clfs) - 1)
+        order = clfs[np.argsort(margin[clfs], kind='stable')]
+        dropped = order[:n_drop]
+        kept = np.sort(order[n_drop:])
+        keep.append(kept)
+        thresholds.append(ir['stage_threshold'][s] - midpoint[dropped].sum())
+        new_offsets.append(new_offsets[-1] + len(kept))
+
+    keep = np.concatenate(keep)
+    trimmed = dict(ir)
+    trimmed['stage_threshold'] = np.array(thresholds, dtype=np.float64)
+    trimmed['stage_offsets'] = np.array(new_offsets, dtype=np.int32)
+    for key in ('clf_feature', 'clf_threshold', 'clf_left', 'clf_right'):
+        trimmed[key] = ir[key][keep]
+    return trimmed
+
+
+def profile(ir, images):
+    """
+    Runs the cascade over images. Returns per-stage window counts, the hit
+    windows per image and the wall time.
+    """
+    num_stages = len(ir['stage_threshold'])
+    detector = ReferenceDetector(ir=ir, num_stages=num_stages)
+    reached = np.zeros(num_stages, dtype=np.int64)
+    hits = []
+    start = time.perf_counter()
+    for image in images:
+        hits.append(set(detector.scan(image, stage_counts=reached)))
+    elapsed = time.perf_counter() - start
+    windows = len(detector.window_positions()[0]) * len(detector.scales) * len(images)
+    return {
+        'num_stages': num_stages,
+        'classifiers_per_stage': np.diff(ir['stage_offsets']).tolist(),
+        'windows': windows,
+        'reached': reached.tolist(),
+        'hits': hits,
+        'seconds': elapsed,
+    }
+
+
+def summarize(result, baseline=None):
+    """Cost and accuracy numbers for one profiled cascade."""
+    reached = np.array(result['reached'])
+    per_stage = np.array(result['classifiers_per_stage'])
+    windows = max(result['windows'], 1)
+    clf_per_window = float((reached * per_stage).sum()) / windows
+    detected = [bool(h) for h in result['hits']]
+    summary = {
+        'stages': result['num_stages'],
+        'weak_classifiers': int(per_stage.sum()),
+        'classifiers_per_window': round(clf_per_window, 2),
+        'detection_rate': round(float(np.mean(detected)) if detected else 0.0, 4),
+        'hit_windows': sum(len(h) for h in result['hits']),
+        'seconds': round(result['seconds'], 3),
+    }
+    if baseline is not None:
+        base = baseline['summary']
+        full_frames = [i for i, h in enumerate(baseline['hits']) if h]
+        full_windows = sum(len(h) for h in baseline['hits'])
+        kept_windows = sum(len(h & b) for h, b in zip(result['hits'], baseline['hits']))
+        summary['speedup'] = round(base['classifiers_per_window'] / max(clf_per_window, 1e-9), 2)
+        summary['frame_recall'] = round(
+            sum(detected[i] for i in full_frames) / len(full_frames), 4) if full_frames else 1.0
+        summary['window_recall'] = round(kept_windows / full_windows, 4) if full_windows else 1.0
+        summary['extra_windows'] = summary['hit_windows'] - kept_windows
+    return summary
+
+
+def stage_report(result):
+    """Per-stage windows reached / rejected and rejection rate."""
+    reached = result['reached']
+    rows = []
+    for k, count in enumerate(reached):
+        passed = reached[k + 1] if k + 1 < len(reached) else sum(len(h) for h in result['hits'])
+        rows.append({
+            'stage': k,
+            'classifiers': result['classifiers_per_stage'][k],
+            'reached': count,
+            'rejected': count - passed,
+            'rejection_rate': round((count - passed) / count, 4) if count else 0.0,
+        })
+    return rows
+
+
+def parse_list(text, kind):
+    return [kind(v) for v in text.split(',') if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile the cascade and emit trimmed variants')
+    parser.add_argument('images', nargs='+', help='Image files and/or packed corpora (.frames)')
+    parser.add_argument('--ir', default=CASCADE_IR_FILE, help='Cascade IR from parse_cascade.py')
+    parser.add_argument('--stages', type=lambda t: parse_list(t, int), default=None,
+                        help='Stage counts to try (default: full, then every 5 down to 5)')
+    parser.add_argument('--drop', type=lambda t: parse_list(t, float), default=[0.0, 0.1, 0.25],
+                        help='Fractions of each stage\'s weakest classifiers to drop')
+    parser.add_argument('--min-recall', type=float, default=1.0,
+                        help='Frame recall vs the full cascade a variant must keep to be recommended')
+    parser.add_argument('--max-extra', type=float, default=0.0,
+                        help='Hit windows per image beyond the full cascade\'s a recommended variant may add')
+    parser.add_argument('--output', type=Path, default=OUTPUT_DIR, help='Variant and report directory')
+    args = parser.parse_args()
+
+    ir = load_ir(args.ir)
+    total_stages = len(ir['stage_threshold'])
+    stage_counts = args.stages or sorted({total_stages, *range(total_stages - 5, 0, -5)}, reverse=True)
+    if any(not 1 <= n <= total_stages for n in stage_counts):
+        parser.error(f"--stages must be between 1 and {total_stages}")
+    if any(not 0.0 <= d < 1.0 for d in args.drop):
+        parser.error("--drop fractions must be in [0, 1)")
+
+    images = [image for _, image in iter_images(args.images)]
+    print(f"Profiling {total_stages}-stage cascade on {len(images)} images...")
+    baseline = profile(ir, images)
+    baseline['summary'] = summarize(baseline)
+
+    print(f"\n{'Stage':>5} {'Clfs':>5} {'Reached':>9} {'Rejected':>9} {'Reject%':>8}")
+    stages = stage_report(baseline)
+    for row in stages:
+        print(f"{row['stage']:5d} {row['classifiers']:5d} {row['reached']:9d} "
+              f"{row['rejected']:9d} {100 * row['rejection_rate']:7.1f}%")
+    print(f"Weak classifiers evaluated per window: {baseline['summary']['classifiers_per_window']}")
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    variants = []
+    for num_stages in stage_counts:
+        for drop in args.drop:
+            name = f"cascade_s{num_stages:02d}_d{round(drop * 100):02d}"
+            variant_ir = trim_cascade(ir, num_stages, drop)
+            if num_stages == total_stages and drop == 0.0:
+                summary = summarize(baseline, baseline)
+            else:
+                summary = summarize(profile(variant_ir, images), baseline)
+            mem_file = args.output / f"{name}.mem"
+            write_mem_file(mem_file, variant_ir)
+            variants.append(dict(summary, name=name, drop_fraction=drop, mem_file=str(mem_file)))
+
+    eligible = [v for v in variants if v['frame_recall'] >= args.min_recall and
+                v['extra_windows'] <= args.max_extra * len(images)]
+    best = min(eligible, key=lambda v: v['classifiers_per_window']) if eligible else None
+
+    print(f"\n{'Variant':18s} {'Stages':>6} {'Clfs':>5} {'Clf/win':>8} {'Speedup':>8} "
+          f"{'Detect':>7} {'F-recall':>9} {'W-recall':>9} {'Extra':>6}")
+    for v in sorted(variants, key=lambda v: v['classifiers_per_window']):
+        mark = '  <- cheapest meeting the accuracy target' if v is best else ''
+        print(f"{v['name']:18s} {v['stages']:6d} {v['weak_classifiers']:5d} "
+              f"{v['classifiers_per_window']:8.2f} {v['speedup']:7.2f}x {v['detection_rate']:7.2%} "
+              f"{v['frame_recall']:9.2%} {v['window_recall']:9.2%} {v['extra_windows']:6d}{mark}")
+
+    report = {
+        'images': len(images),
+        'baseline': baseline['summary'],
+        'stages': stages,
+        'variants': variants,
+        'recommended': best['name'] if best else None,
+    }
+    report_path = args.output / 'report.json'
+    report_path.write_text(json.dumps(report, indent=1) + '\n')
+    print(f"\nReport: {report_path}")
+    if best:
+        print(f"Simulate with: +CASCADE={best['mem_file']} +NUM_STAGES={best['stages']}")
+    else:
+        print(f"No variant keeps frame recall >= {args.min_recall:.0%} "
+              f"with <= {args.max_extra} extra hit windows per image")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+check_feature_lut.py
+Checks that the generated ROM images resolve every weak classifier to the
+rectangles the cascade XML gives it.
+
+The XML is read independently of parse_cascade.py (stdlib ElementTree).
+Then the ROMs are walked the way the RTL does: stage_evaluator.v takes each
+classifier's feature index from cascade_data.mem, and feature_calculator.v
+reads that feature's pre-scaled record from every slot of feature_geom.mem.
+Each record must hold the XML rectangles' corners, scaled the way the old
+multiply-based datapath scaled them, and their integer weights. The .coe
+files must hold the same words as the .mem files, and rom_params.vh must
+size the ROMs to exactly those words.
+
+Usage: python3 check_feature_lut.py [--xml FILE] [--data-dir DIR]
+"""
+
+import argparse
+import sys
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+import numpy as np
+
+from parse_cascade import (GEOM_SLOT_WORDS, GEOM_STRIDE, GEOMETRY_SCALES, address_bits,
+                           float_to_fixed_point)
+from reference_detector import read_mem_file
+
+BASE_DIR = Path(__file__).resolve().parent
+FEATURE_ADDR_BITS = 17  # feature_addr width in feature_calculator.v
+
+
+def read_coe_file(path):
+    """Reads the memory_initialization_vector of a .coe file as 32-bit words."""
+    text = Path(path).read_text()
+    vector = text.split('memory_initialization_vector=', 1)[1].split(';', 1)[0]
+    return np.array([int(w, 16) for w in vector.replace(',', ' ').split()], dtype=np.uint32)
+
+
+def expected_classifiers(xml_file):
+    """[(feature_idx, [(x, y, w, h, weight_q16), ...]), ...] in cascade order."""
+    cascade = ET.parse(xml_file).getroot().find('cascade')
+    features = []
+    for feature in cascade.find('features'):
+        rects = []
+        for rect in feature.find('rects'):
+            x, y, w, h, weight = rect.text.split()
+            rects.append((int(x), int(y), int(w), int(h),
+                          float_to_fixed_point(float(weight.rstrip('.')))))
+        features.append(rects)
+
+    classifiers = []
+    for stage in cascade.find('stages'):
+        for clf in stage.find('weakClassifiers'):
+            feature_idx = int(clf.find('internalNodes').text.split()[2])
+            classifiers.append((feature_idx, features[feature_idx]))
+    return classifiers
+
+
+def rom_classifiers(cascade_words, num_stages):
+    """Feature indices in the order stage_evaluator.v fetches them."""
+    indices = []
+    addr = 0
+    for _ in range(num_stages):
+        count = int(cascade_words[addr + 1]) & 0xFFFF
+        clf = cascade_words[addr + 2:addr + 2 + 4 * count].reshape(count, 4)
+        indices.extend((clf[:, 0] & 0xFFF).tolist())
+        addr += 2 + 4 * count
+    return indices
+
+
+def resolve_geometry(geom, slot, feature_idx):
+    """(x1, y1, x2, y2, weight) per rect as feature_calculator.v reads them."""
+    base = slot * GEOM_SLOT_WORDS + feature_idx * GEOM_STRIDE
+    header = int(geom[base])
+    rects = []
+    for r in range(max(header & 0xF, 1)):
+        word = int(geom[base + 1 + r])
+        nibble = (header >> (4 + 4 * r)) & 0xF if r < 3 else 0
+        # Sign from bit 3, magnitude from bits [2:0] of the negated nibble
+        weight = -((16 - nibble) & 7) if nibble & 8 else nibble
+        rects.append(((word >> 24) & 0xFF, (word >> 16) & 0xFF, (word >> 8) & 0xFF, word & 0xFF,
+                      weight))
+    return rects
+
+
+def expected_geometry(rects, scale):
+    """What the old multiply-based QUERY_SUM / ACCUMULATE computed for these rects."""
+    def scaled(v):
+        return ((v & 0xFFFF) * scale & 0xFFFF) >> 8
+    return [(scaled(x), scaled(y), scaled(x + w), scaled(y + h), weight >> 16)
+            for x, y, w, h, weight in rects]
+
+
+def read_rom_params(path):
+    """The `define values of rom_params.vh."""
+    params = {}
+    for line in Path(path).read_text().splitlines():
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == '`define':
+            params[parts[1]] = int(parts[2])
+    return params
+
+
+def check_rom_params(params, cascade_words, geom):
+    """The ROM depths in rom_params.vh must be exactly the image sizes."""
+    errors = []
+    for prefix, words in (('CASCADE_ROM', cascade_words), ('FEATURE_ROM', geom)):
+        depth = params.get(f'{prefix}_DEPTH')
+        width = params.get(f'{prefix}_ADDR_WIDTH')
+        if depth != len(words):
+            errors.append(f"rom_params.vh: {prefix}_DEPTH is {depth}, the image has {len(words)} words")
+        elif width != address_bits(depth):
+            errors.append(f"rom_params.vh: {prefix}_ADDR_WIDTH {width} does not fit depth {depth}")
+    return errors
+
+
+def check(xml_file, data_dir):
+    errors = []
+    data_dir = Path(data_dir)
+    cascade_words = read_mem_file(data_dir / 'cascade_data.mem')
+    geom = read_mem_file(data_dir / 'feature_geom.mem')
+    if not np.array_equal(geom, read_coe_file(data_dir / 'feature_geom.coe')):
+        errors.append("feature_geom.coe does not match feature_geom.mem")
+    if not np.array_equal(cascade_words, read_coe_file(data_dir / 'cascade_data.coe')):
+        errors.append("cascade_data.coe does not match cascade_data.mem")
+    errors += check_rom_params(read_rom_params(data_dir / 'rom_params.vh'), cascade_words, geom)
+
+    expected = expected_classifiers(xml_file)
+    num_stages = len(ET.parse(xml_file).getroot().find('cascade').find('stages'))
+    fetched = rom_classifiers(cascade_words, num_stages)
+    if len(fetched) != len(expected):
+        errors.append(f"cascade ROM has {len(fetched)} classifiers, XML has {len(expected)}")
+
+    if len(geom) > 1 << FEATURE_ADDR_BITS:
+        errors.append(f"geometry LUT has {len(geom)} words, more than the "
+                      f"{FEATURE_ADDR_BITS}-bit address space")
+
+    for n, ((xml_idx, xml_rects), rom_idx) in enumerate(zip(expected, fetched)):
+        if rom_idx != xml_idx:
+            errors.append(f"classifier {n}: ROM feature index {rom_idx}, XML {xml_idx}")
+            continue
+        if any(w & 0xFFFF for *_, w in xml_rects):
+            errors.append(f"classifier {n}: feature {rom_idx} has a fractional weight")
+        for slot, scale in enumerate(GEOMETRY_SCALES):
+            if slot * GEOM_SLOT_WORDS + (rom_idx + 1) * GEOM_STRIDE > len(geom):
+                errors.append(f"classifier {n}: feature {rom_idx} is past the end of geometry slot {slot}")
+                continue
+            got = resolve_geometry(geom, slot, rom_idx)
+            want = expected_geometry(xml_rects, scale)
+            if got != want:
+                errors.append(f"classifier {n}: feature {rom_idx} at scale {scale} has "
+                              f"geometry {got}, expected {want}")
+
+    return len(expected), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check geometry LUT lookups against the cascade XML')
+    parser.add_argument('--xml', default=BASE_DIR / 'data/haarcascade_frontalface_default.xml')
+    parser.add_argument('--data-dir', default=BASE_DIR / 'data')
+    args = parser.parse_args()
+
+    count, errors = check(args.xml, args.data_dir)
+    for error in errors[:20]:
+        print(f"FAIL: {error}")
+    if len(errors) > 20:
+        print(f"... and {len(errors) - 20} more")
+    if errors:
+        sys.exit(1)
+    print(f"OK: all {count} weak classifiers resolve to their XML rectangles "
+          f"and their geometry at scales {list(GEOMETRY_SCALES)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -24,14 +24,23 @@ set xdc_file "src/face_detector.xdc"
 
 # Memory initialization files
 set cascade_coe_file "data/cascade_data.coe"
-set feature_lut_coe_file "data/feature_lut.coe"
+set feature_lut_coe_file "data/feature_geom.coe"
+
+# Exact ROM depths generated by parse_cascade.py
+set rom_params_file "data/rom_params.vh"
+set fh [open $rom_params_file r]
+set rom_params [read $fh]
+close $fh
+regexp {`define CASCADE_ROM_DEPTH (\d+)} $rom_params -> cascade_rom_depth
+regexp {`define FEATURE_ROM_DEPTH (\d+)} $rom_params -> feature_rom_depth
 
 # --- Project Creation ---
 puts "Creating Vivado project..."
 create_project $project_name $project_dir -part $target_device -force
 
-# Add Verilog source files
+# Add Verilog source files (rom_params.vh is included from data/)
 add_files -norecurse $verilog_sources
+set_property include_dirs [file normalize "data"] [current_fileset]
 
 # Add constraints file
 add_files -fileset constrs_1 -norecurse $xdc_file
@@ -48,7 +57,7 @@ set_property -dict [list \
     CONFIG.Use_MEM_Init {1} \
     CONFIG.Enable_32bit_Address {false} \
     CONFIG.Write_Width_A {32} \
-    CONFIG.Write_Depth_A {16384} \
+    CONFIG.Write_Depth_A $cascade_rom_depth \
     CONFIG.Read_Width_A {32} \
     CONFIG.Register_PortA_Output_of_Memory_Primitives {false} \
 ] [get_ips cascade_rom_ip]
@@ -65,7 +74,7 @@ set_property -dict [list \
     CONFIG.Use_MEM_Init {1} \
     CONFIG.Enable_32bit_Address {false} \
     CONFIG.Write_Width_A {32} \
-    CONFIG.Write_Depth_A {16384} \
+    CONFIG.Write_Depth_A $feature_rom_depth \
     CONFIG.Read_Width_A {32} \
     CONFIG.Register_PortA_Output_of_Memory_Primitives {false} \
 ] [get_ips feature_lut_rom_ip]
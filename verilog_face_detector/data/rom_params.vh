@@ -0,0 +1,11 @@
+// rom_params.vh
+// ROM sizes for the generated cascade_data.mem and feature_geom.mem
+// (generated by parse_cascade.py, do not edit)
+`ifndef ROM_PARAMS_VH
+`define ROM_PARAMS_VH
+`define CASCADE_NUM_STAGES 25
+`define CASCADE_ROM_DEPTH 11702
+`define CASCADE_ROM_ADDR_WIDTH 14
+`define FEATURE_ROM_DEPTH 11652
+`define FEATURE_ROM_ADDR_WIDTH 14
+`endif
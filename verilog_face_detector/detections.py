@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+detections.py
+Merges the windows reported by all-faces detection into faces.
+
+With +ALL_FACES (scan_all in control_fsm.v) the detector keeps scanning
+after the first hit. The testbenches print every window that passes the
+cascade:
+
+    Window at (24, 20) size 24
+
+A face usually makes several neighbouring windows fire. Each window is
+scored by how many other windows overlap it. non_max_suppression() then
+keeps the best-supported windows and drops any window that overlaps a
+kept one by more than an IoU threshold. app.py sends the remaining faces
+to the emotion server in one pipelined batch.
+
+Usage:
+    python3 detections.py sim/prepared_images/corpus.frames
+    python3 detections.py image.jpg --iou 0.4 --min-neighbors 1
+"""
+
+import argparse
+import re
+
+import numpy as np
+
+IOU_THRESHOLD = 0.3
+WINDOW_RE = re.compile(r"Window at \(\s*(\d+),\s*(\d+)\) size\s*(\d+)")
+
+
+def parse_windows(stdout):
+    """Windows printed by the testbench, as an (N, 3) array of x, y, size."""
+    windows = [tuple(map(int, m.groups())) for m in WINDOW_RE.finditer(stdout)]
+    return np.array(windows, dtype=np.int64).reshape(-1, 3)
+
+
+def iou_matrix(boxes):
+    """Pairwise intersection over union of square (x, y, size) boxes."""
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 3)
+    x1, y1, size = boxes[:, 0], boxes[:, 1], boxes[:, 2]
+    x2, y2 = x1 + size, y1 + size
+    w = np.clip(np.minimum(x2[:, None], x2[None, :]) - np.maximum(x1[:, None], x1[None, :]), 0, None)
+    h = np.clip(np.minimum(y2[:, None], y2[None, :]) - np.maximum(y1[:, None], y1[None, :]), 0, None)
+    inter = w * h
+    area = size * size
+    union = area[:, None] + area[None, :] - inter
+    return inter / np.maximum(union, 1)
+
+
+def non_max_suppression(boxes, iou_threshold=IOU_THRESHOLD, min_neighbors=0):
+    """
+    Merges overlapping (x, y, size) windows. Returns the kept boxes, best
+    supported first, and how many other windows overlapped each. Faces
+    with fewer than min_neighbors overlapping windows are dropped.
+    """
+    boxes = np.asarray(boxes, dtype=np.int64).reshape(-1, 3)
+    if len(boxes) == 0:
+        return boxes, np.zeros(0, dtype=np.int64)
+
+    overlap = iou_matrix(boxes) > iou_threshold
+    neighbors = overlap.sum(axis=1) - 1
+    # Most neighbours first; ties keep scan order, like the first-hit mode
+    order = np.lexsort((np.arange(len(boxes)), -neighbors))
+
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    keep = []
+    for i in order:
+        if not suppressed[i]:
+            keep.append(i)
+            suppressed |= overlap[i]
+    keep = np.array(keep, dtype=np.intp)
+    keep = keep[neighbors[keep] >= min_neighbors]
+    return boxes[keep], neighbors[keep]
+
+
+def main():
+    from reference_detector import ReferenceDetector, iter_images
+
+    parser = argparse.ArgumentParser(description='All-faces detection with non-max suppression '
+                                                 '(reference model)')
+    parser.add_argument('images', nargs='+', help='Images, prepared .txt files or .frames corpora')
+    parser.add_argument('--iou', type=float, default=IOU_THRESHOLD, help='Suppression IoU threshold')
+    parser.add_argument('--min-neighbors', type=int, default=0,
+                        help='Drop faces with fewer overlapping windows')
+    args = parser.parse_args()
+
+    detector = ReferenceDetector()
+    for path, image in iter_images(args.images):
+        windows = detector.detect_all(image)
+        faces, neighbors = non_max_suppression(windows, args.iou, args.min_neighbors)
+        found = ', '.join(f"({x}, {y}) size {s} [{n} neighbours]"
+                          for (x, y, s), n in zip(faces.tolist(), neighbors.tolist()))
+        print(f"{path}: {len(windows)} windows, {len(faces)} faces{': ' + found if found else ''}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+emotion_client.py
+Minimal Python client for the emotion server protocol.
+
+Speaks the same protocol as $send_roi_for_emotion in
+vpi/verilog_python_interface.c so Python-side detection backends can
+classify ROIs without going through the Verilog simulation. ROIs are sent
+as "ROI x y w h" or, with pixels, as "ROI x y w h nbytes" followed by the
+raw uint8 window. wait_until_ready() polls the server's READY command, so
+callers that start the server need no fixed sleep.
+"""
+
+import socket
+import time
+
+import numpy as np
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8888
+READY_POLL_INTERVAL = 0.05  # seconds
+MOCK_MODEL = 'mock'  # Model fingerprint of the random MOCK classifier
+
+
+class EmotionClient:
+    """
+    Persistent connection to the emotion server. Requests are newline
+    framed, so several can be pipelined before reading the responses.
+    Reconnects once if the connection was dropped.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def connect(self):
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self.reader = self.sock.makefile('rb')
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+        self.sock = None
+        self.reader = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def encode_roi(x, y, w, h, pixels=None):
+        """Encodes one ROI request; pixels is the h x w uint8 window, if any."""
+        if pixels is None:
+            return f"ROI {x} {y} {w} {h}\n".encode('utf-8')
+        payload = np.ascontiguousarray(pixels, dtype=np.uint8)
+        if payload.size != w * h:
+            raise ValueError(f"ROI pixels have {payload.size} values, expected {w}x{h}")
+        return f"ROI {x} {y} {w} {h} {payload.size}\n".encode('utf-8') + payload.tobytes()
+
+    def _exchange(self, messages):
+        self.connect()
+        self.sock.sendall(b''.join(messages))
+        responses = []
+        for _ in messages:
+            response = self.reader.readline()
+            if not response:
+                raise ConnectionError("Emotion server closed the connection")
+            responses.append(response.decode('utf-8').strip())
+        return responses
+
+    def _send(self, messages):
+        try:
+            return self._exchange(messages)
+        except (ConnectionError, BrokenPipeError):
+            # Stale persistent connection: retry once on a fresh one
+            self.close()
+            return self._exchange(messages)
+        except OSError:
+            self.close()
+            raise
+
+    def request(self, lines):
+        """Sends text request lines (pipelined) and returns their response lines."""
+        return self._send([(line + '\n').encode('utf-8') for line in lines])
+
+    def model(self):
+        """
+        Fingerprint of the served model from the READY reply:
+        "<name>@<hash>", MOCK_MODEL, or None while loading or if the server
+        does not report one.
+        """
+        parts = self.request(["READY"])[0].split()
+        return parts[1] if len(parts) == 2 and parts[0] == "READY" else None
+
+    def classify(self, x, y, w, h, pixels=None):
+        """Returns the response line, e.g. "Happy (confidence: 92.31%)"."""
+        return self._send([self.encode_roi(x, y, w, h, pixels)])[0]
+
+    def classify_many(self, rois):
+        """
+        Classifies several ROIs in one pipelined round trip. Each ROI is
+        (x, y, w, h) or (x, y, w, h, pixels).
+        """
+        return self._send([self.encode_roi(*roi) for roi in rois])
+
+
+def classify_roi(x, y, w, h, pixels=None, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=10):
+    """
+    Sends one ROI on a one-off connection and returns the response line,
+    e.g. "Happy (confidence: 92.31%)".
+    """
+    with EmotionClient(host, port, timeout) as client:
+        return client.classify(x, y, w, h, pixels)
+
+
+def wait_until_ready(host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=30, process=None):
+    """
+    Blocks until the server answers READY: it is listening, its model is
+    loaded and warmed up. A server without the READY command counts as
+    ready once it answers. Raises RuntimeError if process (the server's
+    Popen) exits first, TimeoutError after timeout seconds.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Emotion server exited with status {process.returncode}")
+        try:
+            with EmotionClient(host, port, timeout=max(0.1, deadline - time.monotonic())) as client:
+                while client.request(["READY"])[0] == "LOADING":
+                    if time.monotonic() >= deadline:
+                        break
+                    time.sleep(READY_POLL_INTERVAL)
+                else:
+                    return
+        except OSError:
+            pass
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Emotion server on {host}:{port} not ready after {timeout} s")
+        time.sleep(READY_POLL_INTERVAL)
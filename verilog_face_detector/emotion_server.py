@@ -1,66 +1,451 @@
-import socket
+import asyncio
+import hashlib
 import sys
 import argparse
+import json
 import time
 import random
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 import numpy as np
 
-# Try to import TensorFlow/Keras
-try:
-    from tensorflow import keras
-    KERAS_AVAILABLE = True
-except ImportError:
-    KERAS_AVAILABLE = False
-    print("WARNING: TensorFlow not available, using MOCK classifier")
+import metrics
+from emotion_client import MOCK_MODEL
+
+INPUT_SIZE = 48              # Mini-Xception input is 48x48 grayscale
+MAX_PAYLOAD = 1024 * 1024    # Largest accepted ROI pixel payload (bytes)
+
+# Prometheus metrics, served on --metrics-port
+REQUESTS = metrics.Counter('emotion_requests_total', 'ROI requests by outcome', ['result'])
+REQUEST_SECONDS = metrics.Histogram('emotion_request_seconds',
+                                    'ROI request latency, payload received to response')
+PREPROCESS_SECONDS = metrics.Histogram('emotion_preprocess_seconds', 'ROI crop/resize/normalize time')
+QUEUE_WAIT_SECONDS = metrics.Histogram('emotion_queue_wait_seconds',
+                                       'Time an ROI waits for its batch to be dispatched')
+INFERENCE_SECONDS = metrics.Histogram('emotion_inference_seconds', 'Forward pass time per batch')
+BATCH_SIZE = metrics.Histogram('emotion_batch_size', 'ROIs per forward pass',
+                               buckets=metrics.SIZE_BUCKETS)
+CONNECTIONS = metrics.Gauge('emotion_connections', 'Open client connections')
+CONNECTIONS_TOTAL = metrics.Counter('emotion_connections_total', 'Accepted client connections')
+QUEUE_DEPTH = metrics.Gauge('emotion_queue_depth', 'ROIs waiting for a batch')
+
+def model_fingerprint(model_path):
+    """
+    "<name>@<hash>" of a model file, or of every file of a SavedModel
+    directory, so results can be keyed by the exact weights served.
+    """
+    path = Path(model_path)
+    files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+    digest = hashlib.sha256()
+    for f in files:
+        digest.update(str(f.relative_to(path) if path.is_dir() else f.name).encode())
+        digest.update(f.read_bytes())
+    return f"{path.name}@{digest.hexdigest()[:16]}"
+
+def preprocess_roi(payload, w, h, size=INPUT_SIZE):
+    """
+    Turns a row-major uint8 w x h ROI into a (size, size, 1) float32 model
+    input in [0, 1]: centre crop to a square, bilinear resize, normalize.
+    """
+    roi = np.frombuffer(payload, dtype=np.uint8).reshape(h, w)
+
+    # Centre crop so non-square ROIs keep the face's aspect ratio
+    side = min(w, h)
+    top = (h - side) // 2
+    left = (w - side) // 2
+    roi = roi[top:top + side, left:left + side].astype(np.float32)
+
+    # Bilinear sampling at pixel centres, all taps gathered at once
+    coords = np.clip((np.arange(size, dtype=np.float32) + 0.5) * side / size - 0.5, 0, side - 1)
+    i0 = coords.astype(np.intp)
+    i1 = np.minimum(i0 + 1, side - 1)
+    frac = coords - np.floor(coords)
+    rows = roi[i0] * (1 - frac)[:, None] + roi[i1] * frac[:, None]
+    out = rows[:, i0] * (1 - frac)[None, :] + rows[:, i1] * frac[None, :]
+
+    return (out / 255.0)[..., None]
 
 class EmotionClassifier:
-    """Mini-Xception Emotion Classifier"""
-    
+    """
+    Mini-Xception Emotion Classifier. Nothing heavy happens until load():
+    TensorFlow is only imported when a model is requested.
+    """
+
     def __init__(self, model_path=None):
         self.emotions = ['Angry', 'Disgust', 'Fear', 'Happy', 'Sad', 'Surprise', 'Neutral']
+        self.model_path = model_path
         self.model = None
         self.use_mock = True
-        
-        if model_path and KERAS_AVAILABLE:
-            try:
-                print(f"Loading Mini-Xception model from {model_path}...")
-                self.model = keras.models.load_model(model_path)
-                self.use_mock = False
-                print("✓ Real model loaded successfully")
-            except Exception as e:
-                print(f"WARNING: Could not load model: {e}")
-                print("Falling back to MOCK classifier")
-        else:
+        self.fingerprint = MOCK_MODEL
+
+    def load(self, warm_up_batches=(1,)):
+        """
+        Loads the model, if any, and runs one inference per batch size in
+        warm_up_batches so graph tracing is not paid by the first request.
+        """
+        if not self.model_path:
             print("Using MOCK classifier (random predictions)")
-    
+            return self
+        try:
+            from tensorflow import keras
+        except ImportError:
+            print("WARNING: TensorFlow not available, using MOCK classifier")
+            return self
+        try:
+            print(f"Loading Mini-Xception model from {self.model_path}...")
+            self.model = keras.models.load_model(self.model_path)
+            self.fingerprint = model_fingerprint(self.model_path)
+            self.use_mock = False
+            print("✓ Real model loaded successfully")
+        except Exception as e:
+            print(f"WARNING: Could not load model: {e}")
+            print("Falling back to MOCK classifier")
+            return self
+
+        start = time.perf_counter()
+        for size in sorted(set(warm_up_batches)):
+            self.predict_batch([np.zeros((INPUT_SIZE, INPUT_SIZE, 1), np.float32)] * size)
+        print(f"Warm-up inference took {(time.perf_counter() - start) * 1000:.1f} ms")
+        return self
+
     def predict(self, roi_pixels=None):
         """
         Predict emotion from ROI pixels
         Returns: (emotion_name, confidence)
         """
+        return self.predict_batch([roi_pixels])[0]
+
+    def predict_batch(self, rois):
+        """
+        Predict emotions for several ROIs with one forward pass
+        Returns: list of (emotion_name, confidence)
+        """
         if self.use_mock:
             # Mock prediction - random emotion
-            emotion = random.choice(self.emotions)
-            confidence = 80.0 + random.random() * 19.9
-            return emotion, confidence
-        else:
-            # Real prediction using Mini-Xception model
-            # Model expects 48x48 grayscale image, normalized to [0, 1]
-            # For now, since we're not actually receiving pixels, use random data
-            # In real implementation, reshape and normalize roi_pixels
-            img = np.random.rand(1, 48, 48, 1).astype(np.float32)
-            
-            predictions = self.model.predict(img, verbose=0)
-            emotion_idx = np.argmax(predictions[0])
-            confidence = float(predictions[0][emotion_idx]) * 100
-            
-            return self.emotions[emotion_idx], confidence
+            return [(random.choice(self.emotions), 80.0 + random.random() * 19.9)
+                    for _ in rois]
+
+        # Real prediction using Mini-Xception model
+        # Model expects 48x48 grayscale images, normalized to [0, 1]
+        # (see preprocess_roi). Text-only ROI requests carry no pixels and
+        # still get random data.
+        batch = np.stack([
+            roi if roi is not None
+            else np.random.rand(INPUT_SIZE, INPUT_SIZE, 1).astype(np.float32)
+            for roi in rois
+        ])
+
+        predictions = self.model.predict(batch, batch_size=len(rois), verbose=0)
+        emotion_idx = np.argmax(predictions, axis=1)
+        return [(self.emotions[i], float(p[i]) * 100)
+                for i, p in zip(emotion_idx, predictions)]
+
+class BatchStats:
+    """Batch size histogram and queue wait percentiles for tuning."""
+
+    def __init__(self, window=1000):
+        self.requests = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.queue_waits = deque(maxlen=window)   # ms, most recent requests
+        self.inference_times = deque(maxlen=window)  # ms, most recent batches
+
+    def record(self, size, waits_ms, inference_ms):
+        self.requests += size
+        self.batches += 1
+        self.batch_sizes[size] += 1
+        self.queue_waits.extend(waits_ms)
+        self.inference_times.append(inference_ms)
+
+    @staticmethod
+    def _percentiles(values):
+        if not values:
+            return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {'p50': round(float(p50), 3), 'p90': round(float(p90), 3),
+                'p99': round(float(p99), 3), 'max': round(max(values), 3)}
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'batch_sizes': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+            'queue_wait_ms': self._percentiles(self.queue_waits),
+            'inference_ms': self._percentiles(self.inference_times),
+        }
+
+class BatchScheduler:
+    """
+    Collects ROIs from all connections and classifies them in batches.
+    A batch is dispatched once it holds max_batch ROIs or the oldest ROI
+    has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, classifier, executor, max_batch=32, max_wait_ms=5.0):
+        self.classifier = classifier
+        self.executor = executor
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.stats = BatchStats()
+        self.queue = asyncio.Queue()
+        self.task = None
+        # Set once the model is loaded and warmed up; ROIs queue until then
+        self.ready = asyncio.Event()
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def classify(self, roi_pixels=None):
+        """Queues one ROI and waits for its (emotion_name, confidence)."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((roi_pixels, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        """Waits for the first ROI, then gathers more until the batch closes."""
+        batch = [await self.queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            # Drain whatever is already queued without yielding
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - time.perf_counter()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        await self.ready.wait()
+        while True:
+            batch = await self._collect()
+            # Callers that disconnected no longer need a result
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            waits_ms = [(start - queued) * 1000 for _, _, queued in batch]
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.classifier.predict_batch, [roi for roi, _, _ in batch])
+            except Exception as e:
+                print(f"Batch inference failed: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            inference_ms = (time.perf_counter() - start) * 1000
+            self.stats.record(len(batch), waits_ms, inference_ms)
+            BATCH_SIZE.observe(len(batch))
+            INFERENCE_SECONDS.observe(inference_ms / 1000)
+            for wait_ms in waits_ms:
+                QUEUE_WAIT_SECONDS.observe(wait_ms / 1000)
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+async def handle_request(header, scheduler, payload=None):
+    """
+    Handles one request and returns the response line. payload holds the
+    pixels of a binary "ROI x y w h nbytes" request.
+    """
+    if not header.startswith("ROI"):
+        return await _handle_request(header, scheduler, payload)
+    with REQUEST_SECONDS.time():
+        response = await _handle_request(header, scheduler, payload)
+    REQUESTS.inc(result='error' if response.startswith('ERROR') else 'ok')
+    return response
+
+async def _handle_request(header, scheduler, payload):
+    parts = header.split()
+    if parts and parts[0] == "STATS":
+        return json.dumps(scheduler.stats.snapshot())
+    if parts and parts[0] == "READY":
+        # "READY <model@hash or mock>": callers key cached results by it
+        if not scheduler.ready.is_set():
+            return "LOADING"
+        return f"READY {scheduler.classifier.fingerprint}"
+
+    if not parts or parts[0] != "ROI":
+        print(f"Unknown command: {header}")
+        return "ERROR Unknown command"
+    if len(parts) < 5:
+        print("Invalid ROI format")
+        return "ERROR Invalid ROI format"
+
+    try:
+        x, y, w, h = map(int, parts[1:5])
+    except ValueError:
+        print("Invalid ROI format")
+        return "ERROR Invalid ROI format"
+    roi_pixels = None
+    if payload is not None:
+        if w <= 0 or h <= 0 or len(payload) != w * h:
+            print(f"ROI payload is {len(payload)} bytes, expected {w}x{h}")
+            return "ERROR Invalid ROI payload"
+        with PREPROCESS_SECONDS.time():
+            roi_pixels = preprocess_roi(payload, w, h)
+    print(f"Processing ROI: x={x}, y={y}, w={w}, h={h}"
+          + (f" ({len(payload)} bytes)" if payload is not None else ""))
+
+    try:
+        emotion, confidence = await scheduler.classify(roi_pixels)
+    except Exception as e:
+        return f"ERROR Inference failed: {e}"
+    response = f"{emotion} (confidence: {confidence:.2f}%)"
+    print(f"Sending result: {response}")
+    return response
+
+MAX_IN_FLIGHT = 64  # Pipelined requests per connection awaiting a response
+
+async def write_responses(writer, pending):
+    """
+    Writes responses in request order as their tasks complete. Keeps
+    draining after the peer goes away so the reader never blocks on a
+    full queue, cancelling the requests nobody will read.
+    """
+    connected = True
+    while True:
+        task = await pending.get()
+        if task is None:
+            return
+        if not connected:
+            task.cancel()
+            continue
+        response = await task
+        try:
+            writer.write((response + "\n").encode('utf-8'))
+            await writer.drain()
+        except ConnectionError as e:
+            print(f"Error handling client: {e}")
+            connected = False
+
+async def handle_client(reader, writer, scheduler):
+    """
+    Serves one persistent connection. Requests are read from a buffered
+    stream, so clients may pipeline several before reading any response.
+    Pipelined ROIs are classified concurrently (and can share a batch);
+    responses are sent back in request order.
+    """
+    addr = writer.get_extra_info('peername')
+    print(f"Connection from {addr}")
+    CONNECTIONS.inc()
+    CONNECTIONS_TOTAL.inc()
+    pending = asyncio.Queue(maxsize=MAX_IN_FLIGHT)
+    responder = asyncio.create_task(write_responses(writer, pending))
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            header = line.decode('utf-8', errors='replace').strip()
+            if not header:
+                continue
+
+            # "ROI x y w h nbytes" is followed by nbytes of raw pixels
+            payload = None
+            parts = header.split()
+            if len(parts) == 6 and parts[0] == "ROI":
+                try:
+                    nbytes = int(parts[5])
+                except ValueError:
+                    nbytes = -1
+                if not 0 <= nbytes <= MAX_PAYLOAD:
+                    # The stream cannot be resynchronized past a bad length
+                    print(f"Invalid ROI payload length: {parts[5]}")
+                    await pending.put(asyncio.create_task(
+                        asyncio.sleep(0, "ERROR Invalid ROI payload")))
+                    break
+                payload = await reader.readexactly(nbytes)
+
+            await pending.put(asyncio.create_task(handle_request(header, scheduler, payload)))
+        await pending.put(None)
+        await responder
+    except (ConnectionError, asyncio.IncompleteReadError) as e:
+        print(f"Error handling client: {e}")
+    finally:
+        # Cancelling a request task also cancels its scheduler future, so
+        # the ROIs of a client that went away are dropped from their batch
+        responder.cancel()
+        while not pending.empty():
+            task = pending.get_nowait()
+            if task is not None:
+                task.cancel()
+        writer.close()
+        CONNECTIONS.dec()
+        print(f"Connection closed: {addr}")
+
+async def start_metrics_server(host, port):
+    """
+    Serves the Prometheus metrics on port. Best effort: the ROI server runs
+    on without metrics if the port cannot be bound (e.g. already in use).
+    """
+    try:
+        server = await asyncio.start_server(metrics.handle_scrape, host, port, reuse_address=True)
+    except OSError as e:
+        print(f"WARNING: Could not serve metrics on port {port}: {e}")
+        return None
+    print(f"Serving Prometheus metrics on port {port}")
+    return server
+
+async def serve(host, port, classifier, max_batch=32, max_wait_ms=5.0, metrics_port=0):
+    # Keras models are not thread-safe, so inference runs on a single thread
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='inference')
+    scheduler = BatchScheduler(classifier, executor, max_batch, max_wait_ms)
+    scheduler.start()
+    start = time.perf_counter()
+    QUEUE_DEPTH.set_function(scheduler.queue.qsize)
+    server = await asyncio.start_server(
+        lambda r, w: handle_client(r, w, scheduler),
+        host, port, reuse_address=True, backlog=128
+    )
+    metrics_server = await start_metrics_server(host, metrics_port) if metrics_port else None
+    print(f"Listening for connections (max batch {scheduler.max_batch}, "
+          f"max wait {max_wait_ms} ms)...")
+    try:
+        async with server:
+            # Accept connections (READY answers LOADING) while the model loads
+            # on the inference thread; warm up the batch sizes most used
+            await asyncio.get_running_loop().run_in_executor(
+                executor, classifier.load, (1, scheduler.max_batch))
+            scheduler.ready.set()
+            print(f"Ready ({(time.perf_counter() - start) * 1000:.0f} ms after start)", flush=True)
+            await server.serve_forever()
+    finally:
+        if metrics_server:
+            metrics_server.close()
+        await scheduler.stop()
+        print(f"Batch stats: {json.dumps(scheduler.stats.snapshot())}")
+        executor.shutdown(wait=False)
 
 def main():
     parser = argparse.ArgumentParser(description='Emotion Classification Server')
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind to')
     parser.add_argument('--port', type=int, default=8888, help='Port to bind to')
     parser.add_argument('--model', help='Path to model file (optional, uses mock if not provided)')
+    parser.add_argument('--max-batch', type=int, default=32,
+                        help='Maximum ROIs per forward pass')
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help='Maximum time an ROI waits for its batch to fill')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='Serve Prometheus metrics over HTTP on this port (default: off)')
     args = parser.parse_args()
 
     print(f"Starting Emotion Server on {args.host}:{args.port}...")
@@ -68,55 +453,11 @@ def main():
     # Initialize classifier
     classifier = EmotionClassifier(args.model)
 
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    
     try:
-        server_socket.bind((args.host, args.port))
-        server_socket.listen(1)
-        print("Listening for connections...")
-
-        while True:
-            client_socket, addr = server_socket.accept()
-            print(f"Connection from {addr}")
-            
-            try:
-                # Expect header: "ROI x y w h\n"
-                header = ""
-                while '\n' not in header:
-                    chunk = client_socket.recv(1).decode('utf-8')
-                    if not chunk: break
-                    header += chunk
-                
-                print(f"Received header: {header.strip()}")
-                
-                if header.startswith("ROI"):
-                    parts = header.strip().split()
-                    if len(parts) >= 5:
-                        x, y, w, h = map(int, parts[1:5])
-                        print(f"Processing ROI: x={x}, y={y}, w={w}, h={h}")
-                        
-                        # Predict emotion using classifier
-                        emotion, confidence = classifier.predict()
-                        response = f"{emotion} (confidence: {confidence:.2f}%)"
-                        
-                        print(f"Sending result: {response}")
-                        client_socket.sendall((response + "\n").encode('utf-8'))
-                    else:
-                        print("Invalid ROI format")
-                else:
-                    print("Unknown command")
-                    
-            except Exception as e:
-                print(f"Error handling client: {e}")
-            finally:
-                client_socket.close()
-                print("Connection closed")
-                
+        asyncio.run(serve(args.host, args.port, classifier, args.max_batch, args.max_wait_ms,
+                          args.metrics_port))
     except KeyboardInterrupt:
         print("\nStopping server...")
-    finally:
-        server_socket.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
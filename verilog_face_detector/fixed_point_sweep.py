@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+fixed_point_sweep.py
+Re-quantizes the cascade at alternative fixed-point formats and reports
+the narrowest ROM words and accumulators that preserve detections.
+
+Feature values are exact integers: rect sums times small integer weights.
+Weak thresholds are compared with them directly, so they stay in feature
+units (the XML value x 2^16) whatever the format. The format only applies
+to the stage thresholds, the leaf values and the stage accumulator that
+sums them.
+
+For each format the cascade is evaluated on every window of a corpus, with
+every stage and no early exit, and compared against a float reference that
+uses the XML values unquantized. The report counts stage decisions,
+windows and first detections that change. For every fractional width it
+also gives the minimum leaf, stage, weak-threshold, feature-accumulator and
+ROM word widths. Those widths are a hardware estimate only, reported in
+report.json: the RTL keeps 32-bit cascade words. Formats that do not
+overflow are written out as cascade_q<I>_<F>.mem/.coe simulation images,
+their values sign-extended to 32 bits, which the unchanged RTL loads
+with +CASCADE=<file> and evaluates exactly as quantized.
+
+Usage:
+    python3 fixed_point_sweep.py sim/prepared_images/corpus.frames
+    python3 fixed_point_sweep.py corpus.frames --formats Q16.16,Q8.8,Q4.12 --leaf-bits 16
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from parse_cascade import (FIXED_POINT_BITS, FIXED_POINT_FRAC, _write_coe, cascade_rom_words,
+                           fixed_point_array, hex_words, load_ir, write_mem_file)
+from reference_detector import CASCADE_IR_FILE, SUM_WIDTH, ReferenceDetector, iter_images
+
+BASE_DIR = Path(__file__).resolve().parent
+OUTPUT_DIR = BASE_DIR / 'data/fixed_point'
+DEFAULT_FORMATS = 'Q16.16,Q12.12,Q8.8,Q6.10,Q4.12,Q8.4'
+
+
+def signed_bits(values):
+    """Smallest two's complement width that holds every value."""
+    values = np.asarray(values, dtype=np.int64)
+    if values.size == 0:
+        return 1
+    lo, hi = int(values.min()), int(values.max())
+    return max(hi.bit_length(), (-lo - 1).bit_length() if lo < 0 else 0) + 1
+
+
+def unsigned_bits(value):
+    return max(int(value).bit_length(), 1)
+
+
+def wrap(values, bits):
+    """Two's complement wrap-around to the given width."""
+    half = 1 << (bits - 1)
+    return ((np.asarray(values, dtype=np.int64) + half) & ((1 << bits) - 1)) - half
+
+
+def parse_format(text):
+    try:
+        int_bits, frac_bits = (int(v) for v in text.upper().lstrip('Q').split('.'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected a format like Q8.8, got {text!r}")
+    return int_bits, frac_bits
+
+
+class QuantizedCascade:
+    """Stage thresholds, leaves and stage sums at one format (None = float)."""
+
+    def __init__(self, ir, name, frac_bits=None, value_bits=None, leaf_bits=None):
+        self.name = name
+        self.frac_bits = frac_bits
+        self.value_bits = value_bits
+        self.leaf_bits = leaf_bits or value_bits
+        offsets = ir['stage_offsets']
+        self.slices = [slice(offsets[s], offsets[s + 1]) for s in range(len(offsets) - 1)]
+        self.weak_threshold = fixed_point_array(ir['clf_threshold'], FIXED_POINT_FRAC)
+
+        if frac_bits is None:
+            self.weak_threshold = ir['clf_threshold'] * 2.0**FIXED_POINT_FRAC
+            self.left, self.right = ir['clf_left'], ir['clf_right']
+            self.stage_threshold = ir['stage_threshold']
+            self.overflow = []
+            return
+
+        left = fixed_point_array(ir['clf_left'], frac_bits)
+        right = fixed_point_array(ir['clf_right'], frac_bits)
+        stage_thr = fixed_point_array(ir['stage_threshold'], frac_bits)
+        self.overflow = []
+        if signed_bits(np.concatenate([left, right])) > self.leaf_bits:
+            self.overflow.append('leaves')
+        if signed_bits(stage_thr) > value_bits:
+            self.overflow.append('stage thresholds')
+        bound = [np.maximum(np.abs(left[sl]), np.abs(right[sl])).sum() for sl in self.slices]
+        if signed_bits(bound) > value_bits:
+            self.overflow.append('stage sums')
+        self.left, self.right = wrap(left, self.leaf_bits), wrap(right, self.leaf_bits)
+        self.stage_threshold = wrap(stage_thr, value_bits)
+
+    def stage_passes(self, features):
+        """Pass mask (windows, stages) from per-stage (feature_value, unknown) pairs."""
+        passes = []
+        for s, (sl, (feature_value, unknown)) in enumerate(zip(self.slices, features)):
+            left = (feature_value < self.weak_threshold[sl][None]) & ~unknown
+            outputs = np.where(left, self.left[sl][None], self.right[sl][None])
+            stage_sum = outputs.sum(axis=1)
+            if self.frac_bits is not None:
+                stage_sum = wrap(stage_sum, self.value_bits)
+            passes.append(stage_sum >= self.stage_threshold[s])
+        return np.stack(passes, axis=1)
+
+
+def minimum_widths(ir, frac_bits, detector):
+    """Widths that hold every quantized value at frac_bits without overflow."""
+    leaves = fixed_point_array(np.concatenate([ir['clf_left'], ir['clf_right']]), frac_bits)
+    stage_thr = fixed_point_array(ir['stage_threshold'], frac_bits)
+    offsets = ir['stage_offsets']
+    left = fixed_point_array(ir['clf_left'], frac_bits)
+    right = fixed_point_array(ir['clf_right'], frac_bits)
+    bound = [np.maximum(np.abs(left[a:b]), np.abs(right[a:b])).sum()
+             for a, b in zip(offsets[:-1], offsets[1:])]
+    stage_bits = max(signed_bits(stage_thr), signed_bits(bound))
+
+    # |feature value| <= sum over rects of |weight| * area * 255
+    feature_bound = 0
+    for geom in detector._stage_geometry(detector.scales[0]):
+        area = (geom['x2'] - geom['x1']) * (geom['y2'] - geom['y1'])
+        feature_bound = max(feature_bound, int((np.where(geom['used'], np.abs(geom['weight']) * area, 0)
+                                                .sum(axis=1)).max()) * 255)
+
+    widths = {
+        'frac_bits': frac_bits,
+        'leaf_bits': signed_bits(leaves),
+        'stage_bits': stage_bits,
+        'weak_threshold_bits': signed_bits(fixed_point_array(ir['clf_threshold'], FIXED_POINT_FRAC)),
+        'feature_acc_bits': signed_bits([feature_bound, -feature_bound]),
+        'feature_index_bits': unsigned_bits(len(ir['feature_offsets']) - 2),
+        'count_bits': unsigned_bits(np.diff(offsets).max()),
+        'rect_sum_bits': SUM_WIDTH,
+    }
+    widths['rom_word_bits'] = max(widths['leaf_bits'], widths['stage_bits'],
+                                  widths['weak_threshold_bits'], widths['feature_index_bits'],
+                                  widths['count_bits'])
+    return widths
+
+
+def write_format(out_dir, ir, name, frac_bits):
+    """
+    Writes the cascade ROM simulation image of one format. Values are
+    quantized to frac_bits but stored sign-extended in the 32-bit words
+    haar_cascade_rom.v holds, so $readmemh never zero-extends a negative
+    threshold or leaf.
+    """
+    stem = name.lower().replace('.', '_')
+    mem_file = out_dir / f"cascade_{stem}.mem"
+    write_mem_file(mem_file, ir, frac_bits, FIXED_POINT_BITS)
+    _write_coe(out_dir / f"cascade_{stem}.coe",
+               hex_words(cascade_rom_words(ir, frac_bits), FIXED_POINT_BITS))
+    return mem_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep fixed-point formats for the cascade ROM')
+    parser.add_argument('images', nargs='+', help='Image files and/or packed corpora (.frames)')
+    parser.add_argument('--ir', default=CASCADE_IR_FILE, help='Cascade IR from parse_cascade.py')
+    parser.add_argument('--formats', default=DEFAULT_FORMATS,
+                        help=f'Comma-separated QI.F formats for stage thresholds, leaves and '
+                             f'stage sums (default: {DEFAULT_FORMATS})')
+    parser.add_argument('--leaf-bits', type=int, help='Store leaf values in this many bits '
+                                                      '(default: the format width)')
+    parser.add_argument('--output', type=Path, default=OUTPUT_DIR, help='Output directory')
+    args = parser.parse_args()
+
+    formats = [parse_format(f) for f in args.formats.split(',') if f.strip()]
+    ir = load_ir(args.ir)
+    detector = ReferenceDetector(ir=ir, num_stages=len(ir['stage_threshold']))
+
+    reference = QuantizedCascade(ir, 'float')
+    models = [QuantizedCascade(ir, f"Q{i}.{f}", f, i + f, args.leaf_bits) for i, f in formats]
+    # Narrowest overflow-free widths at every fractional width
+    auto_widths = {f: minimum_widths(ir, f, detector) for f in range(FIXED_POINT_FRAC, 0, -1)}
+    auto = [QuantizedCascade(ir, f"F{f}", f, w['stage_bits'], w['leaf_bits'])
+            for f, w in auto_widths.items()]
+
+    stats = {m.name: {'stage_flips': 0, 'windows_changed': 0, 'frames_changed': 0}
+             for m in models + auto}
+    images = list(iter_images(args.images))
+    print(f"Evaluating {len(models)} formats (+{len(auto)} minimum-width variants) "
+          f"on {len(images)} images...")
+    wx, wy = detector.window_positions()
+    geometry = detector._stage_geometry(detector.scales[0])
+    decisions = 0
+    for _, image in images:
+        ii = detector.integral_image(image)
+        features = [detector.feature_values(ii, wx, wy, geom) for geom in geometry]
+        ref = reference.stage_passes(features)
+        ref_hits = ref.all(axis=1)
+        ref_first = int(np.argmax(ref_hits)) if ref_hits.any() else -1
+        decisions += ref.size
+        for model in models + auto:
+            passes = model.stage_passes(features)
+            hits = passes.all(axis=1)
+            first = int(np.argmax(hits)) if hits.any() else -1
+            s = stats[model.name]
+            s['stage_flips'] += int((passes != ref).sum())
+            s['windows_changed'] += int((hits != ref_hits).sum())
+            s['frames_changed'] += int(first != ref_first)
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    print(f"\n{'Format':8s} {'Leaf':>5} {'Stage':>6} {'Flips':>7} {'Windows':>8} {'Frames':>7}  Overflow")
+    results = []
+    for model in models:
+        s = stats[model.name]
+        widths = dict(minimum_widths(ir, model.frac_bits, detector),
+                      leaf_bits=model.leaf_bits, stage_bits=model.value_bits)
+        widths['rom_word_bits'] = max(widths['leaf_bits'], widths['stage_bits'],
+                                      widths['weak_threshold_bits'], widths['feature_index_bits'],
+                                      widths['count_bits'])
+        mem_file = None
+        if not model.overflow:
+            mem_file = str(write_format(args.output, ir, model.name, model.frac_bits))
+        results.append(dict(s, format=model.name, overflow=model.overflow, widths=widths,
+                            preserved=s['windows_changed'] == 0, mem_file=mem_file))
+        print(f"{model.name:8s} {model.leaf_bits:5d} {model.value_bits:6d} {s['stage_flips']:7d} "
+              f"{s['windows_changed']:8d} {s['frames_changed']:7d}  {', '.join(model.overflow) or '-'}")
+
+    print(f"\n{'Frac':>4} {'Leaf':>5} {'Stage':>6} {'ROM':>4} {'Flips':>7} {'Windows':>8} {'Frames':>7}")
+    minimum = []
+    for model in auto:
+        s = stats[model.name]
+        w = auto_widths[model.frac_bits]
+        minimum.append(dict(s, widths=w, preserved=s['windows_changed'] == 0))
+        print(f"{model.frac_bits:4d} {w['leaf_bits']:5d} {w['stage_bits']:6d} {w['rom_word_bits']:4d} "
+              f"{s['stage_flips']:7d} {s['windows_changed']:8d} {s['frames_changed']:7d}")
+
+    # Narrowest fractional width from which every wider one preserves detections
+    best = None
+    for entry in minimum:
+        if not entry['preserved']:
+            break
+        best = entry
+    if best:
+        w = best['widths']
+        # Named by the narrow value format; stored sign-extended to 32 bits
+        name = f"Q{w['rom_word_bits'] - w['frac_bits']}.{w['frac_bits']}"
+        write_format(args.output, ir, name, w['frac_bits'])
+        print(f"\nMinimum widths preserving all detections ({decisions} stage decisions): "
+              f"{w['frac_bits']} fractional bits, {w['leaf_bits']}-bit leaves, "
+              f"{w['stage_bits']}-bit stage thresholds/sums, {w['weak_threshold_bits']}-bit weak "
+              f"thresholds, {w['feature_acc_bits']}-bit feature accumulator -> "
+              f"{w['rom_word_bits']}-bit ROM words (hardware estimate; the RTL uses "
+              f"{FIXED_POINT_BITS})")
+        print(f"Simulation image (32-bit words, +CASCADE=<file>): "
+              f"{args.output / ('cascade_' + name.lower().replace('.', '_'))}.mem/.coe")
+    else:
+        print(f"\nNo format below Q{FIXED_POINT_BITS - FIXED_POINT_FRAC}.{FIXED_POINT_FRAC} "
+              f"preserves all detections on this corpus")
+
+    report = {
+        'images': len(images),
+        'stage_decisions': decisions,
+        'formats': results,
+        'minimum_widths': minimum,
+        'recommended': best['widths'] if best else None,
+        # Widths are estimates for a narrower datapath; the images are 32-bit
+        'image_word_bits': FIXED_POINT_BITS,
+    }
+    report_path = args.output / 'report.json'
+    report_path.write_text(json.dumps(report, indent=1) + '\n')
+    print(f"Report: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
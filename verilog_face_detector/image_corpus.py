@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+image_corpus.py
+Packed image corpus: N 64x64 grayscale frames in one file.
+
+<name>.frames holds the frames back to back as raw uint8 (row-major, no
+header), so frame k starts at byte k*64*64. <name>.json is the index:
+frame size, count and the name/source of every frame. Python maps the
+file with np.memmap; simulations load frame k straight into test_image
+with the $load_corpus_frame VPI task (+CORPUS=<file> +FRAME=<k>).
+
+Hex text files ($readmemh, Vivado COE flows) can still be exported per
+frame with write_hex().
+
+Usage:
+    python3 image_corpus.py build test_images/ -o sim/prepared_images/corpus.frames
+    python3 image_corpus.py info sim/prepared_images/corpus.frames
+    python3 image_corpus.py export-hex sim/prepared_images/corpus.frames out_dir/
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+IMG_WIDTH = 64
+IMG_HEIGHT = 64
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.pgm')
+
+# "%02x\n" for every byte value, so hex export is one table lookup
+_HEX_LINES = np.array([list(f"{v:02x}\n".encode()) for v in range(256)], dtype=np.uint8)
+
+
+def index_path(frames_path):
+    return Path(frames_path).with_suffix('.json')
+
+
+def write_hex(frame, path):
+    """Writes a frame as one "%02x" line per pixel ($readmemh format)."""
+    pixels = np.ascontiguousarray(frame, dtype=np.uint8).ravel()
+    Path(path).write_bytes(_HEX_LINES[pixels].tobytes())
+
+
+def write_corpus(frames_path, frames, names, sources=None, metadata=None):
+    """
+    Writes an (N, H, W) uint8 stack and its index. names label the frames
+    (e.g. the source image file names); metadata optionally adds a dict of
+    extra fields to each frame's index entry.
+    """
+    frames = np.ascontiguousarray(frames, dtype=np.uint8)
+    if frames.ndim != 3 or len(frames) != len(names):
+        raise ValueError("Expected an (N, H, W) frame stack with one name per frame")
+
+    frames_path = Path(frames_path)
+    frames_path.parent.mkdir(parents=True, exist_ok=True)
+    frames.tofile(frames_path)
+
+    sources = sources or [None] * len(names)
+    metadata = metadata or [{}] * len(names)
+    index = {
+        'format': 'uint8',
+        'width': frames.shape[2],
+        'height': frames.shape[1],
+        'count': len(frames),
+        'frames': [dict({'name': str(n), 'source': str(s) if s else None}, **m)
+                   for n, s, m in zip(names, sources, metadata)],
+    }
+    index_path(frames_path).write_text(json.dumps(index, indent=1) + '\n')
+    return frames_path
+
+
+class ImageCorpus:
+    """Read-only, memory-mapped view of a packed corpus."""
+
+    def __init__(self, frames_path):
+        self.path = Path(frames_path)
+        self.index = json.loads(index_path(self.path).read_text())
+        self.width = self.index['width']
+        self.height = self.index['height']
+        self.names = [f['name'] for f in self.index['frames']]
+        count = self.index['count']
+        self.frames = (np.memmap(self.path, dtype=np.uint8, mode='r',
+                                 shape=(count, self.height, self.width))
+                       if count else np.zeros((0, self.height, self.width), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, k):
+        return self.frames[k]
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def index_of(self, name):
+        """Frame number of a named image (e.g. '000001.jpg')."""
+        return self.names.index(name)
+
+
+def build_corpus(image_dir, frames_path):
+    """Resizes every image in image_dir to 64x64 grayscale and packs them."""
+    from prepare_test_images import prepare_corpus
+
+    frames_path = Path(frames_path)
+    # Written (and reused) under its own name, so a default corpus.frames
+    # in the same directory is never rebuilt or moved
+    path, _, _, _ = prepare_corpus([image_dir], frames_path.parent, verbose=False,
+                                   corpus_name=frames_path.name)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Packed 64x64 image corpus tool')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Pack a directory of images')
+    build.add_argument('image_dir')
+    build.add_argument('-o', '--output', default='sim/prepared_images/corpus.frames')
+
+    info = sub.add_parser('info', help='Show the corpus index')
+    info.add_argument('corpus')
+    info.add_argument('--count', action='store_true', help='Only print the frame count')
+
+    export = sub.add_parser('export-hex', help='Write one $readmemh hex file per frame')
+    export.add_argument('corpus')
+    export.add_argument('output_dir')
+    export.add_argument('--frame', type=int, help='Only export this frame')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        path = build_corpus(args.image_dir, args.output)
+        corpus = ImageCorpus(path)
+        print(f"Packed {len(corpus)} frames into {path} ({path.stat().st_size} bytes)")
+    elif args.command == 'info':
+        corpus = ImageCorpus(args.corpus)
+        if args.count:
+            print(len(corpus))
+            return
+        print(f"{corpus.path}: {len(corpus)} frames of {corpus.width}x{corpus.height}")
+        for k, name in enumerate(corpus.names):
+            print(f"[{k:3d}] {name}")
+    elif args.command == 'export-hex':
+        corpus = ImageCorpus(args.corpus)
+        out_dir = Path(args.output_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        frames = [args.frame] if args.frame is not None else range(len(corpus))
+        for k in frames:
+            out = out_dir / f"face_{k + 1:02d}.txt"
+            write_hex(corpus[k], out)
+            print(f"[{k:3d}] {corpus.names[k]} -> {out}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+jobs.py
+Bounded background job queue for app.py uploads.
+
+A POST only saves the upload and enqueues it; a fixed set of worker
+threads runs the prepare / detect / render steps, so slow simulations tie
+up job workers instead of the HTTP threads. The queue is bounded:
+submit() raises QueueFullError when it is full and the caller answers
+"busy" instead of piling up work. Every job records its state and current
+stage; waiters (status polls, server-sent events) are woken on each
+change. Finished jobs are kept, oldest evicted first, until a bounded
+number have accumulated.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+JOB_STATES = ('queued', 'running', 'done', 'failed')
+FINISHED_STATES = ('done', 'failed')
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the pending-job queue is full."""
+
+
+class Job:
+    """State of one queued, running or finished job."""
+
+    def __init__(self, args):
+        self.id = uuid.uuid4().hex
+        self.args = args
+        self.state = 'queued'
+        self.stage = 'queued'
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # Bumped on every change so waiters can tell what they have seen
+        self.version = 0
+        self._changed = threading.Condition()
+
+    def _update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self._changed.notify_all()
+
+    def set_stage(self, stage):
+        """Reports progress from inside the handler, e.g. 'detecting'."""
+        self._update(stage=stage)
+
+    def wait(self, version, timeout=None):
+        """
+        Blocks until the job changes past version or finishes; returns the
+        current version (unchanged on timeout).
+        """
+        with self._changed:
+            self._changed.wait_for(
+                lambda: self.version != version or self.state in FINISHED_STATES, timeout)
+            return self.version
+
+    def snapshot(self):
+        """JSON-serializable view of the job."""
+        with self._changed:
+            info = {'id': self.id, 'state': self.state, 'stage': self.stage,
+                    'created': self.created, 'started': self.started,
+                    'finished': self.finished, 'version': self.version}
+            if self.state == 'done':
+                info['result'] = self.result
+            elif self.state == 'failed':
+                info['error'] = self.error
+            return info
+
+
+class JobManager:
+    """
+    Runs handler(job, *args) for every submitted job on a fixed number of
+    worker threads, with at most max_queued jobs waiting.
+    """
+
+    def __init__(self, handler, workers=2, max_queued=16, keep_finished=256):
+        self.handler = handler
+        self.workers = workers
+        self.max_queued = max_queued
+        self.keep_finished = keep_finished
+
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._threads = []
+        self._stopping = False
+
+    def _start_workers(self):
+        # Worker threads are only spawned once the first job is queued
+        with self._lock:
+            if self._threads:
+                return
+            for k in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'job-{k}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, *args):
+        """
+        Queues a job; raises QueueFullError if max_queued jobs are already
+        waiting or the manager is shutting down.
+        """
+        self._start_workers()
+        job = Job(args)
+        with self._lock:
+            if self._stopping:
+                self._rejected += 1
+                raise QueueFullError("Job queue is shutting down")
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._rejected += 1
+                raise QueueFullError(f"Job queue is full ({self.max_queued} pending)") from None
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        """The job with this id, or None if it is unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Number of jobs queued ahead of job (0 once it is running)."""
+        with self._lock:
+            if job.state != 'queued':
+                return 0
+            ahead = 0
+            for other in self._jobs.values():
+                if other is job:
+                    break
+                ahead += other.state == 'queued'
+            return ahead
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                # Pass the stop sentinel on to the next worker; there is
+                # room, this worker just took it out
+                self._queue.put_nowait(None)
+                return
+            with self._lock:
+                self._running += 1
+            job._update(state='running', stage='running', started=time.time())
+            try:
+                result = self.handler(job, *job.args)
+            except Exception as e:
+                job._update(state='failed', stage='failed', error=str(e), finished=time.time())
+            else:
+                job._update(state='done', stage='done', result=result, finished=time.time())
+            with self._lock:
+                self._running -= 1
+                if job.state == 'done':
+                    self._completed += 1
+                else:
+                    self._failed += 1
+                self._expire()
+
+    def _expire(self):
+        """Drops the oldest finished jobs beyond keep_finished. Caller holds _lock."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'max_queued': self.max_queued,
+                    'queued': self._queue.qsize(), 'running': self._running,
+                    'completed': self._completed, 'failed': self._failed,
+                    'rejected': self._rejected}
+
+    def _cancel_queued(self):
+        """Fails every job still waiting in the queue."""
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is None:
+                continue
+            job._update(state='failed', stage='failed', error='Server shutting down',
+                        finished=time.time())
+            with self._lock:
+                self._failed += 1
+
+    def shutdown(self):
+        """
+        Stops the workers after their current job; queued jobs fail. Never
+        blocks: submit() refuses new jobs from here on, and the queue is
+        drained before the stop sentinel goes in.
+        """
+        with self._lock:
+            self._stopping = True
+        while True:
+            self._cancel_queued()
+            try:
+                self._queue.put_nowait(None)
+                return
+            except queue.Full:
+                continue
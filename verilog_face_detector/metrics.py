@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+metrics.py
+Minimal Prometheus metrics for app.py and emotion_server.py.
+
+Counters, gauges and histograms, optionally labelled, are kept in a
+registry and rendered in the Prometheus text exposition format (version
+0.0.4), so any Prometheus-compatible scraper can read them without extra
+dependencies. Gauges and counters may also be backed by a function, for
+values another object already tracks (queue depths, cache counters).
+All updates are thread-safe.
+
+Usage:
+    import metrics
+    STAGE_SECONDS = metrics.Histogram('app_stage_seconds', 'Stage latency', ['stage'])
+    with STAGE_SECONDS.time(stage='prepare'):
+        ...
+    text = metrics.render()
+"""
+
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Seconds; simulations take up to SIM_TIMEOUT (15 s) in app.py
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Registry:
+    """The metrics exposed by one process."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if any(m.name == metric.name for m in self._metrics):
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        return ''.join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def set_function(self, function):
+        """
+        Reads the value from function() at render time. An unlabelled
+        metric's function returns a number; a labelled one's returns
+        {label value tuple: number}.
+        """
+        self._function = function
+        return self
+
+    def _samples(self):
+        if self._function is None:
+            with self._lock:
+                return sorted(self._values.items())
+        values = self._function()
+        if not self.labelnames:
+            return [((), values)]
+        return sorted((tuple(str(v) for v in key), value) for key, value in values.items())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}",
+                 f"# TYPE {self.name} {self.type}"]
+        for key, value in self._samples():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        super().__init__(name, documentation, labelnames, registry)
+        if not self.labelnames:
+            self._values[()] = 0
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative bucket counts, sum and count of observations."""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS,
+                 registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall time of the with block, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}",
+                 f"# TYPE {self.name} histogram"]
+        with self._lock:
+            samples = sorted((key, (list(counts), total))
+                             for key, (counts, total) in self._values.items())
+        for key, (counts, total) in samples:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+def render(registry=REGISTRY):
+    """All metrics of the registry in the Prometheus text format."""
+    return registry.render()
+
+
+async def handle_scrape(reader, writer, registry=REGISTRY):
+    """
+    Answers one HTTP request on an asyncio stream with the metrics, for
+    servers without a web framework: asyncio.start_server(handle_scrape, ...).
+    """
+    try:
+        request_line = await reader.readline()
+        # Skip the headers
+        while (await reader.readline()).strip():
+            pass
+        if request_line.split()[1:2] in ([b'/metrics'], [b'/']):
+            status, body = '200 OK', render(registry).encode('utf-8')
+        else:
+            status, body = '404 Not Found', b'Not found\n'
+        writer.write(f"HTTP/1.0 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
@@ -1,12 +1,47 @@
-import struct
-from lxml import etree
+"""
+parse_cascade.py
+Compiles the OpenCV Haar cascade XML into the ROM images used by the RTL.
+
+The XML is streamed once with iterparse into a compact, array-backed
+intermediate representation (IR) of stages, weak classifiers, features and
+rectangles, saved as data/cascade_ir.npz. Every output format (.mem, .coe,
+the rom_params.vh include with the exact ROM sizes, and the ROM word arrays
+the NumPy reference engine loads) is generated from the IR. If neither the
+XML nor the compiler (COMPILER_VERSION) changed since the last run, the IR
+and the outputs are left alone.
+
+Usage: python3 parse_cascade.py [--force] [--xml FILE]
+"""
+
+import argparse
+import hashlib
 import os
 
+import numpy as np
+
 # Fixed-point configuration
 FIXED_POINT_BITS = 32
 FIXED_POINT_FRAC = 16
 FIXED_POINT_SCALE = 2**FIXED_POINT_FRAC
 
+# Per-scale geometry LUT read by feature_calculator.v. For every window_scale
+# in GEOMETRY_SCALES (slot order; control_fsm.v drives the slot index), each
+# feature is GEOM_STRIDE words at {slot, feature_index, word}:
+#   word 0      [3:0] rect count, [4i+7:4i+4] rect i weight (signed integer)
+#   word 1..3   rect offsets from the window origin, already scaled:
+#               [31:24] x1, [23:16] y1, [15:8] x2, [7:0] y2 (x2/y2 exclusive)
+# so the hot loop needs no multiplier. Haar weights are whole numbers in
+# Q16.16, so (sum * weight) >> 16 is exactly sum * integer weight.
+GEOMETRY_SCALES = (255,)
+GEOM_STRIDE_LOG2 = 2
+GEOM_STRIDE = 1 << GEOM_STRIDE_LOG2
+FEATURE_INDEX_BITS = 12
+GEOM_SLOT_WORDS = 1 << (FEATURE_INDEX_BITS + GEOM_STRIDE_LOG2)
+MAX_GEOM_WEIGHT = 7
+
+# Bump when the IR layout or any emitter changes, so cached outputs are rebuilt
+COMPILER_VERSION = 4
+
 def float_to_fixed_point(val):
     """Converts a float to a Q16.16 fixed-point integer."""
     return int(val * FIXED_POINT_SCALE)
@@ -15,174 +50,310 @@ def to_hex(val):
     """Converts a signed integer to a 32-bit hex string."""
     return format(val & 0xFFFFFFFF, '08x')
 
-def parse_xml(xml_file):
-    """Parses the Haar cascade XML file and returns the stages and features."""
-    print(f"Parsing {xml_file}...")
-    tree = etree.parse(xml_file)
-    root = tree.getroot()
+def fixed_point_array(values, frac=FIXED_POINT_FRAC, rounding=np.trunc):
+    """Fixed-point conversion of a float array, truncating like float_to_fixed_point."""
+    return rounding(np.asarray(values, dtype=np.float64) * 2.0**frac).astype(np.int64)
+
+def hex_words(values, bits=FIXED_POINT_BITS):
+    """Formats an integer array as two's complement hex strings of the given width."""
+    digits = (bits + 3) // 4
+    mask = (1 << bits) - 1
+    return [format(v, f'0{digits}x') for v in (np.asarray(values, dtype=np.int64) & mask).tolist()]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compile_xml(xml_file):
+    """
+    Streams the Haar cascade XML once and returns the IR: a dict of flat
+    NumPy arrays with CSR-style offsets.
+
+        stage_threshold[S]           stage_offsets[S+1] -> classifier range
+        clf_feature[C], clf_threshold[C], clf_left[C], clf_right[C]
+        feature_offsets[F+1] -> rect range
+        rect_xywh[R, 4], rect_weight[R]
+    """
+    from lxml import etree
 
-    cascade = root.find('.//cascade')
-    if cascade is None:
+    print(f"Parsing {xml_file}...")
+    width = height = None
+    stage_threshold, stage_offsets = [], [0]
+    clf_feature, clf_threshold, clf_left, clf_right = [], [], [], []
+    feature_offsets = [0]
+    rect_xywh, rect_weight = [], []
+    in_cascade = False
+
+    for event, elem in etree.iterparse(str(xml_file), events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'cascade':
+                in_cascade = True
+            continue
+        if not in_cascade:
+            continue
+
+        parent = elem.getparent()
+        parent_tag = parent.tag if parent is not None else None
+
+        if tag == 'width' and parent_tag == 'cascade':
+            width = int(elem.text)
+        elif tag == 'height' and parent_tag == 'cascade':
+            height = int(elem.text)
+        elif tag == 'stageThreshold':
+            stage_threshold.append(float(elem.text))
+        elif tag == 'internalNodes':
+            internal_data = elem.text.split()
+            clf_feature.append(int(internal_data[2]))
+            clf_threshold.append(float(internal_data[3]))
+        elif tag == 'leafValues':
+            leaf_data = elem.text.split()
+            clf_left.append(float(leaf_data[0]))
+            clf_right.append(float(leaf_data[1]))
+        elif tag == '_' and parent_tag == 'rects':
+            rect_data = elem.text.split()
+            rect_xywh.append([int(v) for v in rect_data[:4]])
+            rect_weight.append(float(rect_data[4].rstrip('.')))
+        elif tag == '_' and parent_tag == 'stages':
+            stage_offsets.append(len(clf_feature))
+            elem.clear()
+        elif tag == '_' and parent_tag == 'features':
+            feature_offsets.append(len(rect_weight))
+            elem.clear()
+        elif tag == 'cascade':
+            in_cascade = False
+
+    if width is None or not stage_threshold:
         raise ValueError("Error: Could not find cascade in XML")
+    if not (len(clf_feature) == len(clf_left) == stage_offsets[-1]):
+        raise ValueError("Error: Malformed weak classifiers in XML")
 
-    width = int(cascade.find('width').text)
-    height = int(cascade.find('height').text)
     print(f"Base window size: {width}x{height}")
-
-    features_elem = cascade.find('features')
-    feature_list = features_elem.findall('_')
-    print(f"Found {len(feature_list)} features")
-
-    features = []
-    for feature in feature_list:
-        rects = feature.find('rects')
-        rect_list = rects.findall('_')
-        
-        feature_rects = []
-        for rect in rect_list:
-            rect_data = rect.text.strip().split()
-            x, y, w, h = map(int, rect_data[:4])
-            weight = float(rect_data[4].rstrip('.'))
-            feature_rects.append((x, y, w, h, weight))
-        features.append(feature_rects)
-
-    stages_elem = cascade.find('stages')
-    stage_list = stages_elem.findall('_')
-    print(f"Found {len(stage_list)} stages")
-
-    return stage_list, features, width, height
-
-def write_mem_file(mem_file, stages, features, width, height):
-    """Writes the cascade data to a .mem file."""
+    print(f"Found {len(feature_offsets) - 1} features")
+    print(f"Found {len(stage_threshold)} stages")
+
+    return {
+        'width': np.int32(width),
+        'height': np.int32(height),
+        'stage_threshold': np.array(stage_threshold, dtype=np.float64),
+        'stage_offsets': np.array(stage_offsets, dtype=np.int32),
+        'clf_feature': np.array(clf_feature, dtype=np.int32),
+        'clf_threshold': np.array(clf_threshold, dtype=np.float64),
+        'clf_left': np.array(clf_left, dtype=np.float64),
+        'clf_right': np.array(clf_right, dtype=np.float64),
+        'feature_offsets': np.array(feature_offsets, dtype=np.int32),
+        'rect_xywh': np.array(rect_xywh, dtype=np.int32).reshape(-1, 4),
+        'rect_weight': np.array(rect_weight, dtype=np.float64),
+    }
+
+def save_ir(ir_file, ir, source_sha256):
+    np.savez_compressed(ir_file, source_sha256=np.array(source_sha256),
+                        compiler_version=np.int32(COMPILER_VERSION), **ir)
+
+def load_ir(ir_file):
+    """Loads the IR saved by save_ir (a dict of arrays)."""
+    with np.load(ir_file) as data:
+        return {key: data[key] for key in data.files}
+
+def cascade_rom_words(ir, value_frac=FIXED_POINT_FRAC, rounding=np.trunc):
+    """
+    Words of the cascade ROM in file order: per stage the threshold, the
+    classifier count, then feature index / threshold / left / right.
+
+    Stage thresholds and leaf values use value_frac fractional bits. Weak
+    thresholds always keep FIXED_POINT_FRAC: weak_classifier.v compares them
+    with the integer feature value, so they are in feature units.
+    """
+    stage_thr = fixed_point_array(ir['stage_threshold'], value_frac, rounding)
+    offsets = ir['stage_offsets']
+    clf = np.stack([ir['clf_feature'].astype(np.int64),
+                    fixed_point_array(ir['clf_threshold'], FIXED_POINT_FRAC, rounding),
+                    fixed_point_array(ir['clf_left'], value_frac, rounding),
+                    fixed_point_array(ir['clf_right'], value_frac, rounding)], axis=1)
+
+    words = []
+    for s in range(len(stage_thr)):
+        words.append([stage_thr[s], offsets[s + 1] - offsets[s]])
+        words.append(clf[offsets[s]:offsets[s + 1]].ravel())
+    return np.concatenate(words).astype(np.int64)
+
+def scaled_offsets(coord, scale):
+    """(coord * window_scale) >> 8, evaluated in the 16-bit context the RTL uses."""
+    return ((np.asarray(coord, dtype=np.int64) & 0xFFFF) * scale & 0xFFFF) >> 8
+
+def geometry_rom_words(ir, scales=GEOMETRY_SCALES):
+    """
+    Words of the per-scale geometry LUT (layout above). Slots are
+    GEOM_SLOT_WORDS apart; the last slot is not padded.
+    """
+    offsets = ir['feature_offsets'].astype(np.int64)
+    counts = np.diff(offsets)
+    num_features = len(counts)
+    if num_features > 1 << FEATURE_INDEX_BITS:
+        raise ValueError(f"{num_features} features do not fit a {FEATURE_INDEX_BITS}-bit index")
+    if counts.size and counts.max() > GEOM_STRIDE - 1:
+        raise ValueError(f"A feature has {counts.max()} rectangles, "
+                         f"the geometry LUT holds {GEOM_STRIDE - 1}")
+
+    weights_q16 = fixed_point_array(ir['rect_weight'])
+    weights = weights_q16 >> FIXED_POINT_FRAC
+    # feature_calculator.v takes the sign from bit 3 and the magnitude from
+    # bits [2:0] of the negated nibble, so -8 would decode as 0
+    bad = (weights << FIXED_POINT_FRAC != weights_q16) | (np.abs(weights) > MAX_GEOM_WEIGHT)
+    if bad.any():
+        r = int(np.argmax(bad))
+        raise ValueError(f"Rect {r} weight {ir['rect_weight'][r]} is not an integer "
+                         f"in [-{MAX_GEOM_WEIGHT}, {MAX_GEOM_WEIGHT}]")
+
+    feature_of_rect = np.repeat(np.arange(num_features), counts)
+    slot = np.arange(len(weights)) - offsets[feature_of_rect]
+    header = counts.copy()
+    np.add.at(header, feature_of_rect, (weights & 0xF) << (4 + 4 * slot))
+    nibbles = (header[feature_of_rect] >> (4 + 4 * slot)) & 0xF
+    decoded = np.where(nibbles & 8, -((16 - nibbles) & 7), nibbles & 7)
+    assert (decoded == weights).all(), "Rect weights do not survive the 4-bit sign-magnitude decode"
+
+    x, y, w, h = (ir['rect_xywh'][:, i].astype(np.int64) for i in range(4))
+    words = np.zeros(GEOM_SLOT_WORDS * (len(scales) - 1) + num_features * GEOM_STRIDE,
+                     dtype=np.int64)
+    for n, scale in enumerate(scales):
+        corners = [scaled_offsets(x, scale), scaled_offsets(y, scale),
+                   scaled_offsets(x + w, scale), scaled_offsets(y + h, scale)]
+        if max(c.max(initial=0) for c in corners) > 0xFF:
+            raise ValueError(f"Scaled rectangle offsets exceed 8 bits at window_scale {scale}")
+        table = words[n * GEOM_SLOT_WORDS:n * GEOM_SLOT_WORDS + num_features * GEOM_STRIDE]
+        table = table.reshape(num_features, GEOM_STRIDE)
+        table[:, 0] = header
+        table[feature_of_rect, 1 + slot] = ((corners[0] << 24) | (corners[1] << 16) |
+                                            (corners[2] << 8) | corners[3])
+    return words
+
+def write_mem_file(mem_file, ir, value_frac=FIXED_POINT_FRAC, word_bits=FIXED_POINT_BITS,
+                   rounding=np.trunc):
+    """
+    Writes the cascade data to a .mem file (Q16.16 in 32-bit words by
+    default), one ROM word per line in cascade_rom_words order. The file
+    holds exactly the cascade ROM words and nothing else, so line n is
+    address n - 1 and the ROM can be sized to it; the features live in the
+    geometry LUT.
+    """
     print(f"Writing to {mem_file}...")
+    words = hex_words(cascade_rom_words(ir, value_frac, rounding), word_bits)
     with open(mem_file, 'w') as f:
-        f.write(f"// Haar Cascade Data for Face Detection\n")
-        f.write(f"// Number of stages: {len(stages)}\n")
-        f.write(f"// Number of features: {len(features)}\n")
-        f.write(f"// Base window: {width}x{height}\n")
-        f.write(f"// Format: Fixed-point Q16.16\n\n")
-
-        total_weak_classifiers = 0
-        for stage_idx, stage in enumerate(stages):
-            stage_threshold = float(stage.find('stageThreshold').text)
-            stage_threshold_hex = to_hex(float_to_fixed_point(stage_threshold))
-            f.write(f"// Stage {stage_idx}\n")
-            f.write(f"{stage_threshold_hex}\n")
-
-            classifiers = stage.find('weakClassifiers').findall('_')
-            f.write(f"{len(classifiers):08x}\n")
-            total_weak_classifiers += len(classifiers)
-
-            for classifier in classifiers:
-                internal_data = classifier.find('internalNodes').text.strip().split()
-                feature_idx = int(internal_data[2])
-                threshold = float(internal_data[3])
-
-                leaf_data = classifier.find('leafValues').text.strip().split()
-                left_val = float(leaf_data[0])
-                right_val = float(leaf_data[1])
-
-                feature_idx_hex = to_hex(feature_idx)
-                threshold_hex = to_hex(float_to_fixed_point(threshold))
-                left_hex = to_hex(float_to_fixed_point(left_val))
-                right_hex = to_hex(float_to_fixed_point(right_val))
-                f.write(f"{feature_idx_hex} {threshold_hex} {left_hex} {right_hex}\n")
-            f.write("\n")
-
-        # This part of the file is not used by the Verilog code,
-        # but we'll keep it for debugging purposes.
-        f.write("// === FEATURES SECTION (for debugging) ===\n")
-        for feat_idx, feature_rects in enumerate(features):
-            f.write(f"// Feature {feat_idx}\n")
-            f.write(f"{len(feature_rects):08x}\n")
-            for x, y, w, h, weight in feature_rects:
-                weight_hex = to_hex(float_to_fixed_point(weight))
-                f.write(f"{x:08x} {y:08x} {w:08x} {h:08x} {weight_hex}\n")
-            f.write("\n")
-    print(f"Total weak classifiers: {total_weak_classifiers}")
-
-def write_coe_file(coe_file, stages, features, width, height):
+        f.write('\n'.join(words) + '\n')
+    print(f"Total weak classifiers: {len(ir['clf_feature'])}, {len(words)} ROM words")
+
+def write_coe_file(coe_file, ir):
     """Writes the cascade data to a .coe file."""
     print(f"Writing to {coe_file}...")
+    _write_coe(coe_file, hex_words(cascade_rom_words(ir)))
+
+def _write_coe(coe_file, words):
     with open(coe_file, 'w') as f:
         f.write("memory_initialization_radix=16;\n")
         f.write("memory_initialization_vector=\n")
-
-        all_data = []
-        for stage_idx, stage in enumerate(stages):
-            stage_threshold = float(stage.find('stageThreshold').text)
-            all_data.append(to_hex(float_to_fixed_point(stage_threshold)))
-
-            classifiers = stage.find('weakClassifiers').findall('_')
-            all_data.append(to_hex(len(classifiers)))
-
-            for classifier in classifiers:
-                internal_data = classifier.find('internalNodes').text.strip().split()
-                feature_idx = int(internal_data[2])
-                threshold = float(internal_data[3])
-
-                leaf_data = classifier.find('leafValues').text.strip().split()
-                left_val = float(leaf_data[0])
-                right_val = float(leaf_data[1])
-
-                all_data.append(to_hex(feature_idx))
-                all_data.append(to_hex(float_to_fixed_point(threshold)))
-                all_data.append(to_hex(float_to_fixed_point(left_val)))
-                all_data.append(to_hex(float_to_fixed_point(right_val)))
-
-        f.write(",\n".join(all_data))
+        f.write(",\n".join(words))
         f.write(";\n")
 
-def write_feature_lut_files(mem_file, coe_file, features):
-    """Writes the feature lookup table to .mem and .coe files."""
-    print(f"Writing feature LUT to {mem_file} and {coe_file}...")
-    
-    with open(mem_file, 'w') as f_mem, open(coe_file, 'w') as f_coe:
-        f_coe.write("memory_initialization_radix=16;\n")
-        f_coe.write("memory_initialization_vector=\n")
-
-        all_data_coe = []
-        for feature_rects in features:
-            f_mem.write(f"{len(feature_rects):08x}\n")
-            all_data_coe.append(to_hex(len(feature_rects)))
-
-            for x, y, w, h, weight in feature_rects:
-                weight_fp = float_to_fixed_point(weight)
-                f_mem.write(f"{x:08x} {y:08x} {w:08x} {h:08x} {to_hex(weight_fp)}\n")
-                
-                all_data_coe.append(to_hex(x))
-                all_data_coe.append(to_hex(y))
-                all_data_coe.append(to_hex(w))
-                all_data_coe.append(to_hex(h))
-                all_data_coe.append(to_hex(weight_fp))
-        
-        f_coe.write(",\n".join(all_data_coe))
-        f_coe.write(";\n")
-
-import os
+def write_geometry_files(mem_file, coe_file, ir, scales=GEOMETRY_SCALES):
+    """Writes the per-scale geometry LUT to .mem and .coe files."""
+    print(f"Writing geometry LUT for scales {list(scales)} to {mem_file} and {coe_file}...")
+    words = hex_words(geometry_rom_words(ir, scales))
+    num_features = len(ir['feature_offsets']) - 1
+    lines = [f"// Per-scale feature geometry: {num_features} features x {GEOM_STRIDE} words per scale"]
+    for n, scale in enumerate(scales):
+        base = n * GEOM_SLOT_WORDS
+        lines.append(f"@{base:05x}")
+        lines.append(f"// Slot {n}: window_scale {scale}")
+        for f in range(num_features):
+            record = words[base + f * GEOM_STRIDE:base + (f + 1) * GEOM_STRIDE]
+            lines.append(' '.join(record))
+    with open(mem_file, 'w') as f_mem:
+        f_mem.write('\n'.join(lines) + '\n')
+    _write_coe(coe_file, words)
+
+def address_bits(depth):
+    """Address width of a ROM with depth words (at least 1)."""
+    return max(int(depth - 1).bit_length(), 1)
+
+def write_rom_params(vh_file, ir, scales=GEOMETRY_SCALES):
+    """
+    Writes the Verilog include with the exact depths and address widths of
+    the cascade and geometry ROMs, so the RTL allocates no more than the
+    images hold.
+    """
+    print(f"Writing ROM parameters to {vh_file}...")
+    cascade_depth = len(cascade_rom_words(ir))
+    geom_depth = len(geometry_rom_words(ir, scales))
+    defines = [
+        ('CASCADE_NUM_STAGES', len(ir['stage_threshold'])),
+        ('CASCADE_ROM_DEPTH', cascade_depth),
+        ('CASCADE_ROM_ADDR_WIDTH', address_bits(cascade_depth)),
+        ('FEATURE_ROM_DEPTH', geom_depth),
+        ('FEATURE_ROM_ADDR_WIDTH', address_bits(geom_depth)),
+    ]
+    lines = ["// rom_params.vh",
+             "// ROM sizes for the generated cascade_data.mem and feature_geom.mem",
+             "// (generated by parse_cascade.py, do not edit)",
+             "`ifndef ROM_PARAMS_VH", "`define ROM_PARAMS_VH"]
+    lines += [f"`define {key} {value}" for key, value in defines]
+    lines.append("`endif")
+    with open(vh_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def ir_is_current(ir_file, source_sha256, outputs):
+    """True if ir_file was compiled from this source by this compiler and all outputs exist."""
+    if not os.path.exists(ir_file) or not all(os.path.exists(p) for p in outputs):
+        return False
+    try:
+        with np.load(ir_file) as data:
+            return (str(data['source_sha256']) == source_sha256 and
+                    int(data['compiler_version']) == COMPILER_VERSION)
+    except (OSError, KeyError, ValueError):
+        return False
 
 def main():
     """Main function."""
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    xml_file = os.path.join(script_dir, 'data/haarcascade_frontalface_default.xml')
+    parser = argparse.ArgumentParser(description='Compile the Haar cascade XML into ROM images')
+    parser.add_argument('--xml', default=os.path.join(script_dir, 'data/haarcascade_frontalface_default.xml'))
+    parser.add_argument('--force', action='store_true', help='Rebuild even if the XML is unchanged')
+    args = parser.parse_args()
+
+    xml_file = args.xml
+    ir_file = os.path.join(script_dir, 'data/cascade_ir.npz')
     cascade_mem_file = os.path.join(script_dir, 'data/cascade_data.mem')
     cascade_coe_file = os.path.join(script_dir, 'data/cascade_data.coe')
-    feature_mem_file = os.path.join(script_dir, 'data/feature_lut.mem')
-    feature_coe_file = os.path.join(script_dir, 'data/feature_lut.coe')
+    geom_mem_file = os.path.join(script_dir, 'data/feature_geom.mem')
+    geom_coe_file = os.path.join(script_dir, 'data/feature_geom.coe')
+    rom_params_file = os.path.join(script_dir, 'data/rom_params.vh')
+    outputs = [cascade_mem_file, cascade_coe_file, geom_mem_file, geom_coe_file, rom_params_file]
 
     try:
-        stages, features, width, height = parse_xml(xml_file)
-        
-        write_mem_file(cascade_mem_file, stages, features, width, height)
-        write_coe_file(cascade_coe_file, stages, features, width, height)
-        write_feature_lut_files(feature_mem_file, feature_coe_file, features)
-        
+        source_sha256 = file_sha256(xml_file)
+        if not args.force and ir_is_current(ir_file, source_sha256, outputs):
+            print(f"{xml_file} unchanged (sha256 {source_sha256[:12]}), outputs are up to date.")
+            return
+
+        ir = compile_xml(xml_file)
+        save_ir(ir_file, ir, source_sha256)
+
+        write_mem_file(cascade_mem_file, ir)
+        write_coe_file(cascade_coe_file, ir)
+        write_geometry_files(geom_mem_file, geom_coe_file, ir)
+        write_rom_params(rom_params_file, ir)
+
         print("\nParsing complete!")
         print(f"Output files generated:")
+        print(f"  - {ir_file}")
         print(f"  - {cascade_mem_file}")
         print(f"  - {cascade_coe_file}")
-        print(f"  - {feature_mem_file}")
-        print(f"  - {feature_coe_file}")
+        print(f"  - {geom_mem_file}")
+        print(f"  - {geom_coe_file}")
+        print(f"  - {rom_params_file}")
 
     except (FileNotFoundError, ValueError) as e:
         print(f"Error: {e}")
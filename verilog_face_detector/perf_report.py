@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+perf_report.py
+Aggregates the RTL performance counters over a corpus.
+
+Simulations run with +PERF print one record per detection run (see
+src/perf_counters.v):
+
+    PERF cycles=... integral_cycles=... windows=... stage_evals=n,n,... ...
+
+This script reads the records from simulator logs, +PERF_FILE files or a
+run_regression.py --perf report. It then prints per-run totals and means,
+and per-stage histograms of:
+- evaluations;
+- rejections;
+- the share of cycles each stage takes;
+- how deep windows get before they are rejected.
+
+Usage:
+    python3 run_regression.py sim/prepared_images/corpus.frames --perf
+    python3 perf_report.py sim/regression/results.json
+    python3 perf_report.py perf.log another.log --json perf_summary.json
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+SCALAR_COUNTERS = ['cycles', 'integral_cycles', 'windows', 'features', 'weak_classifiers',
+                   'rect_queries', 'cascade_rom_reads', 'feature_rom_reads', 'face_detected']
+STAGE_COUNTERS = ['stage_evals', 'stage_rejects', 'stage_cycles']
+BAR_WIDTH = 40
+
+
+def parse_perf_line(line):
+    """Parses one 'PERF key=value ...' record; None if line is not one."""
+    line = line.strip()
+    if not line.startswith('PERF '):
+        return None
+    record = {}
+    for field in line.split()[1:]:
+        key, _, value = field.partition('=')
+        if key in STAGE_COUNTERS:
+            record[key] = [int(v) for v in value.split(',')]
+        else:
+            record[key] = int(value)
+    return record
+
+
+def parse_perf_records(text):
+    """All PERF records in a simulator log."""
+    return [r for r in map(parse_perf_line, text.splitlines()) if r is not None]
+
+
+def load_records(paths):
+    """Records from logs / +PERF_FILE files and from run_regression.py JSON reports."""
+    records = []
+    for path in map(Path, paths):
+        text = path.read_text()
+        if path.suffix == '.json':
+            records.extend(r['perf'] for r in json.loads(text)['results'] if r.get('perf'))
+        else:
+            records.extend(parse_perf_records(text))
+    return records
+
+
+def aggregate(records):
+    """Totals, means and per-stage distributions over all records."""
+    scalars = {key: np.array([r.get(key, 0) for r in records], dtype=np.int64)
+               for key in SCALAR_COUNTERS}
+    num_stages = max(len(r['stage_evals']) for r in records)
+    stages = {key: np.zeros(num_stages, dtype=np.int64) for key in STAGE_COUNTERS}
+    for r in records:
+        for key in STAGE_COUNTERS:
+            stages[key][:len(r[key])] += r[key]
+
+    total_cycles = max(int(scalars['cycles'].sum()), 1)
+    evals = stages['stage_evals']
+    rows = []
+    for k in range(num_stages):
+        rows.append({
+            'stage': k,
+            'evaluations': int(evals[k]),
+            'rejections': int(stages['stage_rejects'][k]),
+            'rejection_rate': round(float(stages['stage_rejects'][k] / evals[k]), 4) if evals[k] else 0.0,
+            'cycles': int(stages['stage_cycles'][k]),
+            'cycle_share': round(float(stages['stage_cycles'][k] / total_cycles), 4),
+            'cycles_per_evaluation': round(float(stages['stage_cycles'][k] / evals[k]), 1) if evals[k] else 0.0,
+        })
+
+    weak = max(int(scalars['weak_classifiers'].sum()), 1)
+    return {
+        'runs': len(records),
+        'totals': {key: int(v.sum()) for key, v in scalars.items()},
+        'mean': {key: round(float(v.mean()), 1) for key, v in scalars.items()},
+        'min_cycles': int(scalars['cycles'].min()),
+        'max_cycles': int(scalars['cycles'].max()),
+        'integral_share': round(float(scalars['integral_cycles'].sum() / total_cycles), 4),
+        'cycles_per_weak_classifier': round(float(scalars['cycles'].sum() / weak), 2),
+        'rom_reads_per_weak_classifier': round(
+            float((scalars['cascade_rom_reads'].sum() + scalars['feature_rom_reads'].sum()) / weak), 2),
+        'stages': rows,
+    }
+
+
+def bar(value, peak):
+    return '#' * (round(BAR_WIDTH * value / peak) if peak else 0)
+
+
+def print_report(summary):
+    print(f"Runs: {summary['runs']}   cycles/run: mean {summary['mean']['cycles']:.0f}, "
+          f"min {summary['min_cycles']}, max {summary['max_cycles']}")
+    print(f"Integral image: {summary['integral_share']:.1%} of cycles   "
+          f"cycles per weak classifier: {summary['cycles_per_weak_classifier']}   "
+          f"ROM reads per weak classifier: {summary['rom_reads_per_weak_classifier']}")
+    print("Mean per run: " + ', '.join(f"{key} {summary['mean'][key]}" for key in SCALAR_COUNTERS[1:]))
+
+    rows = summary['stages']
+    peak_evals = max(r['evaluations'] for r in rows)
+    peak_share = max(r['cycle_share'] for r in rows)
+    print(f"\n{'Stage':>5} {'Evals':>9} {'Rejects':>9} {'Reject%':>8} {'Cyc/eval':>9} {'Cycles%':>8}  Cycle share")
+    for r in rows:
+        print(f"{r['stage']:5d} {r['evaluations']:9d} {r['rejections']:9d} "
+              f"{100 * r['rejection_rate']:7.1f}% {r['cycles_per_evaluation']:9.1f} "
+              f"{100 * r['cycle_share']:7.1f}%  {bar(r['cycle_share'], peak_share)}")
+
+    # Windows rejected at stage k went k + 1 stages deep
+    peak_rejects = max(max(r['rejections'] for r in rows), 1)
+    print("\nRejection depth (windows rejected at each stage)")
+    for r in rows:
+        print(f"{r['stage']:5d} {r['rejections']:9d}  {bar(r['rejections'], peak_rejects)}")
+    print("\nEvaluations per stage")
+    for r in rows:
+        print(f"{r['stage']:5d} {r['evaluations']:9d}  {bar(r['evaluations'], peak_evals)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregate RTL performance counters over a corpus')
+    parser.add_argument('inputs', nargs='+',
+                        help='Simulator logs, +PERF_FILE files or run_regression.py --perf JSON reports')
+    parser.add_argument('--json', type=Path, help='Also write the summary as JSON')
+    args = parser.parse_args()
+
+    records = load_records(args.inputs)
+    if not records:
+        print("No PERF records found. Run the simulation with +PERF (or run_regression.py --perf).")
+        sys.exit(1)
+
+    summary = aggregate(records)
+    print_report(summary)
+    if args.json:
+        args.json.write_text(json.dumps(summary, indent=1) + '\n')
+        print(f"\nSummary: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,23 @@
 #!/usr/bin/env python3
 # prepare_test_images.py
-# Converts all images in test_images/ to 64x64 grayscale hex format for Verilog simulation
+# Converts all images in test_images/ to 64x64 grayscale frames for Verilog simulation.
+# Writes a packed corpus (sim/prepared_images/corpus.frames + corpus.json, see
+# image_corpus.py); pass --hex to also write one $readmemh hex file per image.
+#
+# Images are converted in a process pool. The corpus index doubles as the
+# manifest: it records each source's content hash, so a rerun only converts
+# images that are new or changed (or all of them if the output size changed).
+#
+# Usage:
+#   python3 prepare_test_images.py [--input DIR ...] [--output DIR] [--size WxH]
+#                                  [--jobs N] [--recursive] [--hex] [--force]
 
+import argparse
+import hashlib
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import numpy as np
 
@@ -12,35 +27,196 @@ except ImportError:
     print("ERROR: Pillow is not installed. Please run: pip install Pillow numpy")
     exit(1)
 
+from image_corpus import IMAGE_EXTENSIONS, ImageCorpus, index_path, write_corpus, write_hex
+
 INPUT_DIR = Path("test_images")
 OUTPUT_DIR = Path("sim/prepared_images")
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+CORPUS_NAME = "corpus.frames"
 
 OUTPUT_WIDTH = 64
 OUTPUT_HEIGHT = 64
 
-image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.pgm']
 
-images = [f for f in INPUT_DIR.iterdir() if f.suffix.lower() in image_extensions]
-if not images:
-    print(f"No images found in {INPUT_DIR}/. Supported formats: {image_extensions}")
-    exit(1)
+def find_images(input_dirs, recursive=False):
+    """Returns (name, path) pairs; names are relative to their input directory."""
+    found = []
+    for input_dir in map(Path, input_dirs):
+        paths = input_dir.rglob('*') if recursive else input_dir.iterdir()
+        for path in paths:
+            if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS:
+                name = path.relative_to(input_dir).as_posix()
+                if len(input_dirs) > 1:
+                    name = f"{input_dir.name}/{name}"
+                found.append((name, path))
+    return sorted(found)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-print(f"Found {len(images)} images in {INPUT_DIR}/. Converting to Verilog hex format...")
 
-for idx, img_path in enumerate(sorted(images), 1):
+def convert_image(task):
+    """Worker: (path, width, height) -> (sha256, frame) or (None, error)."""
+    path, width, height = task
     try:
-        img = Image.open(img_path).convert('L')
-        img = img.resize((OUTPUT_WIDTH, OUTPUT_HEIGHT), Image.Resampling.LANCZOS)
-        arr = np.array(img)
-        out_path = OUTPUT_DIR / f"face_{idx:02d}.txt"
-        with open(out_path, 'w') as f:
-            for y in range(OUTPUT_HEIGHT):
-                for x in range(OUTPUT_WIDTH):
-                    f.write(f"{arr[y, x]:02x}\n")
-        print(f"[{idx:2d}] {img_path.name:20s} -> {out_path.name}")
+        sha = file_sha256(path)
+        img = Image.open(path).convert('L')
+        img = img.resize((width, height), Image.Resampling.LANCZOS)
+        return sha, np.asarray(img, dtype=np.uint8)
     except Exception as e:
-        print(f"Error processing {img_path.name}: {e}")
+        return None, str(e)
+
+
+def load_manifest(corpus_path, width, height):
+    """Previous run's frames by name, if the corpus exists at this size."""
+    if not index_path(corpus_path).exists() or not corpus_path.exists():
+        return None, {}
+    try:
+        corpus = ImageCorpus(corpus_path)
+    except (OSError, ValueError, KeyError):
+        return None, {}
+    if (corpus.width, corpus.height) != (width, height):
+        return None, {}
+    return corpus, {entry['name']: (k, entry) for k, entry in enumerate(corpus.index['frames'])}
+
+
+def prepare_corpus(input_dirs=(INPUT_DIR,), output_dir=OUTPUT_DIR, width=OUTPUT_WIDTH,
+                   height=OUTPUT_HEIGHT, jobs=None, recursive=False, write_hex_files=False,
+                   force=False, verbose=True, corpus_name=CORPUS_NAME):
+    """
+    Converts every image under input_dirs into output_dir/<corpus_name>
+    (corpus.frames by default). Unchanged images are copied from the
+    previous corpus of that name instead of being decoded again; other
+    corpora in output_dir are left alone. Returns (corpus_path, converted,
+    reused, failed).
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    corpus_path = output_dir / corpus_name
+
+    images = find_images(input_dirs, recursive)
+    old_corpus, manifest = (None, {}) if force else load_manifest(corpus_path, width, height)
+
+    # An image is unchanged if its size and mtime match the manifest (then
+    # its recorded hash is trusted) or if its content hash does
+    frames = np.zeros((len(images), height, width), dtype=np.uint8)
+    metadata = [None] * len(images)
+    old_position = {}
+    stale = []
+    for i, (name, path) in enumerate(images):
+        st = path.stat()
+        entry = manifest.get(name)
+        if entry is not None:
+            k, info = entry
+            same_file = info.get('bytes') == st.st_size and info.get('mtime_ns') == st.st_mtime_ns
+            if same_file or (info.get('bytes') == st.st_size and info.get('sha256') == file_sha256(path)):
+                frames[i] = old_corpus[k]
+                old_position[i] = k
+                metadata[i] = {'sha256': info['sha256'], 'bytes': st.st_size,
+                               'mtime_ns': st.st_mtime_ns, 'hex': info.get('hex', False)}
+                continue
+        stale.append(i)
+
+    failed = []
+    if stale:
+        tasks = [(images[i][1], width, height) for i in stale]
+        workers = min(jobs or os.cpu_count() or 1, len(tasks))
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(convert_image, tasks, chunksize=max(1, len(tasks) // (workers * 8))))
+        else:
+            results = [convert_image(t) for t in tasks]
+
+        for i, (sha, frame) in zip(stale, results):
+            name, path = images[i]
+            if sha is None:
+                print(f"Error processing {name}: {frame}")
+                failed.append(i)
+                continue
+            frames[i] = frame
+            st = path.stat()
+            metadata[i] = {'sha256': sha, 'bytes': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                           'hex': False}
+
+    # The old corpus is still mapped; drop it before overwriting the file
+    del old_corpus
+    failed_set = set(failed)
+    keep = [i for i in range(len(images)) if i not in failed_set]
+    converted = set(stale) - failed_set
+
+    # Hex files are numbered by frame: rewrite those that are missing, out
+    # of date ('hex' is False once a frame changes) or whose frame moved
+    for idx, i in enumerate(keep):
+        hex_path = output_dir / f"face_{idx + 1:02d}.txt"
+        if old_position.get(i) != idx:
+            metadata[i]['hex'] = False
+        if write_hex_files and not (metadata[i]['hex'] and hex_path.exists()):
+            write_hex(frames[i], hex_path)
+            metadata[i]['hex'] = True
+    # ...and drop those numbered past the last frame when the set shrank
+    if write_hex_files:
+        for hex_path in output_dir.glob('face_*.txt'):
+            number = hex_path.stem[len('face_'):]
+            if number.isdigit() and int(number) > len(keep):
+                hex_path.unlink()
+
+    write_corpus(corpus_path, frames[keep], [images[i][0] for i in keep],
+                 [images[i][1] for i in keep], [metadata[i] for i in keep])
+
+    if verbose:
+        for idx, i in enumerate(keep):
+            status = "converted" if i in converted else "unchanged"
+            print(f"[{idx + 1:2d}] {images[i][0]:20s} -> frame {idx} ({status})")
+
+    return corpus_path, len(converted), len(keep) - len(converted), len(failed)
+
+
+def parse_size(text):
+    try:
+        width, height = (int(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected WIDTHxHEIGHT, got {text!r}")
+    return width, height
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prepare images for the Verilog face detector')
+    parser.add_argument('--input', action='append', type=Path,
+                        help=f'Input directory (repeatable, default: {INPUT_DIR})')
+    parser.add_argument('--output', type=Path, default=OUTPUT_DIR, help='Output directory')
+    parser.add_argument('--size', type=parse_size, default=(OUTPUT_WIDTH, OUTPUT_HEIGHT),
+                        help='Frame size as WIDTHxHEIGHT (default: 64x64, the RTL size)')
+    parser.add_argument('--jobs', type=int, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--recursive', action='store_true', help='Search input directories recursively')
+    parser.add_argument('--hex', action='store_true', help='Also write one hex file per image')
+    parser.add_argument('--force', action='store_true', help='Ignore the manifest and convert everything')
+    parser.add_argument('--quiet', action='store_true', help='Only print the summary')
+    args = parser.parse_args()
+
+    input_dirs = args.input or [INPUT_DIR]
+    width, height = args.size
+    if not find_images(input_dirs, args.recursive):
+        print(f"No images found in {', '.join(map(str, input_dirs))}. "
+              f"Supported formats: {list(IMAGE_EXTENSIONS)}")
+        sys.exit(1)
+
+    start = time.monotonic()
+    corpus_path, converted, reused, failed = prepare_corpus(
+        input_dirs, args.output, width, height, args.jobs, args.recursive,
+        args.hex, args.force, verbose=not args.quiet)
+    elapsed = time.monotonic() - start
+
+    print(f"\nCorpus: {corpus_path} ({converted + reused} frames of {width}x{height}; "
+          f"{converted} converted, {reused} unchanged, {failed} failed) in {elapsed:.2f}s")
+    if args.hex:
+        print(f"Hex files are in {args.output}/. To test, copy one to sim/image.txt and run simulation.")
+    else:
+        print("To test, run: make test-all   (or vvp ... run_sim +CORPUS=<corpus> +FRAME=<k>)")
+
 
-print(f"\nAll images converted. Hex files are in {OUTPUT_DIR}/.")
-print("To test, copy one to sim/image.txt and run simulation.")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
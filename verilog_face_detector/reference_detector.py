@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+reference_detector.py
+Bit-exact NumPy model of the Verilog Haar cascade face detector.
+
+Loads the same ROM images as the RTL (data/cascade_data.mem and the
+per-scale geometry LUT data/feature_geom.mem, or the words parse_cascade.py
+generates them from, cached in data/cascade_ir.npz) and evaluates the
+Q16.16 cascade exactly like control_fsm.v, stage_evaluator.v,
+feature_calculator.v and weak_classifier.v, but for all detection windows
+at once. app.py uses it as a fast detection backend; the RTL simulation
+remains the reference for verification.
+"""
+
+import sys
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+DATA_DIR = BASE_DIR / 'data'
+CASCADE_MEM_FILE = DATA_DIR / 'cascade_data.mem'
+GEOM_MEM_FILE = DATA_DIR / 'feature_geom.mem'
+CASCADE_IR_FILE = DATA_DIR / 'cascade_ir.npz'
+
+# These must match the RTL parameters (face_detector.v / control_fsm.v)
+IMG_WIDTH = 64
+IMG_HEIGHT = 64
+NUM_STAGES = 25
+MIN_WINDOW_SIZE = 24
+STEP_SIZE = 4
+DEFAULT_SCALES = (255,)  # control_fsm.v only scans at window_scale = 255
+FIXED_POINT_FRAC = 16
+SUM_WIDTH = 24
+MAX_RECTS = 15           # num_rects is a 4-bit register in feature_calculator.v
+GEOMETRY_SCALES = (255,) # Slot order of the geometry LUT (parse_cascade.py)
+GEOM_STRIDE = 4          # feature_calculator.v reads {slot, feature_index, word}
+GEOM_SLOT_WORDS = 1 << 14
+
+Detection = namedtuple('Detection', ['face_detected', 'face_x', 'face_y', 'face_scale'])
+
+
+def window_size(scale):
+    """Window side in pixels for a window_scale, as face_size in control_fsm.v."""
+    return (MIN_WINDOW_SIZE * (int(scale) + 1)) >> 8
+
+
+def read_mem_file(path):
+    """Reads a $readmemh-style hex file (with @address jumps) into 32-bit words."""
+    words = []
+    with open(path) as f:
+        for line in f:
+            for token in line.split('//', 1)[0].split():
+                if token.startswith('@'):
+                    addr = int(token[1:], 16)
+                    words.extend([0] * (addr - len(words)))
+                    del words[addr:]
+                else:
+                    words.append(int(token, 16))
+    return np.array(words, dtype=np.uint32)
+
+
+def to_signed(words, bits=32):
+    """Interprets unsigned words as two's complement values (as int64)."""
+    words = np.asarray(words, dtype=np.int64) & ((1 << bits) - 1)
+    return np.where(words >= (1 << (bits - 1)), words - (1 << bits), words)
+
+
+def load_image(path, width=IMG_WIDTH, height=IMG_HEIGHT):
+    """Loads a prepared hex image (.txt) or any image file as a uint8 array."""
+    path = Path(path)
+    if path.suffix == '.txt':
+        return read_mem_file(path).astype(np.uint8).reshape(height, width)
+
+    from PIL import Image
+    img = Image.open(path).convert('L')
+    img = img.resize((width, height), Image.Resampling.LANCZOS)
+    return np.array(img)
+
+
+def iter_images(paths):
+    """Yields (label, image) for image files and every frame of packed corpora."""
+    for path in paths:
+        if Path(path).suffix == '.frames':
+            from image_corpus import ImageCorpus
+            corpus = ImageCorpus(path)
+            for k, name in enumerate(corpus.names):
+                yield f"{path}[{k}] {name}", corpus[k]
+        else:
+            yield path, load_image(path)
+
+
+class ReferenceDetector:
+    """Vectorized, fixed-point equivalent of face_detector.v"""
+
+    def __init__(self, cascade_mem=None, geom_mem=None, ir_file=CASCADE_IR_FILE,
+                 num_stages=NUM_STAGES, img_width=IMG_WIDTH, img_height=IMG_HEIGHT,
+                 scales=DEFAULT_SCALES, batch_size=4096, ir=None):
+        self.img_width = img_width
+        self.img_height = img_height
+        self.scales = tuple(scales)
+        self.batch_size = batch_size
+
+        # The compiled IR skips parsing ~10k hex lines; explicit .mem files win
+        if ir is None and cascade_mem is None and geom_mem is None and ir_file and Path(ir_file).exists():
+            from parse_cascade import load_ir
+            ir = load_ir(ir_file)
+        if ir is not None:
+            from parse_cascade import cascade_rom_words, geometry_rom_words
+            self.cascade_words = (cascade_rom_words(ir) & 0xFFFFFFFF).astype(np.uint32)
+            self.geom_words = (geometry_rom_words(ir, GEOMETRY_SCALES) & 0xFFFFFFFF).astype(np.uint32)
+        else:
+            self.cascade_words = read_mem_file(cascade_mem or CASCADE_MEM_FILE)
+            self.geom_words = read_mem_file(geom_mem or GEOM_MEM_FILE)
+        self.stages = self._unpack_stages(num_stages)
+        self._geometry = {}
+
+    def _unpack_stages(self, num_stages):
+        """Walks the cascade ROM the way control_fsm.v and stage_evaluator.v do."""
+        words = self.cascade_words
+        stages = []
+        addr = 0
+        for _ in range(num_stages):
+            threshold = int(to_signed(words[addr]))
+            count = int(words[addr + 1]) & 0xFFFF
+            clf = words[addr + 2:addr + 2 + 4 * count].reshape(count, 4)
+            stages.append({
+                'threshold': threshold,
+                'feature_idx': clf[:, 0].astype(np.int64) & 0xFFF,
+                'threshold_wc': to_signed(clf[:, 1]),
+                'left': to_signed(clf[:, 2]),
+                'right': to_signed(clf[:, 3]),
+            })
+            addr += 2 + 4 * count
+        return stages
+
+    def _feature_geometry(self, feature_idx, scale):
+        """
+        Reads each feature's record from the geometry LUT slot of this scale
+        as feature_calculator.v does. Returns per-rect offsets relative to
+        the window origin, integer weights, and masks for used / undefined
+        rects.
+        """
+        if scale not in GEOMETRY_SCALES:
+            raise ValueError(f"window_scale {scale} has no geometry LUT slot "
+                             f"(compiled for {GEOMETRY_SCALES})")
+        lut = self.geom_words
+        lut_len = len(lut)
+
+        base = GEOMETRY_SCALES.index(scale) * GEOM_SLOT_WORDS + feature_idx * GEOM_STRIDE
+        header_ok = base < lut_len
+        header = np.where(header_ok, lut[np.minimum(base, lut_len - 1)], 0).astype(np.int64)
+        # The FSM always processes at least one rectangle
+        num_rects = np.maximum(header & 0xF, 1)
+
+        r = np.arange(MAX_RECTS)
+        used = r[None, :] < num_rects[:, None]
+        addr = base[:, None] + 1 + r[None, :]
+        defined = (addr < lut_len) & header_ok[:, None]
+        fields = lut[np.minimum(addr, lut_len - 1)].astype(np.int64)
+
+        # Weights are three signed 4-bit fields after the count; the RTL
+        # shifts them out one per rect, so any further rects weigh 0
+        nibbles = np.where(r[None, :] < 3, header[:, None] >> (4 + 4 * np.minimum(r, 2))[None, :], 0) & 0xF
+        weight = np.where(nibbles >= 8, nibbles - 16, nibbles)
+
+        return {
+            'x1': (fields >> 24) & 0xFF,
+            'y1': (fields >> 16) & 0xFF,
+            'x2': (fields >> 8) & 0xFF,
+            'y2': fields & 0xFF,
+            'weight': weight,
+            'used': used,
+            'undefined': used & ~defined,
+        }
+
+    def _stage_geometry(self, scale):
+        if scale not in self._geometry:
+            self._geometry[scale] = [
+                self._feature_geometry(stage['feature_idx'], scale)
+                for stage in self.stages
+            ]
+        return self._geometry[scale]
+
+    def window_positions(self):
+        """Window origins in the order NEXT_WINDOW visits them."""
+        xs = [0]
+        while xs[-1] + MIN_WINDOW_SIZE + STEP_SIZE < self.img_width:
+            xs.append(xs[-1] + STEP_SIZE)
+        ys = [0]
+        while ys[-1] + MIN_WINDOW_SIZE + STEP_SIZE < self.img_height:
+            ys.append(ys[-1] + STEP_SIZE)
+        wy, wx = np.meshgrid(np.array(ys), np.array(xs), indexing='ij')
+        return wx.ravel(), wy.ravel()
+
+    def integral_image(self, image):
+        """Integral image with a zero row/column prepended (SUM_WIDTH bits)."""
+        image = np.asarray(image, dtype=np.int64).reshape(self.img_height, self.img_width)
+        ii = np.zeros((self.img_height + 1, self.img_width + 1), dtype=np.int64)
+        ii[1:, 1:] = image.cumsum(axis=0).cumsum(axis=1)
+        return ii & ((1 << SUM_WIDTH) - 1)
+
+    def _rect_sums(self, ii, wx, wy, geom):
+        """
+        Rectangle sums for windows (N,) x rects (C, R). Returns the sums and a
+        mask of queries that index outside the integral image (X in the RTL).
+        """
+        wx = wx[:, None, None]
+        wy = wy[:, None, None]
+        qx1 = (wx + geom['x1']) & 0xFFFF
+        qy1 = (wy + geom['y1']) & 0xFFFF
+        qx2 = (wx + geom['x2'] - 1) & 0xFFFF
+        qy2 = (wy + geom['y2'] - 1) & 0xFFFF
+
+        # integral_image.v only reads x1-1 / y1-1 when x1 / y1 are non-zero
+        out_of_range = ((qx2 >= self.img_width) | (qy2 >= self.img_height) |
+                        (qx1 > self.img_width) | (qy1 > self.img_height))
+
+        max_x = self.img_width
+        max_y = self.img_height
+        x1 = np.minimum(qx1, max_x)
+        y1 = np.minimum(qy1, max_y)
+        x2 = np.minimum(qx2 + 1, max_x)
+        y2 = np.minimum(qy2 + 1, max_y)
+        sums = ii[y2, x2] - ii[y1, x2] - ii[y2, x1] + ii[y1, x1]
+        return sums & ((1 << SUM_WIDTH) - 1), out_of_range
+
+    def feature_values(self, ii, wx, wy, geom):
+        """
+        Feature values for windows (N,) x a stage's classifiers (C,), and a
+        mask of values the RTL leaves undefined (X).
+        """
+        sums, out_of_range = self._rect_sums(ii, wx, wy, geom)
+
+        # feature_calculator.v: accumulator += rect_sum * integer weight
+        scaled = to_signed(sums * geom['weight'][None])
+        used = geom['used'][None]
+        feature_value = to_signed(np.where(used, scaled, 0).sum(axis=2))
+
+        # An undefined rect sum turns the accumulator into X
+        unknown = np.any(used & (out_of_range | geom['undefined'][None]), axis=2)
+        return feature_value, unknown
+
+    def _evaluate_stage(self, ii, wx, wy, stage, geom):
+        """Returns a boolean pass mask for windows (N,) on one stage."""
+        feature_value, unknown = self.feature_values(ii, wx, wy, geom)
+
+        # weak_classifier.v takes the else branch (right_val) on X
+        left = (feature_value < stage['threshold_wc'][None]) & ~unknown
+        outputs = np.where(left, stage['left'][None], stage['right'][None])
+
+        stage_sum = to_signed(outputs.sum(axis=1))
+        return stage_sum >= stage['threshold']
+
+    def scan(self, image, stage_counts=None):
+        """
+        Evaluates the full cascade on every window and scale.
+        Returns (x, y, scale) tuples of passing windows in RTL scan order.
+        If stage_counts is given, stage_counts[k] is incremented by the
+        number of windows that reach stage k.
+        """
+        ii = self.integral_image(image)
+        wx_all, wy_all = self.window_positions()
+        hits = []
+        for scale in self.scales:
+            geometry = self._stage_geometry(scale)
+            for start in range(0, len(wx_all), self.batch_size):
+                wx = wx_all[start:start + self.batch_size]
+                wy = wy_all[start:start + self.batch_size]
+                active = np.arange(len(wx))
+                for k, (stage, geom) in enumerate(zip(self.stages, geometry)):
+                    if len(active) == 0:
+                        break
+                    if stage_counts is not None:
+                        stage_counts[k] += len(active)
+                    passed = self._evaluate_stage(ii, wx[active], wy[active], stage, geom)
+                    active = active[passed]
+                hits.extend((int(wx[i]), int(wy[i]), scale) for i in active)
+        return hits
+
+    def detect_all(self, image):
+        """Every passing window as (x, y, size), like face_detector.v with scan_all."""
+        return [(x, y, window_size(scale)) for x, y, scale in self.scan(image)]
+
+    def detect(self, image):
+        """Returns the first detection, matching face_x/face_y/face_scale of the RTL."""
+        hits = self.scan(image)
+        if not hits:
+            return Detection(False, None, None, None)
+        x, y, scale = hits[0]
+        return Detection(True, x, y, scale)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 reference_detector.py <image.txt|image.jpg|corpus.frames> [...]")
+        print("Example: python3 reference_detector.py sim/prepared_images/corpus.frames")
+        sys.exit(1)
+
+    detector = ReferenceDetector()
+    for path, image in iter_images(sys.argv[1:]):
+        result = detector.detect(image)
+        if result.face_detected:
+            print(f"{path}: Face detected at ({result.face_x}, {result.face_y}) "
+                  f"scale {result.face_scale}")
+        else:
+            print(f"{path}: No face detected")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+result_cache.py
+Content-addressed cache of detection + emotion results for app.py.
+
+Keys hash the prepared 64x64 grayscale frame together with the detector
+backend, the emotion model and a fingerprint of the design (cascade
+ROMs, RTL, testbenches, VPI module and reference model), so editing the
+hardware, reloading the cascade or installing another model never serves
+stale results. Entries live in a bounded in-memory LRU and,
+optionally, as one JSON file per key in a directory that survives
+restarts.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# Everything that can change what a backend returns for a given frame
+DESIGN_FILES = [
+    'data/cascade_data.mem',
+    'data/feature_geom.mem',
+    'data/rom_params.vh',
+    'data/cascade_ir.npz',
+    'src/*.v',
+    'sim/tb_emotion_classifier.v',
+    'sim/tb_detector_daemon.v',
+    'sim/verilator/sim_main.cpp',
+    'sim/wave_trace.vh',
+    'vpi/verilog_python_interface.c',
+    'reference_detector.py',
+    'detections.py',
+]
+
+
+def design_version(base_dir=BASE_DIR, patterns=DESIGN_FILES):
+    """Short hash of the cascade data, RTL and reference model sources."""
+    digest = hashlib.sha256()
+    for pattern in patterns:
+        for path in sorted(Path(base_dir).glob(pattern)):
+            digest.update(str(path.relative_to(base_dir)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """Thread-safe LRU of JSON-serializable results with optional disk store."""
+
+    def __init__(self, max_entries=512, disk_dir=None, version=None):
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.version = version or design_version()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, image_array, backend):
+        """Cache key for a prepared frame on a backend."""
+        pixels = np.ascontiguousarray(image_array, dtype=np.uint8)
+        digest = hashlib.sha256()
+        digest.update(f"{self.version}:{backend}:{pixels.shape}:".encode())
+        digest.update(pixels.tobytes())
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return self.disk_dir / f"{key}.json"
+
+    def _remember(self, key, value):
+        """Inserts into the LRU; the caller holds the lock."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """Returns the cached result or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = None
+        if self.disk_dir:
+            try:
+                value = json.loads(self._disk_path(key).read_text())
+            except (OSError, ValueError):
+                value = None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        if self.disk_dir:
+            # Write-then-rename so a crash never leaves a truncated entry
+            fd, tmp = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(value, f)
+                os.replace(tmp, self._disk_path(key))
+            except OSError as e:
+                print(f"WARNING: Could not persist cache entry: {e}")
+                Path(tmp).unlink(missing_ok=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_dir': str(self.disk_dir) if self.disk_dir else None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+run_regression.py
+Runs the RTL face detector over an image set in parallel and checks every result.
+
+Each image is simulated with sim/tb_face_detector.v on a SimulationPool
+worker (one per CPU by default), in its own scratch directory, with the
+per-cycle trace turned off (+QUIET) and no waveform. The detection,
+position, simulated cycles and wall time of every run are compared
+against the expected detection:
+- by default, the bit-exact NumPy reference model;
+- or a JSON file of an earlier run (--expected), e.g. one written with
+  --write-expected.
+
+Results are written as JSON and JUnit XML. The exit status is non-zero if
+any image mismatches, errors or times out. With --perf, the RTL counters
+(+PERF) are stored with each result for perf_report.py.
+
+Usage:
+    python3 run_regression.py sim/prepared_images/corpus.frames
+    python3 run_regression.py sim/prepared_images/face_*.txt --jobs 8 --timeout 300
+    python3 run_regression.py corpus.frames --expected expected.json --junit results.xml
+"""
+
+import argparse
+import json
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import as_completed
+from pathlib import Path
+
+from image_corpus import write_hex
+from perf_report import parse_perf_records
+from reference_detector import ReferenceDetector, iter_images
+from sim_pool import BASE_DIR, SIM_DIR, SimulationPool
+
+TESTBENCH = SIM_DIR / 'tb_face_detector.v'
+REGRESSION_EXEC = SIM_DIR / 'run_regression'
+OUTPUT_DIR = SIM_DIR / 'regression'
+DEFAULT_TIMEOUT = 300  # seconds per image
+PLUSARGS = ['+QUIET']
+
+
+def compile_testbench(sim_exec=REGRESSION_EXEC, force=False):
+    """Builds the face-only testbench unless sim_exec is newer than every source."""
+    rtl = sorted((BASE_DIR / 'src').glob('*.v'))
+    sources = [TESTBENCH, SIM_DIR / 'wave_trace.vh', BASE_DIR / 'data/rom_params.vh', *rtl]
+    if (not force and sim_exec.exists() and
+            sim_exec.stat().st_mtime >= max(p.stat().st_mtime for p in sources)):
+        return
+    print(f"Compiling {TESTBENCH.name} and RTL with Icarus Verilog...")
+    cmd = ['iverilog', '-g2012', '-o', str(sim_exec), f'-I{BASE_DIR / "data"}', f'-I{SIM_DIR}',
+           str(TESTBENCH), *map(str, rtl)]
+    subprocess.run(cmd, check=True)
+
+
+def parse_output(stdout):
+    """Detection and cycle count printed by tb_face_detector.v (None if absent)."""
+    result = {'face_detected': None, 'face_x': None, 'face_y': None, 'face_scale': None,
+              'cycles': None}
+    if 'FACE DETECTED' in stdout:
+        result['face_detected'] = True
+        position = re.search(r"Position: \(\s*(\d+),\s*(\d+)\)", stdout)
+        scale = re.search(r"Scale:\s*(\d+)", stdout)
+        if position:
+            result['face_x'], result['face_y'] = int(position.group(1)), int(position.group(2))
+        if scale:
+            result['face_scale'] = int(scale.group(1))
+    elif 'No face detected' in stdout:
+        result['face_detected'] = False
+    cycles = re.search(r"Cycles: (\d+)", stdout)
+    if cycles:
+        result['cycles'] = int(cycles.group(1))
+    return result
+
+
+def expected_detection(detection):
+    """The fields of a Detection (or a stored result) that must match."""
+    if not detection['face_detected']:
+        return {'face_detected': False}
+    return {key: detection[key] for key in ('face_detected', 'face_x', 'face_y', 'face_scale')}
+
+
+def check_result(name, sim, expected):
+    """Classifies one simulation as pass, fail, error or timeout."""
+    record = dict(parse_output(sim.stdout), name=name, wall_time=round(sim.wall_time, 3),
+                  expected=expected)
+    perf = parse_perf_records(sim.stdout)
+    if perf:
+        record['perf'] = perf[0]
+    if sim.timed_out:
+        record.update(status='timeout', message='Simulation timed out')
+    elif sim.returncode != 0 or record['face_detected'] is None:
+        tail = (sim.stderr or sim.stdout).strip().splitlines()[-5:]
+        record.update(status='error', message=' | '.join(tail) or f"vvp exited with {sim.returncode}")
+    elif expected is None:
+        record.update(status='error', message='No expected result for this image')
+    elif expected_detection(record) != expected:
+        record.update(status='fail', message=f"got {expected_detection(record)}, expected {expected}")
+    else:
+        record.update(status='pass', message='')
+    return record
+
+
+def write_junit(path, results, elapsed):
+    """Writes the results as a single JUnit testsuite."""
+    failures = sum(r['status'] == 'fail' for r in results)
+    errors = sum(r['status'] in ('error', 'timeout') for r in results)
+    suite = ET.Element('testsuite', name='rtl_regression', tests=str(len(results)),
+                       failures=str(failures), errors=str(errors), time=f"{elapsed:.3f}")
+    for r in results:
+        case = ET.SubElement(suite, 'testcase', classname='face_detector', name=r['name'],
+                             time=f"{r['wall_time']:.3f}")
+        if r['status'] == 'fail':
+            ET.SubElement(case, 'failure', message=r['message'])
+        elif r['status'] != 'pass':
+            ET.SubElement(case, 'error', type=r['status'], message=r['message'])
+        ET.SubElement(case, 'system-out').text = f"cycles={r['cycles']}"
+    ET.ElementTree(suite).write(path, encoding='utf-8', xml_declaration=True)
+
+
+def run_regression(images, expected, jobs=None, timeout=DEFAULT_TIMEOUT, perf=False, verbose=True):
+    """
+    Simulates every (name, frame) of images and checks it against
+    expected[name]. Returns the per-image results in input order.
+    """
+    plusargs = PLUSARGS + ['+PERF'] if perf else PLUSARGS
+    hex_dir = Path(tempfile.mkdtemp(prefix='regression_'))
+    pool = SimulationPool(sim_exec=REGRESSION_EXEC, vpi_dir=None, max_workers=jobs,
+                          max_pending=len(images), timeout=timeout)
+    try:
+        pending = {}
+        for k, (name, frame) in enumerate(images):
+            hex_path = hex_dir / f"frame_{k:05d}.txt"
+            write_hex(frame, hex_path)
+            pending[pool.submit(hex_path, plusargs).future] = (k, name)
+
+        results = [None] * len(images)
+        for future in as_completed(pending):
+            k, name = pending[future]
+            results[k] = check_result(name, future.result(), expected.get(name))
+            if verbose:
+                r = results[k]
+                found = (f"face at ({r['face_x']}, {r['face_y']})" if r['face_detected']
+                         else 'no face' if r['face_detected'] is False else '-')
+                print(f"[{r['status'].upper():7s}] {name}: {found}, {r['cycles']} cycles, "
+                      f"{r['wall_time']:.2f}s {r['message']}".rstrip(), flush=True)
+        return results
+    finally:
+        pool.shutdown()
+        shutil.rmtree(hex_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel RTL regression over an image set')
+    parser.add_argument('images', nargs='+', help='Hex images (.txt), image files and/or packed corpora (.frames)')
+    parser.add_argument('--jobs', type=int, help='Parallel simulations (default: one per CPU)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds per image')
+    parser.add_argument('--expected', type=Path,
+                        help='Expected results JSON (default: the NumPy reference model)')
+    parser.add_argument('--write-expected', type=Path,
+                        help='Also store this run\'s RTL detections as an expected results JSON')
+    parser.add_argument('--json', type=Path, default=OUTPUT_DIR / 'results.json', help='JSON report')
+    parser.add_argument('--junit', type=Path, default=OUTPUT_DIR / 'results.xml', help='JUnit XML report')
+    parser.add_argument('--perf', action='store_true', help='Record the RTL performance counters (+PERF)')
+    parser.add_argument('--no-compile', action='store_true', help=f'Use the existing {REGRESSION_EXEC.name}')
+    args = parser.parse_args()
+
+    images = list(iter_images(args.images))
+    if not images:
+        parser.error("no images given")
+    if args.expected:
+        expected = json.loads(args.expected.read_text())
+    else:
+        detector = ReferenceDetector()
+        expected = {name: expected_detection(detector.detect(frame)._asdict()) for name, frame in images}
+
+    if not args.no_compile:
+        compile_testbench()
+
+    print(f"Simulating {len(images)} images...")
+    start = time.monotonic()
+    results = run_regression(images, expected, args.jobs, args.timeout, args.perf)
+    elapsed = time.monotonic() - start
+
+    counts = {status: sum(r['status'] == status for r in results)
+              for status in ('pass', 'fail', 'error', 'timeout')}
+    cycles = [r['cycles'] for r in results if r['cycles'] is not None]
+    report = {
+        'images': len(results),
+        'summary': counts,
+        'wall_time': round(elapsed, 3),
+        'mean_cycles': round(sum(cycles) / len(cycles)) if cycles else None,
+        'expected_source': str(args.expected) if args.expected else 'reference_detector',
+        'results': results,
+    }
+    for path in (args.json, args.junit):
+        path.parent.mkdir(parents=True, exist_ok=True)
+    args.json.write_text(json.dumps(report, indent=1) + '\n')
+    write_junit(args.junit, results, elapsed)
+    if args.write_expected:
+        args.write_expected.write_text(json.dumps(
+            {r['name']: expected_detection(r) for r in results if r['face_detected'] is not None},
+            indent=1) + '\n')
+
+    print(f"\nSummary: {counts['pass']} passed, {counts['fail']} failed, {counts['error']} errors, "
+          f"{counts['timeout']} timed out in {elapsed:.1f}s")
+    print(f"Reports: {args.json}, {args.junit}")
+    if args.perf:
+        print(f"Counters: python3 perf_report.py {args.json}")
+    if counts['pass'] != len(results):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+// tb_detector_daemon.v
+// Long-lived testbench for the face detector
+// Pulls 64x64 frames from the Python job queue (sim_daemon.py) over VPI,
+// runs detection on each and reports the result, without restarting vvp.
+//
+// Usage: vvp -M../vpi -mverilog_python_interface run_daemon +JOBQ_PORT=<port>
+
+`timescale 1ns / 1ps
+
+module tb_detector_daemon;
+
+    // Parameters
+    parameter IMG_WIDTH = 64;
+    parameter IMG_HEIGHT = 64;
+    parameter PIXEL_WIDTH = 8;
+    parameter CLK_PERIOD = 10;  // 100MHz clock
+    parameter FRAME_TIMEOUT_CYCLES = 20000000;  // Same budget as tb_emotion_classifier.v
+
+    // Signals
+    reg clk;
+    reg rst;
+    reg start;
+    reg [PIXEL_WIDTH-1:0] pixel_in;
+    reg pixel_valid;
+
+    wire face_detected;
+    wire [7:0] face_x;
+    wire [7:0] face_y;
+    wire [7:0] face_scale;
+    wire [7:0] face_size;
+    wire detection_valid;
+    wire done;
+
+    // Current frame, filled by $fetch_frame (row-major, one pixel per word)
+    reg [PIXEL_WIDTH-1:0] frame [0:IMG_WIDTH*IMG_HEIGHT-1];
+
+    integer job_id;
+    integer frame_timeout;
+    integer cycles;
+    integer frames_done;
+    integer i;
+
+    // DUT
+    face_detector #(
+        .IMG_WIDTH(IMG_WIDTH),
+        .IMG_HEIGHT(IMG_HEIGHT),
+        .PIXEL_WIDTH(PIXEL_WIDTH)
+    ) dut (
+        .clk(clk),
+        .rst(rst),
+        .start(start),
+        .scan_all(1'b0),            // First hit only; RESULT carries one window
+        .pixel_in(pixel_in),
+        .pixel_valid(pixel_valid),
+        .face_detected(face_detected),
+        .face_x(face_x),
+        .face_y(face_y),
+        .face_scale(face_scale),
+        .face_size(face_size),
+        .detection_valid(detection_valid),
+        .done(done)
+    );
+
+    // Clock
+    initial begin
+        clk = 0;
+        forever #(CLK_PERIOD/2) clk = ~clk;
+    end
+
+    // Job loop: all stimulus changes on the falling edge so the DUT
+    // samples stable values on the rising edge
+    initial begin
+        if (!$value$plusargs("FRAME_TIMEOUT=%d", frame_timeout))
+            frame_timeout = FRAME_TIMEOUT_CYCLES;
+
+        rst = 1;
+        start = 0;
+        pixel_in = 0;
+        pixel_valid = 0;
+        frames_done = 0;
+
+        $display("Detector daemon started");
+
+        forever begin
+            $fetch_frame(frame, job_id);
+            if (job_id < 0) begin
+                $display("Job queue closed after %0d frames", frames_done);
+                $finish;
+            end
+
+            // Reset the detector between frames
+            @(negedge clk);
+            rst = 1;
+            start = 0;
+            pixel_valid = 0;
+            repeat (5) @(negedge clk);
+            rst = 0;
+            repeat (2) @(negedge clk);
+
+            start = 1;
+            @(negedge clk);
+            start = 0;
+
+            // Feed pixels
+            for (i = 0; i < IMG_WIDTH * IMG_HEIGHT; i = i + 1) begin
+                @(negedge clk);
+                pixel_in = frame[i];
+                pixel_valid = 1;
+            end
+            @(negedge clk);
+            pixel_valid = 0;
+
+            // done is a single-cycle pulse; sample the outputs while it is high
+            cycles = 0;
+            while (!done && cycles < frame_timeout) begin
+                @(negedge clk);
+                cycles = cycles + 1;
+            end
+
+            if (done)
+                $report_detection(job_id, 0, face_detected, face_x, face_y, face_scale, cycles);
+            else
+                $report_detection(job_id, 1, 0, 0, 0, 0, cycles);
+            frames_done = frames_done + 1;
+        end
+    end
+
+    // Waveform tracing, off unless +WAVE=<scope> is given
+`define WAVE_TOP tb_detector_daemon
+`include "wave_trace.vh"
+
+endmodule
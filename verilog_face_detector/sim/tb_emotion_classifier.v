@@ -22,14 +22,29 @@ module tb_emotion_classifier;
     wire [7:0] face_x;
     wire [7:0] face_y;
     wire [7:0] face_scale;
+    wire [7:0] face_size;
+    wire detection_valid;
     wire done;
     
-    // Test image memory
-    reg [PIXEL_WIDTH-1:0] test_image [0:IMG_HEIGHT-1][0:IMG_WIDTH-1];
+    // Test image memory (1-D, row-major, so the VPI can index it)
+    reg [PIXEL_WIDTH-1:0] test_image [0:IMG_WIDTH*IMG_HEIGHT-1];
     
     // Counters
     integer x, y;
     integer pixel_count;
+
+    // Packed corpus frame (+CORPUS=<file> +FRAME=<k>)
+    integer frame_index;
+    integer corpus_ok;
+
+    // Detection result, latched while done is high
+    reg det_found;
+    reg [7:0] det_x, det_y, det_scale, det_size;
+
+    // +ALL_FACES: the detector reports every passing window and Python
+    // merges and classifies them (app.py, detections.py)
+    reg scan_all;
+    integer windows;
     
     // DUT
     face_detector #(
@@ -40,12 +55,15 @@ module tb_emotion_classifier;
         .clk(clk),
         .rst(rst),
         .start(start),
+        .scan_all(scan_all),
         .pixel_in(pixel_in),
         .pixel_valid(pixel_valid),
         .face_detected(face_detected),
         .face_x(face_x),
         .face_y(face_y),
         .face_scale(face_scale),
+        .face_size(face_size),
+        .detection_valid(detection_valid),
         .done(done)
     );
     
@@ -57,8 +75,19 @@ module tb_emotion_classifier;
     
     // Load Image
     initial begin
+        // A packed corpus frame is loaded straight into test_image by the VPI
+        if ($test$plusargs("CORPUS=")) begin
+            if (!$value$plusargs("FRAME=%d", frame_index))
+                frame_index = 0;
+            $load_corpus_frame(test_image, frame_index, corpus_ok);
+            if (!corpus_ok) begin
+                $display("ERROR: Could not load corpus frame %0d", frame_index);
+                $finish;
+            end
+            $display("Loaded corpus frame %0d", frame_index);
+        end
         // Get image filename from plusarg or default
-        if (!$value$plusargs("IMAGE=%s", x)) begin
+        else if (!$value$plusargs("IMAGE=%s", x)) begin
             $readmemh("image.txt", test_image);
             $display("Loaded image.txt (default)");
         end else begin
@@ -71,9 +100,8 @@ module tb_emotion_classifier;
     
     // Main
     initial begin
-        $dumpfile("waveform.vcd");
-        $dumpvars(0, tb_emotion_classifier);
-        
+        scan_all = $test$plusargs("ALL_FACES");
+        windows = 0;
         rst = 1;
         start = 0;
         pixel_in = 0;
@@ -94,7 +122,7 @@ module tb_emotion_classifier;
         for (y = 0; y < IMG_HEIGHT; y = y + 1) begin
             for (x = 0; x < IMG_WIDTH; x = x + 1) begin
                 @(posedge clk);
-                pixel_in = test_image[y][x];
+                pixel_in = test_image[y*IMG_WIDTH + x];
                 pixel_valid = 1;
                 pixel_count = pixel_count + 1;
             end
@@ -104,20 +132,24 @@ module tb_emotion_classifier;
         pixel_valid = 0;
         
         wait(done);
+        // done is a single-cycle pulse and the FSM clears face_detected
+        // when it returns to IDLE, so latch the outputs right away
+        det_found = face_detected;
+        det_x = face_x;
+        det_y = face_y;
+        det_scale = face_scale;
+        det_size = face_size;
         #(CLK_PERIOD * 10);
         
-        if (face_detected) begin
-            $display("✓ Face detected at (%d, %d)", face_x, face_y);
+        if (scan_all) begin
+            // The windows were printed as they passed; Python takes it from here
+            $display("%0d windows passed", windows);
+        end else if (det_found) begin
+            $display("✓ Face detected at (%d, %d) size %0d", det_x, det_y, det_size);
             $display("Calling Python Emotion Classifier...");
             
-            // VPI Call
-            // Scale is usually the size of the window. Haar default is 24x24.
-            // The 'face_scale' output from detector might be the scale factor index or size.
-            // Let's assume we send x, y, width, height.
-            // Width/Height = 24 * (1.25^scale). 
-            // For this test, we just pass dummy width/height (24) or the scale value.
-            
-            $send_roi_for_emotion(face_x, face_y, 24, 24);
+            // The face window's pixels are read from test_image and sent along
+            $send_roi_for_emotion(det_x, det_y, det_size, det_size, test_image, IMG_WIDTH);
             
         end else begin
             $display("✗ No face detected.");
@@ -126,6 +158,14 @@ module tb_emotion_classifier;
         $finish;
     end
     
+    // Every passing window; face_* hold it while detection_valid is high
+    always @(posedge clk) begin
+        if (scan_all && detection_valid) begin
+            $display("Window at (%0d, %0d) size %0d", face_x, face_y, face_size);
+            windows = windows + 1;
+        end
+    end
+    
     // Watchdog
     initial begin
         #(CLK_PERIOD * 20000000); // 200ms
@@ -133,4 +173,8 @@ module tb_emotion_classifier;
         $finish;
     end
 
+    // Waveform tracing, off unless +WAVE=<scope> is given
+`define WAVE_TOP tb_emotion_classifier
+`include "wave_trace.vh"
+
 endmodule
@@ -22,14 +22,29 @@ module tb_face_detector;
     wire [7:0] face_x;
     wire [7:0] face_y;
     wire [7:0] face_scale;
+    wire [7:0] face_size;
+    wire detection_valid;
     wire done;
     
     // Test image memory
-    reg [PIXEL_WIDTH-1:0] test_image [0:IMG_HEIGHT-1][0:IMG_WIDTH-1];
+    reg [PIXEL_WIDTH-1:0] test_image [0:IMG_WIDTH*IMG_HEIGHT-1];
     
     // Counters for image loading
     integer x, y;
     integer pixel_count;
+
+    // Detection result, latched while done is high
+    reg det_found;
+    reg [7:0] det_x, det_y, det_scale;
+
+    // Cycles from start to done; +QUIET drops the per-cycle trace
+    // (run_regression.py passes it)
+    time start_time;
+    integer det_cycles;
+    reg quiet;
+
+    // +ALL_FACES: report every passing window, not just the first
+    reg scan_all;
     
     // DUT instantiation
     face_detector #(
@@ -40,12 +55,15 @@ module tb_face_detector;
         .clk(clk),
         .rst(rst),
         .start(start),
+        .scan_all(scan_all),
         .pixel_in(pixel_in),
         .pixel_valid(pixel_valid),
         .face_detected(face_detected),
         .face_x(face_x),
         .face_y(face_y),
         .face_scale(face_scale),
+        .face_size(face_size),
+        .detection_valid(detection_valid),
         .done(done)
     );
     
@@ -64,10 +82,9 @@ module tb_face_detector;
     
     // Main test sequence
     initial begin
-        // Setup waveform dump
-        $dumpfile("waveform.vcd");
-        $dumpvars(0, tb_face_detector);
-        
+        quiet = $test$plusargs("QUIET");
+        scan_all = $test$plusargs("ALL_FACES");
+
         // Initialize signals
         rst = 1;
         start = 0;
@@ -89,6 +106,7 @@ module tb_face_detector;
         $display("Starting face detection...");
         
         // Start detection and load image pixels
+        start_time = $time;
         start = 1;
         #CLK_PERIOD;
         start = 0;
@@ -97,11 +115,11 @@ module tb_face_detector;
         for (y = 0; y < IMG_HEIGHT; y = y + 1) begin
             for (x = 0; x < IMG_WIDTH; x = x + 1) begin
                 @(posedge clk);
-                pixel_in = test_image[y][x];
+                pixel_in = test_image[y*IMG_WIDTH + x];
                 pixel_valid = 1;
                 pixel_count = pixel_count + 1;
                 
-                if (pixel_count % 512 == 0) begin
+                if (!quiet && pixel_count % 512 == 0) begin
                     $display("Loaded %d pixels...", pixel_count);
                 end
             end
@@ -115,6 +133,13 @@ module tb_face_detector;
         
         // Wait for detection to complete
         wait(done);
+        // done is a single-cycle pulse and the FSM clears face_detected
+        // when it returns to IDLE, so latch the outputs right away
+        det_found = face_detected;
+        det_x = face_x;
+        det_y = face_y;
+        det_scale = face_scale;
+        det_cycles = ($time - start_time) / CLK_PERIOD;
         
         #(CLK_PERIOD * 10);
         
@@ -122,13 +147,14 @@ module tb_face_detector;
         $display("========================================");
         $display("Detection Results:");
         $display("========================================");
-        if (face_detected) begin
+        if (det_found) begin
             $display("✓ FACE DETECTED!");
-            $display("  Position: (%d, %d)", face_x, face_y);
-            $display("  Scale: %d", face_scale);
+            $display("  Position: (%d, %d)", det_x, det_y);
+            $display("  Scale: %d", det_scale);
         end else begin
             $display("✗ No face detected");
         end
+        $display("Cycles: %0d", det_cycles);
         $display("========================================");
         
         // End simulation
@@ -146,14 +172,21 @@ module tb_face_detector;
     
     // Monitor key signals
     always @(posedge clk) begin
+        if (scan_all && detection_valid) begin
+            $display("Window at (%0d, %0d) size %0d", face_x, face_y, face_size);
+        end
         if (done) begin
             $display("Time %t: Detection completed", $time);
         end
-           if (dut.control.state != 0) begin
+           if (!quiet && dut.control.state != 0) begin
                $display("Time %t: FSM State = %d, ii_done=%b, stage_done=%b, window_x=%d, window_y=%d", 
                         $time, dut.control.state, dut.control.ii_done, dut.control.stage_done,
                         dut.control.window_x, dut.control.window_y);
            end
     end
 
+    // Waveform tracing, off unless +WAVE=<scope> is given
+`define WAVE_TOP tb_face_detector
+`include "wave_trace.vh"
+
 endmodule
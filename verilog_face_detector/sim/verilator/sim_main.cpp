@@ -0,0 +1,259 @@
+// sim_main.cpp
+// Verilator harness for face_detector: the native-code counterpart of
+// tb_emotion_classifier.v
+// Drives the same reset/start/pixel sequence, prints the same lines
+// (app.py and bench_backends.py parse both alike) and sends the face
+// window to the emotion server with the protocol of $send_roi_for_emotion.
+//
+// Image input: image.txt in the working directory ($readmemh format), or
+// +CORPUS=<file> +FRAME=<k> for a frame of a packed corpus.
+// Options: +ALL_FACES, +EMOTION_HOST / +EMOTION_PORT / +EMOTION_TIMEOUT
+// (or the environment variables of the VPI module), +TIMEOUT=<cycles>.
+// The RTL's own plusargs (+NUM_STAGES, +CASCADE, +PERF, +DEBUG) also work.
+//
+// Build: make compile-verilator; run from a directory next to data/,
+// like run_sim: cd sim && ./run_verilator
+
+#include <arpa/inet.h>
+#include <netdb.h>
+#include <sys/socket.h>
+#include <sys/time.h>
+#include <unistd.h>
+
+#include <cerrno>
+#include <cstdio>
+#include <cstdlib>
+#include <cstring>
+#include <fstream>
+#include <memory>
+#include <string>
+#include <vector>
+
+#include "Vface_detector.h"
+#include "verilated.h"
+
+static const int IMG_WIDTH = 64;
+static const int IMG_HEIGHT = 64;
+static const int CLK_HALF_PERIOD = 5;             // 100MHz clock, 1ns units
+static const long TIMEOUT_CYCLES = 20000000;      // Same budget as tb_emotion_classifier.v
+
+// Value of a "+NAME=value" plusarg, then an environment variable, then a default
+static std::string setting(VerilatedContext* ctx, const char* name, const char* env,
+                           const char* fallback) {
+    std::string prefix = std::string(name) + "=";
+    std::string match = ctx->commandArgsPlusMatch(prefix.c_str());
+    if (!match.empty())
+        return match.substr(prefix.size() + 1);  // Skip the leading '+'
+    const char* value = getenv(env);
+    return (value != nullptr && *value) ? value : fallback;
+}
+
+// Reads a $readmemh-style file of 8-bit pixels
+static bool load_hex(const char* path, std::vector<unsigned char>& image) {
+    std::ifstream in(path);
+    std::string token;
+    size_t i = 0;
+    if (!in)
+        return false;
+    while (i < image.size() && in >> token) {
+        if (token.compare(0, 2, "//") == 0) {
+            std::getline(in, token);
+            continue;
+        }
+        image[i++] = (unsigned char)strtoul(token.c_str(), nullptr, 16);
+    }
+    return i == image.size();
+}
+
+// Reads frame k of a packed corpus (image_corpus.py)
+static bool load_corpus_frame(const char* path, long k, std::vector<unsigned char>& image) {
+    FILE* f = fopen(path, "rb");
+    bool ok = f != nullptr && k >= 0 && fseek(f, k * (long)image.size(), SEEK_SET) == 0 &&
+              fread(image.data(), 1, image.size(), f) == image.size();
+    if (f != nullptr)
+        fclose(f);
+    return ok;
+}
+
+static int send_all(int sock, const char* buf, size_t len) {
+    while (len > 0) {
+        ssize_t sent = send(sock, buf, len, MSG_NOSIGNAL);
+        if (sent <= 0)
+            return -1;
+        buf += sent;
+        len -= sent;
+    }
+    return 0;
+}
+
+// Sends "ROI x y w h nbytes\n" and the pixels; reads one response line.
+// Returns 0 on success, -1 if the connection failed, -2 on a timeout.
+static int classify_roi(const std::string& host, const std::string& port, int timeout_sec,
+                        const std::string& request, std::string& response) {
+    struct addrinfo hints, *res, *ai;
+    struct timeval tv;
+    int sock = -1;
+    char c;
+    ssize_t n = 1;
+
+    memset(&hints, 0, sizeof(hints));
+    hints.ai_family = AF_INET;
+    hints.ai_socktype = SOCK_STREAM;
+    if (getaddrinfo(host.c_str(), port.c_str(), &hints, &res) != 0)
+        return -1;
+    for (ai = res; ai != nullptr; ai = ai->ai_next) {
+        if ((sock = socket(ai->ai_family, ai->ai_socktype, ai->ai_protocol)) < 0)
+            continue;
+        if (timeout_sec > 0) {
+            tv.tv_sec = timeout_sec;
+            tv.tv_usec = 0;
+            setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
+            setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO, &tv, sizeof(tv));
+        }
+        if (connect(sock, ai->ai_addr, ai->ai_addrlen) == 0)
+            break;
+        close(sock);
+        sock = -1;
+    }
+    freeaddrinfo(res);
+    if (sock < 0)
+        return -1;
+
+    int status = send_all(sock, request.data(), request.size());
+    response.clear();
+    while (status == 0 && (n = recv(sock, &c, 1, 0)) > 0 && c != '\n')
+        response += c;
+    if (status == 0 && n <= 0)
+        status = (n < 0 && (errno == EAGAIN || errno == EWOULDBLOCK)) ? -2 : -1;
+    close(sock);
+    return status;
+}
+
+int main(int argc, char** argv) {
+    auto ctx = std::make_unique<VerilatedContext>();
+    ctx->commandArgs(argc, argv);
+    auto top = std::make_unique<Vface_detector>(ctx.get());
+
+    std::vector<unsigned char> image(IMG_WIDTH * IMG_HEIGHT);
+    std::string corpus = setting(ctx.get(), "CORPUS", "", "");
+    if (!corpus.empty()) {
+        long frame = atol(setting(ctx.get(), "FRAME", "", "0").c_str());
+        if (!load_corpus_frame(corpus.c_str(), frame, image)) {
+            printf("ERROR: Could not load corpus frame %ld\n", frame);
+            return 1;
+        }
+        printf("Loaded corpus frame %ld\n", frame);
+    } else {
+        if (!load_hex("image.txt", image)) {
+            printf("ERROR: Could not load image.txt\n");
+            return 1;
+        }
+        printf("Loaded image.txt\n");
+    }
+
+    bool all_faces = !std::string(ctx->commandArgsPlusMatch("ALL_FACES")).empty();
+    long timeout = atol(setting(ctx.get(), "TIMEOUT", "", "0").c_str());
+    if (timeout <= 0)
+        timeout = TIMEOUT_CYCLES;
+
+    // Inputs change while the clock is low; the DUT samples them on the rising edge
+    auto tick = [&]() {
+        top->clk = 1;
+        top->eval();
+        ctx->timeInc(CLK_HALF_PERIOD);
+        top->clk = 0;
+        top->eval();
+        ctx->timeInc(CLK_HALF_PERIOD);
+    };
+
+    long windows = 0;
+    auto report_window = [&]() {
+        if (all_faces && top->detection_valid) {
+            printf("Window at (%d, %d) size %d\n", top->face_x, top->face_y, top->face_size);
+            windows++;
+        }
+    };
+
+    top->clk = 0;
+    top->rst = 1;
+    top->start = 0;
+    top->scan_all = all_faces;
+    top->pixel_in = 0;
+    top->pixel_valid = 0;
+    top->eval();
+    for (int i = 0; i < 10; i++)
+        tick();
+    top->rst = 0;
+    for (int i = 0; i < 5; i++)
+        tick();
+
+    printf("Starting Co-Simulation...\n");
+    top->start = 1;
+    tick();
+    top->start = 0;
+    long cycles = 1;
+
+    for (int i = 0; i < IMG_WIDTH * IMG_HEIGHT; i++) {
+        top->pixel_in = image[i];
+        top->pixel_valid = 1;
+        tick();
+        cycles++;
+    }
+    top->pixel_valid = 0;
+
+    // done is a single-cycle pulse; sample the outputs while it is high
+    while (!top->done && cycles < timeout && !ctx->gotFinish()) {
+        tick();
+        cycles++;
+        report_window();
+    }
+    if (!top->done) {
+        printf("TIMEOUT\n");
+        top->final();
+        return 1;
+    }
+
+    bool found = top->face_detected;
+    int x = top->face_x, y = top->face_y, size = top->face_size;
+    printf("Cycles: %ld\n", cycles);
+
+    if (all_faces) {
+        // The windows were printed as they passed; Python takes it from here
+        printf("%ld windows passed\n", windows);
+    } else if (found) {
+        printf("✓ Face detected at (%d, %d) size %d\n", x, y, size);
+        printf("Calling Python Emotion Classifier...\n");
+
+        // The face window, zero-padded past the image edge like the VPI module
+        std::string request = "ROI " + std::to_string(x) + " " + std::to_string(y) + " " +
+                              std::to_string(size) + " " + std::to_string(size) + " " +
+                              std::to_string(size * size) + "\n";
+        for (int r = 0; r < size; r++)
+            for (int c = 0; c < size; c++)
+                request += (x + c < IMG_WIDTH && y + r < IMG_HEIGHT)
+                               ? (char)image[(y + r) * IMG_WIDTH + x + c] : '\0';
+
+        printf("VPI: Sending ROI (x=%d, y=%d, w=%d, h=%d, %d bytes)\n", x, y, size, size,
+               size * size);
+        fflush(stdout);
+        std::string response;
+        int status = classify_roi(setting(ctx.get(), "EMOTION_HOST", "EMOTION_HOST", "127.0.0.1"),
+                                  setting(ctx.get(), "EMOTION_PORT", "EMOTION_PORT", "8888"),
+                                  atoi(setting(ctx.get(), "EMOTION_TIMEOUT", "EMOTION_TIMEOUT", "10").c_str()),
+                                  request, response);
+        if (status == 0) {
+            printf("\n--------------------------------------------------\n");
+            printf("VPI: Received Result: %s\n", response.c_str());
+            printf("--------------------------------------------------\n\n");
+        } else if (status == -2) {
+            printf("VPI ERROR: Timed out waiting for the emotion server\n");
+        } else {
+            printf("VPI ERROR: No response from server\n");
+        }
+    } else {
+        printf("✗ No face detected.\n");
+    }
+
+    top->final();
+    return 0;
+}
@@ -0,0 +1,57 @@
+// wave_trace.vh
+// Opt-in waveform tracing, included by the testbenches.
+// The including module defines WAVE_TOP (its own name) and has the
+// face_detector instance named dut. Nothing is dumped unless +WAVE=<scope>
+// is given. $test$plusargs matches prefixes, so a bare +WAVE test would
+// also fire on +WAVE_FILE and friends; only the full WAVE= form counts.
+//   +WAVE=<scope>            top, detector, control, stage, feature, weak,
+//                            integral, cascade_rom or feature_rom (empty:
+//                            detector)
+//   +WAVE_DEPTH=<n>          levels below the scope (default 0: all)
+//   +WAVE_START=<ns>         start dumping at this time
+//   +WAVE_STOP=<ns>          stop dumping at this time
+//   +WAVE_FILE=<file>        output file (default waveform.vcd). For FST, name
+//                            it *.fst and run vvp with IVERILOG_DUMPER=fst
+// vcd_summary.py summarizes large traces without loading them.
+
+    initial begin : wave_trace
+        reg [8*32-1:0] wave_scope;
+        reg [8*256-1:0] wave_file;
+        integer wave_depth;
+        reg [63:0] wave_start, wave_stop;
+
+        if ($value$plusargs("WAVE=%s", wave_scope)) begin
+            if (wave_scope == 0)
+                wave_scope = "detector";
+            if (!$value$plusargs("WAVE_FILE=%s", wave_file))
+                wave_file = "waveform.vcd";
+            if (!$value$plusargs("WAVE_DEPTH=%d", wave_depth))
+                wave_depth = 0;
+            if (!$value$plusargs("WAVE_START=%d", wave_start))
+                wave_start = 0;
+            if (!$value$plusargs("WAVE_STOP=%d", wave_stop))
+                wave_stop = 0;
+
+            $dumpfile(wave_file);
+            if (wave_start > 0)
+                #(wave_start);
+            case (wave_scope)
+                "top":         $dumpvars(wave_depth, `WAVE_TOP);
+                "control":     $dumpvars(wave_depth, dut.control);
+                "stage":       $dumpvars(wave_depth, dut.stage_eval);
+                "feature":     $dumpvars(wave_depth, dut.feat_calc);
+                "weak":        $dumpvars(wave_depth, dut.weak_clf);
+                "integral":    $dumpvars(wave_depth, dut.integral_img);
+                "cascade_rom": $dumpvars(wave_depth, dut.cascade_rom);
+                "feature_rom": $dumpvars(wave_depth, dut.feature_lut_rom);
+                default:       $dumpvars(wave_depth, dut);
+            endcase
+            $display("Tracing %0s to %0s from %0t", wave_scope, wave_file, $time);
+            if (wave_stop > $time) begin
+                #(wave_stop - $time);
+                $dumpoff;
+                $dumpflush;
+                $display("Tracing stopped at %0t", $time);
+            end
+        end
+    end
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+sim_daemon.py
+Keeps warm vvp processes running sim/tb_detector_daemon.v and feeds them
+frames from a job queue.
+
+A normal co-simulation pays vvp startup, elaboration and $readmemh of the
+cascade ROMs for every image. In daemon mode each simulator loads the
+ROMs once and then loops: $fetch_frame pulls the next 64x64 frame over a
+socket, the testbench resets face_detector, runs detection and sends the
+result back with $report_detection.
+"""
+
+import queue
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+
+from sim_pool import PoolBusyError, make_scratch_dir
+
+BASE_DIR = Path(__file__).resolve().parent
+SIM_DIR = BASE_DIR / 'sim'
+VPI_DIR = BASE_DIR / 'vpi'
+DAEMON_EXEC = SIM_DIR / 'run_daemon'
+VPI_MODULE = 'verilog_python_interface'
+
+STARTUP_TIMEOUT = 60  # seconds for vvp to load the ROMs and connect
+FRAME_TIMEOUT = 15    # seconds of wall time per frame
+
+DaemonResult = namedtuple('DaemonResult', [
+    'face_detected', 'face_x', 'face_y', 'face_scale', 'cycles', 'timed_out'
+])
+
+
+class _Worker:
+    """One vvp process and the thread that serves its job queue connection."""
+
+    def __init__(self, daemon, index):
+        self.daemon = daemon
+        self.index = index
+        self.process = None
+        self.root = None
+        self.thread = threading.Thread(target=self._serve, name=f'sim-daemon-{index}',
+                                       daemon=True)
+
+    def _spawn(self):
+        """Starts vvp and waits for its $fetch_frame connection."""
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        listener.settimeout(STARTUP_TIMEOUT)
+        port = listener.getsockname()[1]
+
+        self.root, workdir = make_scratch_dir(f'sim_daemon{self.index}_')
+        cmd = ['vvp', f'-M{self.daemon.vpi_dir}', f'-m{VPI_MODULE}',
+               str(self.daemon.sim_exec), f'+JOBQ_PORT={port}']
+        log = open(workdir / 'daemon.log', 'w') if self.daemon.keep_logs else subprocess.DEVNULL
+        try:
+            self.process = subprocess.Popen(cmd, cwd=workdir, stdout=log,
+                                            stderr=subprocess.STDOUT)
+            conn, _ = listener.accept()
+        finally:
+            listener.close()
+            if log is not subprocess.DEVNULL:
+                log.close()
+        return conn
+
+    def _terminate(self):
+        if self.process:
+            try:
+                # After QUIT the testbench calls $finish on its own
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+        if self.root and not self.daemon.keep_logs:
+            shutil.rmtree(self.root, ignore_errors=True)
+        self.root = None
+
+    def _serve(self):
+        while not self.daemon.stopping:
+            job = None
+            try:
+                conn = self._spawn()
+                with conn:
+                    reader = conn.makefile('rb')
+                    while True:
+                        if not reader.readline().startswith(b'NEXT'):
+                            raise ConnectionError("Simulator closed the job queue connection")
+
+                        job = self.daemon._next_job()
+                        if job is None:
+                            conn.sendall(b"QUIT\n")
+                            return
+                        job_id, frame, future = job
+
+                        conn.sendall(f"FRAME {job_id} {frame.size}\n".encode() + frame.tobytes())
+                        conn.settimeout(self.daemon.frame_timeout)
+                        line = reader.readline().decode().split()
+                        conn.settimeout(None)
+                        if len(line) != 8 or line[0] != 'RESULT' or int(line[1]) != job_id:
+                            raise ConnectionError(f"Unexpected reply from simulator: {line}")
+
+                        timed_out, found, x, y, scale, cycles = map(int, line[2:])
+                        future.set_result(DaemonResult(bool(found), x, y, scale, cycles,
+                                                       bool(timed_out)))
+                        job = None
+            except (OSError, ValueError) as e:
+                # socket.timeout is an OSError: the frame hung, restart the simulator
+                if job is not None and not job[2].done():
+                    job[2].set_exception(TimeoutError(f"Simulation daemon failed: {e}"))
+                if not self.daemon.stopping:
+                    print(f"Simulation daemon {self.index}: {e}; restarting", flush=True)
+                    time.sleep(0.5)
+            finally:
+                self._terminate()
+
+
+class SimulationDaemon:
+    """Pool of warm simulators fed from a shared, bounded job queue."""
+
+    def __init__(self, sim_exec=DAEMON_EXEC, vpi_dir=VPI_DIR, workers=1,
+                 max_pending=64, frame_timeout=FRAME_TIMEOUT, keep_logs=False):
+        self.sim_exec = Path(sim_exec).resolve()
+        self.vpi_dir = Path(vpi_dir).resolve()
+        self.frame_timeout = frame_timeout
+        self.keep_logs = keep_logs
+        self.stopping = False
+        self._jobs = queue.Queue(maxsize=max_pending)
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+        self._workers = [_Worker(self, i) for i in range(workers)]
+
+    def start(self):
+        if not self.sim_exec.exists():
+            raise RuntimeError(f"{self.sim_exec} not found. Run: make compile-daemon")
+        for worker in self._workers:
+            worker.thread.start()
+        return self
+
+    @property
+    def queued(self):
+        """Frames waiting for a simulator."""
+        return self._jobs.qsize()
+
+    def _next_job(self):
+        """Blocks until a job is available; returns None once stopped."""
+        while not self.stopping:
+            try:
+                job = self._jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if job[2].set_running_or_notify_cancel():
+                return job
+        return None
+
+    def submit(self, image_array, block=False):
+        """Queues a 64x64 uint8 frame and returns a Future of DaemonResult."""
+        frame = np.ascontiguousarray(image_array, dtype=np.uint8).ravel()
+        with self._id_lock:
+            self._next_id += 1
+            job_id = self._next_id
+        future = Future()
+        try:
+            self._jobs.put((job_id, frame, future), block=block)
+        except queue.Full:
+            raise PoolBusyError("Simulation daemon queue is full")
+        return future
+
+    def detect(self, image_array, timeout=None):
+        """Runs detection on one frame and waits for the result."""
+        return self.submit(image_array, block=True).result(timeout)
+
+    def stop(self):
+        """Sends QUIT to every simulator and waits for them to exit."""
+        self.stopping = True
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            job[2].cancel()
+        for worker in self._workers:
+            if worker.thread.is_alive():
+                worker.thread.join(timeout=2)
+
+
+def main():
+    from reference_detector import iter_images
+
+    if len(sys.argv) < 2:
+        print("Usage: python3 sim_daemon.py <image.txt|image.jpg|corpus.frames> [...]")
+        sys.exit(1)
+
+    daemon = SimulationDaemon().start()
+    try:
+        for path, image in iter_images(sys.argv[1:]):
+            start = time.monotonic()
+            result = daemon.detect(image)
+            elapsed = time.monotonic() - start
+            if result.timed_out:
+                print(f"{path}: TIMEOUT after {result.cycles} cycles ({elapsed:.2f}s)")
+            elif result.face_detected:
+                print(f"{path}: Face detected at ({result.face_x}, {result.face_y}) "
+                      f"scale {result.face_scale}, {result.cycles} cycles ({elapsed:.2f}s)")
+            else:
+                print(f"{path}: No face detected, {result.cycles} cycles ({elapsed:.2f}s)")
+    finally:
+        daemon.stop()
+
+
+if __name__ == '__main__':
+    main()
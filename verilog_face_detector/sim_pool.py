@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+sim_pool.py
+Runs Icarus Verilog (or native Verilator) simulations concurrently on a
+bounded worker pool.
+
+Every job gets its own scratch directory with a private image.txt and
+waveform.vcd, so parallel runs never clobber each other. The pool has one
+worker per CPU by default, a bounded queue of pending jobs, per-job
+timeouts and cancellation.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent
+SIM_DIR = BASE_DIR / 'sim'
+DATA_DIR = BASE_DIR / 'data'
+VPI_DIR = BASE_DIR / 'vpi'
+SIM_EXEC = SIM_DIR / 'run_sim'
+VPI_MODULE = 'verilog_python_interface'
+DEFAULT_TIMEOUT = 15  # seconds
+
+SimulationResult = namedtuple('SimulationResult', [
+    'stdout', 'stderr', 'returncode', 'timed_out', 'cancelled', 'wall_time'
+])
+
+
+def make_scratch_dir(prefix, scratch_root=None):
+    """
+    Creates <root>/sim as a private simulator working directory. Returns
+    (root, workdir); remove root when done.
+    """
+    root = Path(tempfile.mkdtemp(prefix=prefix, dir=scratch_root))
+    # The ROMs load "../data/*.mem" relative to the working directory
+    (root / 'data').symlink_to(DATA_DIR, target_is_directory=True)
+    workdir = root / 'sim'
+    workdir.mkdir()
+    return root, workdir
+
+
+class PoolBusyError(RuntimeError):
+    """Raised when the pending-job queue is full."""
+
+
+class SimulationJob:
+    """Handle for a single queued or running simulation."""
+
+    def __init__(self, image_txt_path, plusargs, timeout):
+        self.id = uuid.uuid4().hex[:8]
+        self.image_txt_path = Path(image_txt_path) if image_txt_path else None
+        self.plusargs = list(plusargs)
+        self.timeout = timeout
+        self.future = None
+        self.process = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Drops the job if it is still queued, or kills its simulator."""
+        self._cancelled.set()
+        if self.future is not None and self.future.cancel():
+            return
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """Blocks until the job finishes and returns its SimulationResult."""
+        return self.future.result(timeout)
+
+
+class SimulationPool:
+    """
+    Bounded pool of isolated simulator runs. sim_exec is a vvp image, or
+    with interpreter=None a native executable such as sim/run_verilator.
+    """
+
+    def __init__(self, sim_exec=SIM_EXEC, vpi_dir=VPI_DIR, vpi_module=VPI_MODULE,
+                 max_workers=None, max_pending=None, timeout=DEFAULT_TIMEOUT,
+                 scratch_root=None, keep_workdirs=False, interpreter='vvp'):
+        self.sim_exec = Path(sim_exec).resolve()
+        self.interpreter = interpreter
+        self.vpi_dir = Path(vpi_dir).resolve() if vpi_dir else None
+        self.vpi_module = vpi_module
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = self.max_workers * 4 if max_pending is None else max_pending
+        self.timeout = timeout
+        self.scratch_root = scratch_root
+        self.keep_workdirs = keep_workdirs
+
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix='sim')
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+
+    @property
+    def queued(self):
+        return self._queued
+
+    @property
+    def running(self):
+        return self._running
+
+    def submit(self, image_txt_path, plusargs=(), timeout=None, block=True):
+        """
+        Queues a simulation of image_txt_path (None when the plusargs select
+        a corpus frame instead). Raises PoolBusyError if the queue is full
+        and block is False.
+        """
+        if not self._slots.acquire(blocking=block):
+            raise PoolBusyError(f"Simulation queue is full ({self.max_pending} pending)")
+
+        job = SimulationJob(image_txt_path, plusargs, timeout or self.timeout)
+        with self._lock:
+            self._queued += 1
+        try:
+            job.future = self._executor.submit(self._run, job)
+        except RuntimeError:
+            self._release(job, started=False)
+            raise
+        job.future.add_done_callback(
+            lambda future: self._release(job, started=False) if future.cancelled() else None)
+        return job
+
+    def _release(self, job, started):
+        with self._lock:
+            if started:
+                self._running -= 1
+            else:
+                self._queued -= 1
+        self._slots.release()
+
+    def _make_workdir(self, job):
+        """Creates <root>/sim as the working directory with its own image.txt."""
+        root, workdir = make_scratch_dir(f'sim_{job.id}_', self.scratch_root)
+        # Corpus runs (+CORPUS=... +FRAME=k) have no image.txt
+        if job.image_txt_path is not None:
+            shutil.copyfile(job.image_txt_path, workdir / 'image.txt')
+        return root, workdir
+
+    def _command(self, job):
+        if self.interpreter is None:
+            return [str(self.sim_exec)] + job.plusargs
+        cmd = [self.interpreter]
+        if self.vpi_dir:
+            cmd += [f'-M{self.vpi_dir}', f'-m{self.vpi_module}']
+        return cmd + [str(self.sim_exec)] + job.plusargs
+
+    def _run(self, job):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        start = time.monotonic()
+        root = None
+        try:
+            if job.cancelled:
+                return SimulationResult('', 'Simulation cancelled', None, False, True, 0.0)
+
+            root, workdir = self._make_workdir(job)
+            job.process = subprocess.Popen(
+                self._command(job),
+                cwd=workdir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True
+            )
+            # cancel() may have run before the process handle existed
+            if job.cancelled:
+                job.process.kill()
+
+            timed_out = False
+            try:
+                stdout, stderr = job.process.communicate(timeout=job.timeout)
+            except subprocess.TimeoutExpired:
+                job.process.kill()
+                stdout, stderr = job.process.communicate()
+                timed_out = True
+
+            return SimulationResult(stdout, stderr, job.process.returncode, timed_out,
+                                    job.cancelled, time.monotonic() - start)
+        finally:
+            if root is not None and not self.keep_workdirs:
+                shutil.rmtree(root, ignore_errors=True)
+            self._release(job, started=True)
+
+    def shutdown(self, cancel_pending=True):
+        """Stops accepting jobs; optionally drops everything still queued."""
+        self._executor.shutdown(wait=True, cancel_futures=cancel_pending)
@@ -10,6 +10,7 @@ module control_fsm #(
     input clk,
     input rst,
     input start,                    // Start detection
+    input scan_all,                 // Keep scanning after a hit, pulsing detection_valid per window
 
     // Interface to cascade ROM
     output reg [16:0] cascade_addr,
@@ -33,11 +34,15 @@ module control_fsm #(
     output reg [7:0] window_x,
     output reg [7:0] window_y,
     output reg [7:0] window_scale,
+    output reg [2:0] scale_index,        // Slot of window_scale in the geometry LUT
 
     // Outputs
     output reg face_detected,
     output reg [7:0] face_x, face_y,     // Face location if detected
     output reg [7:0] face_scale,          // Face scale if detected
+    output reg [7:0] face_size,           // Face window side in pixels
+    output reg detection_valid,           // One-cycle pulse per passing window; with
+                                          // scan_all, face_* hold the latest one
     output reg done
 );
 
@@ -57,6 +62,16 @@ module control_fsm #(
     reg [16:0] stage_base_addr; // Base address of the current stage in ROM
     reg [1:0] read_step; // For multi-cycle reads
 
+    // Stages to evaluate; simulations of a trimmed cascade set +NUM_STAGES=<n>
+    reg [4:0] num_stages;
+    initial begin
+        num_stages = NUM_STAGES;
+`ifndef SYNTHESIS
+        if ($value$plusargs("NUM_STAGES=%d", num_stages))
+            $display("Evaluating %0d cascade stages", num_stages);
+`endif
+    end
+
     
     // Scanning parameters
     localparam MIN_WINDOW_SIZE = 24;
@@ -68,14 +83,11 @@ module control_fsm #(
             state <= IDLE;
             // ... (reset logic unchanged) ...
             eval_cascade_state <= 0;
+            detection_valid <= 0;
         end else begin
             // Default assignments
             eval_cascade_state <= 0;
-
-            // Debug print
-            if (state != IDLE) begin
-                 //$display("Time: %t, State: %d, Window: (%d, %d), Scale: %d, Stage: %d, Passed: %d", $time, state, window_x, window_y, window_scale, stage_counter, cascade_passed);
-            end
+            detection_valid <= 0;
 
             case (state)
                 IDLE: begin
@@ -94,6 +106,7 @@ module control_fsm #(
                         window_x <= 0;
                         window_y <= 0;
                         window_scale <= 8'd255;  // 1.0 scale
+                        scale_index <= 0;        // GEOMETRY_SCALES[0] in parse_cascade.py
                         stage_base_addr <= 0; // Start at the beginning of the cascade
                     end
                 end
@@ -149,13 +162,18 @@ module control_fsm #(
                     stage_base_addr <= stage_base_addr + 2 + (num_classifiers * 4);
                     stage_counter <= stage_counter + 1;
 
-                    if (stage_counter + 1 >= NUM_STAGES) begin
+                    if (stage_counter + 1 >= num_stages) begin
                         // All stages passed - face detected!
                         face_detected <= 1;
                         face_x <= window_x;
                         face_y <= window_y;
                         face_scale <= window_scale;
-                        state <= FINISH;
+                        // Side = MIN_WINDOW_SIZE * (window_scale + 1) / 256,
+                        // so window_scale 255 (1.0) gives 24
+                        face_size <= (MIN_WINDOW_SIZE * (window_scale + 9'd1)) >> 8;
+                        detection_valid <= 1;
+                        // scan_all reports every window; otherwise stop at the first
+                        state <= scan_all ? NEXT_WINDOW : FINISH;
                     end else begin
                         // Read the next stage's header
                         state <= READ_STAGE_HEADER;
@@ -193,15 +211,19 @@ module control_fsm #(
         end
     end
 
-    // Debug logging
+`ifndef SYNTHESIS
+    // Debug logging of state changes, enabled with +DEBUG
+    reg debug;
+    initial debug = $test$plusargs("DEBUG");
     reg [3:0] prev_state;
     initial prev_state = 4'hF; 
     always @(posedge clk) begin
-        if (state != prev_state) begin
+        if (debug && state != prev_state) begin
             $display("Time: %t | State: %d | Win(%d,%d) Scale:%d | Stage: %d | Pass: %d", 
                      $time, state, window_x, window_y, window_scale, stage_counter, cascade_passed);
             prev_state <= state;
         end
     end
+`endif
 
 endmodule
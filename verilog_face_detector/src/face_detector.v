@@ -1,6 +1,8 @@
 // face_detector.v
 // Top-level module integrating all components for Haar Cascade face detection
 
+`include "rom_params.vh"
+
 module face_detector #(
     parameter IMG_WIDTH = 64,
     parameter IMG_HEIGHT = 64,
@@ -11,6 +13,7 @@ module face_detector #(
     input clk,
     input rst,
     input start,                          // Start detection
+    input scan_all,                       // Report every passing window, not just the first
     
     // Image input interface
     input [PIXEL_WIDTH-1:0] pixel_in,
@@ -21,6 +24,8 @@ module face_detector #(
     output [7:0] face_x,
     output [7:0] face_y,
     output [7:0] face_scale,
+    output [7:0] face_size,               // Window side in pixels
+    output detection_valid,               // Pulses once per passing window
     output done
 );
 
@@ -36,6 +41,7 @@ module face_detector #(
     wire [15:0] fsm_num_classifiers;
 
     wire [7:0] window_x, window_y, window_scale;
+    wire [2:0] scale_index;
 
     wire [16:0] cascade_addr;
     wire [DATA_WIDTH-1:0] cascade_data;
@@ -83,23 +89,27 @@ module face_detector #(
         .done(ii_done)
     );
 
-    // Haar Cascade ROM
+    // Haar Cascade ROM (sized by rom_params.vh from parse_cascade.py)
     haar_cascade_rom #(
-        .ADDR_WIDTH(17),
-        .DATA_WIDTH(DATA_WIDTH)
+        .ADDR_WIDTH(`CASCADE_ROM_ADDR_WIDTH),
+        .DATA_WIDTH(DATA_WIDTH),
+        .DEPTH(`CASCADE_ROM_DEPTH)
     ) cascade_rom (
         .clk(clk),
-        .address(cascade_addr),
+        .address(cascade_addr[`CASCADE_ROM_ADDR_WIDTH-1:0]),
         .data(cascade_data)
     );
 
-    // Feature LUT ROM
+    // Feature LUT ROM. Geometry slots are 2^14 words apart, so the low
+    // address bits still select {slot, feature, word}
     feature_lut_rom #(
-        .ADDR_WIDTH(17),
-        .DATA_WIDTH(DATA_WIDTH)
+        .ADDR_WIDTH(`FEATURE_ROM_ADDR_WIDTH),
+        .DATA_WIDTH(DATA_WIDTH),
+        .DEPTH(`FEATURE_ROM_DEPTH),
+        .MEM_FILE("../data/feature_geom.mem")
     ) feature_lut_rom (
         .clk(clk),
-        .address(feature_lut_addr),
+        .address(feature_lut_addr[`FEATURE_ROM_ADDR_WIDTH-1:0]),
         .data(feature_lut_data)
     );
 
@@ -108,7 +118,8 @@ module face_detector #(
         .DATA_WIDTH(DATA_WIDTH),
         .SUM_WIDTH(24),
         .FIXED_POINT_FRAC(FIXED_POINT_FRAC),
-        .FEATURE_LUT_BASE_ADDR(0)
+        .FEATURE_LUT_BASE_ADDR(0),
+        .GEOM_STRIDE_LOG2(2)
     ) feat_calc (
         .clk(clk),
         .rst(rst),
@@ -117,6 +128,7 @@ module face_detector #(
         .window_x(window_x),
         .window_y(window_y),
         .window_scale(window_scale),
+        .scale_index(scale_index),
         .query_x1(query_x1),
         .query_y1(query_y1),
         .query_x2(query_x2),
@@ -176,11 +188,12 @@ module face_detector #(
     control_fsm #(
         .IMG_WIDTH(IMG_WIDTH),
         .IMG_HEIGHT(IMG_HEIGHT),
-        .NUM_STAGES(25)
+        .NUM_STAGES(`CASCADE_NUM_STAGES)
     ) control (
         .clk(clk),
         .rst(rst),
         .start(start),
+        .scan_all(scan_all),
         .cascade_addr(fsm_cascade_addr),
         .cascade_data(cascade_data),
         .ii_start(ii_start),
@@ -195,11 +208,37 @@ module face_detector #(
         .window_x(window_x),
         .window_y(window_y),
         .window_scale(window_scale),
+        .scale_index(scale_index),
         .face_detected(face_detected),
         .face_x(face_x),
         .face_y(face_y),
         .face_scale(face_scale),
+        .face_size(face_size),
+        .detection_valid(detection_valid),
         .done(done)
     );
 
+`ifndef SYNTHESIS
+    // Cycle counters for simulation, enabled with +PERF
+    perf_counters #(
+        .NUM_STAGES(`CASCADE_NUM_STAGES),
+        .ADDR_WIDTH(17)
+    ) perf (
+        .clk(clk),
+        .rst(rst),
+        .start(start),
+        .done(done),
+        .face_detected(face_detected),
+        .fsm_state(control.state),
+        .stage_index(control.stage_counter),
+        .stage_done(stage_done),
+        .stage_passed(stage_passed),
+        .calc_start(calc_start),
+        .wc_start(wc_start),
+        .query_valid(query_valid),
+        .cascade_addr(cascade_addr),
+        .feature_addr(feature_lut_addr)
+    );
+`endif
+
 endmodule
\ No newline at end of file
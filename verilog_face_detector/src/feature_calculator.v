@@ -1,19 +1,25 @@
 // feature_calculator.v
 // Calculates Haar feature values from rectangle sums
 // Feature = sum of (rectangle_area * weight) for all rectangles in the feature
+//
+// Reads the per-scale geometry LUT from parse_cascade.py (feature_geom.mem):
+// rectangle corners come pre-scaled for the window scale and weights are small
+// integers, so the loop over rectangles only adds and shifts.
 
 module feature_calculator #(
     parameter DATA_WIDTH = 32,
     parameter SUM_WIDTH = 24,
     parameter FIXED_POINT_FRAC = 16,
-    parameter FEATURE_LUT_BASE_ADDR = 0
+    parameter FEATURE_LUT_BASE_ADDR = 0,
+    parameter GEOM_STRIDE_LOG2 = 2            // Words per feature record (parse_cascade.py)
 )(
     input clk,
     input rst,
     input start,                              // Start feature calculation
     input [11:0] feature_index,               // Which feature to calculate
     input [7:0] window_x, window_y,           // Current detection window position
-    input [7:0] window_scale,                 // Window scale factor
+    input [7:0] window_scale,                 // Window scale factor (informational)
+    input [2:0] scale_index,                  // Geometry LUT slot of window_scale
     
     // Interface to integral image
     output reg [15:0] query_x1, query_y1,
@@ -35,30 +41,29 @@ module feature_calculator #(
     // States
     localparam IDLE = 4'b0000;
     localparam READ_FEATURE_HEADER = 4'b0001;
-    localparam READ_NUM_RECTS = 4'b0010;
     localparam READ_RECT = 4'b0011;
     localparam QUERY_SUM = 4'b0100;
     localparam ACCUMULATE = 4'b0101;
     localparam DONE_STATE = 4'b0110;
+    localparam WAIT_ROM = 4'b0111;
     
     reg [3:0] state;
+    reg [3:0] return_state;       // State to resume once the ROM output is valid
     reg [3:0] num_rects;          // Number of rectangles in this feature
     reg [3:0] rect_counter;       // Current rectangle being processed
-    reg [16:0] base_addr;         // Base address of this feature in ROM
-    reg [16:0] rect_data_addr;    // Address for rectangle data
+    reg [16:0] rect_data_addr;    // Address of the current rectangle's word
     
-    // Rectangle data
-    reg [15:0] rect_x, rect_y, rect_w, rect_h;
-    reg signed [DATA_WIDTH-1:0] rect_weight;
+    // Rectangle data: window-relative corners (x2/y2 exclusive) and weights
+    reg [7:0] rect_dx1, rect_dy1, rect_dx2, rect_dy2;
+    reg [11:0] rect_weights;      // Three signed 4-bit integer weights
+    reg signed [3:0] rect_weight;
     
     // Accumulator for feature value
     reg signed [DATA_WIDTH-1:0] accumulator;
-    reg [2:0] read_step;          // Step for reading 5 values per rectangle
-    
 
-    reg signed [63:0] product;
-    reg signed [DATA_WIDTH-1:0] scaled_product;
     reg signed [DATA_WIDTH-1:0] extended_rect_sum;
+    reg [3:0] weight_mag;
+    reg signed [DATA_WIDTH-1:0] weighted_sum;
 
     always @(posedge clk or posedge rst) begin
         if (rst) begin
@@ -69,66 +74,54 @@ module feature_calculator #(
             num_rects <= 0;
             rect_counter <= 0;
             accumulator <= 0;
-            read_step <= 0;
         end else begin
             case (state)
                 IDLE: begin
                     done <= 0;
                     if (start) begin
-                        state <= READ_FEATURE_HEADER;
+                        state <= WAIT_ROM;
+                        return_state <= READ_FEATURE_HEADER;
                         accumulator <= 0;
                         rect_counter <= 0;
-                        feature_addr <= feature_index; // The index is the address in the LUT
+                        // Record address is {scale slot, feature index, word}
+                        feature_addr <= FEATURE_LUT_BASE_ADDR +
+                                        {scale_index, feature_index, {GEOM_STRIDE_LOG2{1'b0}}};
+                        rect_data_addr <= FEATURE_LUT_BASE_ADDR +
+                                          {scale_index, feature_index, {GEOM_STRIDE_LOG2{1'b0}}} + 1;
                     end
                 end
+
+                WAIT_ROM: begin
+                    // The feature ROM is registered: data for feature_addr
+                    // is only valid one cycle after the address is set
+                    state <= return_state;
+                end
                 
                 READ_FEATURE_HEADER: begin
-                    // The first word of the feature is the number of rectangles
+                    // The header holds the rectangle count and all their weights
                     num_rects <= feature_data[3:0];
-                    state <= READ_RECT;
-                    read_step <= 0;
-                    rect_data_addr <= feature_index + 1; // Start reading rects from the next address
-                    feature_addr <= feature_index + 1;
+                    rect_weights <= feature_data[15:4];
+                    state <= WAIT_ROM;
+                    return_state <= READ_RECT;
+                    feature_addr <= rect_data_addr;
                 end
 
                 READ_RECT: begin
-                    // Read rectangle data: x, y, w, h, weight (5 lines)
-                    case (read_step)
-                        0: begin
-                            rect_x <= feature_data[15:0];
-                            feature_addr <= rect_data_addr + 1;
-                            read_step <= 1;
-                        end
-                        1: begin
-                            rect_y <= feature_data[15:0];
-                            feature_addr <= rect_data_addr + 2;
-                            read_step <= 2;
-                        end
-                        2: begin
-                            rect_w <= feature_data[15:0];
-                            feature_addr <= rect_data_addr + 3;
-                            read_step <= 3;
-                        end
-                        3: begin
-                            rect_h <= feature_data[15:0];
-                            feature_addr <= rect_data_addr + 4;
-                            read_step <= 4;
-                        end
-                        4: begin
-                            rect_weight <= feature_data;  // Weight is a fixed-point value
-                            state <= QUERY_SUM;
-                            read_step <= 0;
-                        end
-                    endcase
+                    // One word per rectangle: x1, y1, x2, y2 already scaled
+                    rect_dx1 <= feature_data[31:24];
+                    rect_dy1 <= feature_data[23:16];
+                    rect_dx2 <= feature_data[15:8];
+                    rect_dy2 <= feature_data[7:0];
+                    rect_weight <= rect_weights[3:0];
+                    state <= QUERY_SUM;
                 end
                 
                 QUERY_SUM: begin
                     // Query integral image for rectangle sum
-                    // Scale rectangle coordinates by window position and scale
-                    query_x1 <= window_x + ((rect_x * window_scale) >> 8);
-                    query_y1 <= window_y + ((rect_y * window_scale) >> 8);
-                    query_x2 <= window_x + (((rect_x + rect_w) * window_scale) >> 8) - 1;
-                    query_y2 <= window_y + (((rect_y + rect_h) * window_scale) >> 8) - 1;
+                    query_x1 <= window_x + rect_dx1;
+                    query_y1 <= window_y + rect_dy1;
+                    query_x2 <= window_x + rect_dx2 - 1;
+                    query_y2 <= window_y + rect_dy2 - 1;
                     
                     if (rect_sum_valid) begin
                         query_valid <= 0;
@@ -140,26 +133,28 @@ module feature_calculator #(
                 end
                 
                 ACCUMULATE: begin
-                    // Calculate feature value using latched sum
-                    // Accumulate: feature_value += rect_sum * weight
-                    // Perform fixed-point multiplication
-                    
-                    // Note: extended_rect_sum is already latched in previous state
-                    product = extended_rect_sum * rect_weight;
-                    
-                    // Scale back by fractional bits
-                    scaled_product = product >> FIXED_POINT_FRAC;
+                    // feature_value += rect_sum * weight, with the small
+                    // integer weight applied as shifts and adds
+                    weight_mag = rect_weight[3] ? -rect_weight : rect_weight;
+                    weighted_sum = (weight_mag[0] ? extended_rect_sum : 0) +
+                                   (weight_mag[1] ? extended_rect_sum << 1 : 0) +
+                                   (weight_mag[2] ? extended_rect_sum << 2 : 0);
                     
-                    accumulator <= accumulator + scaled_product;
+                    if (rect_weight[3])
+                        accumulator <= accumulator - weighted_sum;
+                    else
+                        accumulator <= accumulator + weighted_sum;
                     
                     // Move to next rectangle
                     rect_counter <= rect_counter + 1;
                     if (rect_counter + 1 >= num_rects) begin
                         state <= DONE_STATE;
                     end else begin
-                        state <= READ_RECT;
-                        rect_data_addr <= rect_data_addr + 5;
-                        feature_addr <= rect_data_addr + 5;
+                        state <= WAIT_ROM;
+                        return_state <= READ_RECT;
+                        rect_weights <= rect_weights >> 4;
+                        rect_data_addr <= rect_data_addr + 1;
+                        feature_addr <= rect_data_addr + 1;
                     end
                 end
                 
@@ -174,15 +169,19 @@ module feature_calculator #(
         end
     end
 
-    // Debug logging
+`ifndef SYNTHESIS
+    // Debug logging of state changes, enabled with +DEBUG
+    reg debug;
+    initial debug = $test$plusargs("DEBUG");
     reg [3:0] prev_state;
     initial prev_state = 4'hF;
     always @(posedge clk) begin
-        if (state != prev_state) begin
+        if (debug && state != prev_state) begin
             $display("[FC] Time: %t | State: %d | Rect: %d/%d | QV: %d | RSV: %d", 
                      $time, state, rect_counter, num_rects, query_valid, rect_sum_valid);
             prev_state <= state;
         end
     end
+`endif
 
 endmodule
@@ -1,12 +1,14 @@
 // feature_lut_rom.v
 // ROM for storing the feature lookup table
-// Initialized with data from feature_lut.mem
+// Initialized with data from feature_geom.mem (per-scale feature geometry)
+
+`include "rom_params.vh"
 
 module feature_lut_rom #(
-    parameter ADDR_WIDTH = 17,
+    parameter ADDR_WIDTH = `FEATURE_ROM_ADDR_WIDTH,
     parameter DATA_WIDTH = 32,
-    parameter DEPTH = 131072,
-    parameter MEM_FILE = "../data/feature_lut.mem"
+    parameter DEPTH = `FEATURE_ROM_DEPTH,
+    parameter MEM_FILE = "../data/feature_geom.mem"
 )(
     input clk,
     input [ADDR_WIDTH-1:0] address,
@@ -2,10 +2,12 @@
 // ROM for storing the Haar cascade data
 // Initialized with data from cascade_data.mem
 
+`include "rom_params.vh"
+
 module haar_cascade_rom #(
-    parameter ADDR_WIDTH = 17,
+    parameter ADDR_WIDTH = `CASCADE_ROM_ADDR_WIDTH,
     parameter DATA_WIDTH = 32,
-    parameter DEPTH = 131072,
+    parameter DEPTH = `CASCADE_ROM_DEPTH,
     parameter MEM_FILE = "../data/cascade_data.mem"
 )(
     input clk,
@@ -15,9 +17,20 @@ module haar_cascade_rom #(
 
     reg [DATA_WIDTH-1:0] mem [0:DEPTH-1];
 
+`ifdef SYNTHESIS
     initial begin
         $readmemh(MEM_FILE, mem);
     end
+`else
+    // Simulations can load another cascade image, e.g. a trimmed variant
+    // from cascade_explorer.py: +CASCADE=<file> (with +NUM_STAGES=<n>)
+    reg [8*256-1:0] mem_file;
+    initial begin
+        if (!$value$plusargs("CASCADE=%s", mem_file))
+            mem_file = MEM_FILE;
+        $readmemh(mem_file, mem);
+    end
+`endif
 
     always @(posedge clk) begin
         data <= mem[address];
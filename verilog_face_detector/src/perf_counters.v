@@ -0,0 +1,135 @@
+// perf_counters.v
+// Opt-in performance counters for simulation (not synthesized)
+// With +PERF, counts where a detection run spends its cycles and prints one
+// record per run when done pulses:
+//   PERF cycles=... integral_cycles=... windows=... stage_evals=n,n,... ...
+// +PERF_FILE=<file> appends the records to a file instead of stdout.
+// perf_report.py aggregates them over a corpus.
+
+module perf_counters #(
+    parameter NUM_STAGES = 25,
+    parameter ADDR_WIDTH = 17
+)(
+    input clk,
+    input rst,
+    input start,
+    input done,
+    input face_detected,
+
+    // control_fsm.v state and the stage it is on
+    input [3:0] fsm_state,
+    input [4:0] stage_index,
+
+    // Datapath handshakes
+    input stage_done,
+    input stage_passed,
+    input calc_start,
+    input wc_start,
+    input query_valid,
+
+    // ROM addresses; a read is counted whenever the address changes
+    input [ADDR_WIDTH-1:0] cascade_addr,
+    input [ADDR_WIDTH-1:0] feature_addr
+);
+
+    // control_fsm.v states
+    localparam COMPUTE_INTEGRAL = 4'b0001;
+    localparam INIT_SCAN = 4'b0010;
+    localparam READ_STAGE_HEADER = 4'b0011;
+    localparam EVAL_CASCADE = 4'b0100;
+    localparam NEXT_STAGE = 4'b0101;
+
+    reg enabled;
+    integer fd;
+    reg [8*256-1:0] perf_file;
+    reg running;
+    initial begin
+        running = 0;
+        enabled = $test$plusargs("PERF");
+        fd = 32'h8000_0001;  // stdout
+        if ($value$plusargs("PERF_FILE=%s", perf_file)) begin
+            enabled = 1;
+            fd = $fopen(perf_file, "a");
+        end
+    end
+
+    reg [31:0] cycles, integral_cycles, windows;
+    reg [31:0] features, weak_classifiers, rect_queries;
+    reg [31:0] cascade_reads, feature_reads;
+    reg [31:0] stage_evals [0:NUM_STAGES-1];
+    reg [31:0] stage_rejects [0:NUM_STAGES-1];
+    reg [31:0] stage_cycles [0:NUM_STAGES-1];
+    reg [ADDR_WIDTH-1:0] prev_cascade_addr, prev_feature_addr;
+    reg [3:0] prev_state;
+    integer k;
+
+    wire in_stage = (fsm_state == READ_STAGE_HEADER || fsm_state == EVAL_CASCADE ||
+                     fsm_state == NEXT_STAGE) && stage_index < NUM_STAGES;
+
+    always @(posedge clk) begin
+        if (!enabled) begin
+            running <= 0;
+        end else if (rst || (start && !running)) begin
+            running <= !rst;
+            cycles = 0;
+            integral_cycles = 0;
+            windows = 0;
+            features = 0;
+            weak_classifiers = 0;
+            rect_queries = 0;
+            cascade_reads = 0;
+            feature_reads = 0;
+            for (k = 0; k < NUM_STAGES; k = k + 1) begin
+                stage_evals[k] = 0;
+                stage_rejects[k] = 0;
+                stage_cycles[k] = 0;
+            end
+        end else if (running) begin
+            cycles = cycles + 1;
+            if (fsm_state == COMPUTE_INTEGRAL) integral_cycles = integral_cycles + 1;
+            if (fsm_state == INIT_SCAN) windows = windows + 1;
+            if (calc_start) features = features + 1;
+            if (wc_start) weak_classifiers = weak_classifiers + 1;
+            if (query_valid) rect_queries = rect_queries + 1;
+            if (cascade_addr != prev_cascade_addr) cascade_reads = cascade_reads + 1;
+            if (feature_addr != prev_feature_addr) feature_reads = feature_reads + 1;
+            if (in_stage) begin
+                stage_cycles[stage_index] = stage_cycles[stage_index] + 1;
+                if (fsm_state == READ_STAGE_HEADER && prev_state != READ_STAGE_HEADER)
+                    stage_evals[stage_index] = stage_evals[stage_index] + 1;
+                if (fsm_state == EVAL_CASCADE && stage_done && !stage_passed)
+                    stage_rejects[stage_index] = stage_rejects[stage_index] + 1;
+            end
+
+            if (done) begin
+                running <= 0;
+                $fwrite(fd, "PERF cycles=%0d integral_cycles=%0d windows=%0d features=%0d",
+                        cycles, integral_cycles, windows, features);
+                $fwrite(fd, " weak_classifiers=%0d rect_queries=%0d cascade_rom_reads=%0d",
+                        weak_classifiers, rect_queries, cascade_reads);
+                $fwrite(fd, " feature_rom_reads=%0d face_detected=%0d", feature_reads, face_detected);
+                $fwrite(fd, " stage_evals=");
+                for (k = 0; k < NUM_STAGES; k = k + 1) begin
+                    if (k) $fwrite(fd, ",");
+                    $fwrite(fd, "%0d", stage_evals[k]);
+                end
+                $fwrite(fd, " stage_rejects=");
+                for (k = 0; k < NUM_STAGES; k = k + 1) begin
+                    if (k) $fwrite(fd, ",");
+                    $fwrite(fd, "%0d", stage_rejects[k]);
+                end
+                $fwrite(fd, " stage_cycles=");
+                for (k = 0; k < NUM_STAGES; k = k + 1) begin
+                    if (k) $fwrite(fd, ",");
+                    $fwrite(fd, "%0d", stage_cycles[k]);
+                end
+                $fwrite(fd, "\n");
+                $fflush(fd);
+            end
+        end
+        prev_cascade_addr <= cascade_addr;
+        prev_feature_addr <= feature_addr;
+        prev_state <= fsm_state;
+    end
+
+endmodule
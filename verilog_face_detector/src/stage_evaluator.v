@@ -168,15 +168,19 @@ module stage_evaluator #(
         end
     end
 
-    // Debug logging
+`ifndef SYNTHESIS
+    // Debug logging of state changes, enabled with +DEBUG
+    reg debug;
+    initial debug = $test$plusargs("DEBUG");
     reg [2:0] prev_state;
     initial prev_state = 3'h7;
     always @(posedge clk) begin
-        if (state != prev_state) begin
+        if (debug && state != prev_state) begin
             $display("[SE] Time: %t | State: %d | Classifier: %d | Sum: %d", 
                      $time, state, classifier_counter, stage_sum);
             prev_state <= state;
         end
     end
+`endif
 
 endmodule
\ No newline at end of file
@@ -133,7 +133,7 @@ IMAGE_COUNT=$(ls sim/prepared_images/face_*.txt 2>/dev/null | wc -l)
 if [ $IMAGE_COUNT -eq 0 ]; then
     echo -e "${YELLOW}WARNING: No prepared images found${NC}"
     echo "Preparing test images..."
-    make prepare-images
+    make prepare-hex
     if [ $? -eq 0 ]; then
         IMAGE_COUNT=$(ls sim/prepared_images/face_*.txt 2>/dev/null | wc -l)
         echo -e "${GREEN}✓ Prepared ${IMAGE_COUNT} test images${NC}"
@@ -167,11 +167,9 @@ python3 emotion_server.py --host 0.0.0.0 --port 8888 > server.log 2>&1 &
 SERVER_PID=$!
 echo "Server PID: $SERVER_PID"
 
-# Wait for server to start
-sleep 2
-
-# Check if server is running
-if ps -p $SERVER_PID > /dev/null; then
+# Wait until the server answers READY (model loaded and warmed up)
+if python3 -c "from emotion_client import wait_until_ready; wait_until_ready(port=8888, timeout=60)" 2>/dev/null && \
+   ps -p $SERVER_PID > /dev/null; then
     echo -e "${GREEN}✓ Python AI server started${NC}"
 else
     echo -e "${RED}ERROR: Server failed to start${NC}"
@@ -2,10 +2,11 @@
 import os
 import sys
 import subprocess
-import time
 import shutil
 from pathlib import Path
 
+from emotion_client import wait_until_ready
+
 def run_test_pipeline(image_path):
     """
     Runs the full Emotion Classification pipeline:
@@ -33,10 +34,8 @@ def run_test_pipeline(image_path):
         sim_dir.mkdir(exist_ok=True)
         hex_path = sim_dir / "image.txt"
         
-        with open(hex_path, 'w') as f:
-            for y in range(64):
-                for x in range(64):
-                    f.write(f"{arr[y, x]:02x}\n")
+        from image_corpus import write_hex
+        write_hex(arr, hex_path)
         print(f"    Converted {image_path} -> {hex_path}")
         
     except Exception as e:
@@ -61,11 +60,13 @@ def run_test_pipeline(image_path):
         stderr=subprocess.PIPE,
         text=True
     )
-    # Wait a bit for server to start
-    time.sleep(1)
-    if server_process.poll() is not None:
-        print("ERROR: Server failed to start.")
-        print(server_process.stderr.read())
+    # Wait until the server has loaded (and warmed up) its model
+    try:
+        wait_until_ready(port=8888, timeout=60, process=server_process)
+    except (RuntimeError, TimeoutError) as e:
+        print(f"ERROR: Server failed to start: {e}")
+        server_process.kill()
+        print(server_process.communicate()[1])
         return False
     print("    Server running (PID: {})".format(server_process.pid))
 
@@ -0,0 +1,20 @@
+"""
+Shared pytest setup: the modules under test live flat in
+verilog_face_detector/, next to this directory.
+"""
+
+import socket
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def free_port():
+    """A TCP port nothing is listening on."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
@@ -0,0 +1,212 @@
+import io
+import json
+import threading
+import time
+import zipfile
+
+import numpy as np
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import app
+import metrics
+from emotion_client import MOCK_MODEL
+from jobs import JobManager
+from result_cache import ResultCache
+
+FRAME = np.zeros((64, 64), dtype=np.uint8)
+
+
+def test_emotion_server_metrics_port_off_by_default(monkeypatch):
+    monkeypatch.setattr(app, 'EMOTION_METRICS_PORT', 0)
+    assert '--metrics-port' not in app.system_manager.emotion_server_command()
+
+    monkeypatch.setattr(app, 'EMOTION_METRICS_PORT', 9888)
+    cmd = app.system_manager.emotion_server_command()
+    assert cmd[cmd.index('--metrics-port') + 1] == '9888'
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    """A reference-backend SystemManager with canned detection output."""
+    manager = app.SystemManager(backend='reference', mode='first')
+    manager.result_cache = ResultCache(version='test')
+    monkeypatch.setattr(manager, 'run_detection', lambda *args: (
+        "Face detected at (8, 8) size 24\nVPI: Received Result: Happy (confidence: 91.00%)\n", ""))
+    return manager
+
+
+@pytest.mark.parametrize('model', [MOCK_MODEL, None])
+def test_mock_or_unknown_model_results_are_not_cached(manager, monkeypatch, model):
+    monkeypatch.setattr(manager, 'model_fingerprint', model)
+    assert manager.analyze(FRAME, 'u1')['emotion'] == 'Happy (confidence: 91.00%)'
+    assert manager.result_cache.stats()['entries'] == 0
+    assert manager.analyze(FRAME, 'u2')['cached'] is False
+
+
+def test_results_are_keyed_by_model(manager, monkeypatch):
+    monkeypatch.setattr(manager, 'model_fingerprint', 'mini_xception.h5@aaaa')
+    assert manager.analyze(FRAME, 'u1')['cached'] is False
+    assert manager.analyze(FRAME, 'u2')['cached'] is True
+    monkeypatch.setattr(manager, 'model_fingerprint', 'mini_xception.h5@bbbb')
+    assert manager.analyze(FRAME, 'u3')['cached'] is False
+
+
+def test_model_fingerprint_is_fetched_once_per_server(manager, monkeypatch):
+    fetches = []
+    monkeypatch.setattr(manager, 'is_port_open', lambda port: True)
+    monkeypatch.setattr(app, 'wait_until_ready', lambda **kwargs: None)
+    monkeypatch.setattr(manager, 'emotion_model',
+                        lambda: fetches.append(1) or 'mini_xception.h5@aaaa')
+
+    manager.start_emotion_server()
+    manager.start_emotion_server()
+    assert manager.model_fingerprint == 'mini_xception.h5@aaaa'
+    assert manager.analyze(FRAME, 'u1')['cached'] is False
+    assert manager.analyze(FRAME, 'u2')['cached'] is True
+    assert len(fetches) == 1
+
+
+def zip_upload(name, members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for member, data in members.items():
+            archive.writestr(member, data)
+    return FileStorage(io.BytesIO(buffer.getvalue()), filename=name)
+
+
+def test_batch_images_reads_files_and_zip_members():
+    images = app.batch_images([
+        FileStorage(io.BytesIO(b'a' * 10), filename='one.jpg'),
+        zip_upload('set.zip', {'two.png': b'b' * 10, 'notes.txt': b'skipped'})])
+    assert images == [('one.jpg', b'a' * 10), ('set.zip/two.png', b'b' * 10)]
+
+
+def test_batch_images_rejects_too_many_images(monkeypatch):
+    monkeypatch.setattr(app, 'BATCH_MAX_IMAGES', 2)
+    with pytest.raises(ValueError, match='Too many images'):
+        app.batch_images([zip_upload('set.zip', {f'{k}.jpg': b'x' for k in range(3)})])
+
+
+def test_batch_images_rejects_large_zip_member_before_reading(monkeypatch):
+    monkeypatch.setattr(app, 'BATCH_MAX_IMAGE_BYTES', 1000)
+    # Compresses to a few bytes, so only the declared size gives it away
+    upload = zip_upload('bomb.zip', {'big.jpg': b'\0' * 100000})
+    monkeypatch.setattr(zipfile.ZipFile, 'read', lambda *args: pytest.fail('member was read'))
+    with pytest.raises(ValueError, match='image too large'):
+        app.batch_images([upload])
+
+
+def test_batch_images_rejects_large_file(monkeypatch):
+    monkeypatch.setattr(app, 'BATCH_MAX_IMAGE_BYTES', 1000)
+    with pytest.raises(ValueError, match='image too large'):
+        app.batch_images([FileStorage(io.BytesIO(b'x' * 1001), filename='big.jpg')])
+
+
+def test_batch_images_rejects_large_batch(monkeypatch):
+    monkeypatch.setattr(app, 'BATCH_MAX_BYTES', 1500)
+    upload = zip_upload('set.zip', {'a.jpg': b'\0' * 1000, 'b.jpg': b'\0' * 1000})
+    with pytest.raises(ValueError, match='Batch too large'):
+        app.batch_images([upload])
+
+
+def test_batch_rejects_oversized_request_body(monkeypatch):
+    monkeypatch.setitem(app.app.config, 'MAX_CONTENT_LENGTH', 1000)
+    response = app.app.test_client().post('/batch', data={
+        'file': (io.BytesIO(b'x' * 2000), 'big.jpg')})
+    assert response.status_code == 413
+
+
+def test_upload_hex_is_written_to_a_scratch_dir_and_removed(monkeypatch, tmp_path):
+    manager = app.SystemManager(backend='rtl', mode='first')
+    manager.sim_pool.scratch_root = str(tmp_path)
+    seen = []
+
+    def run_verilog_simulation(image_txt_path, original_filename=None):
+        seen.append(image_txt_path)
+        assert image_txt_path.read_text().split()[0] == '00'
+        return "No face detected.\n", ""
+
+    monkeypatch.setattr(manager, 'run_verilog_simulation', run_verilog_simulation)
+    assert manager.run_detection(FRAME, 'u1') == ("No face detected.\n", "")
+    assert seen[0].parent.parent == tmp_path
+    assert not seen[0].parent.exists()
+    assert not list((app.SIM_DIR / 'prepared_images').glob('face_u1.txt'))
+    manager.shutdown()
+
+
+def test_batch_workers_close_their_emotion_clients(monkeypatch):
+    opened = []
+
+    class FakeClient:
+        def __init__(self, port):
+            self.closed = False
+            opened.append(self)
+
+        def close(self):
+            self.closed = True
+
+    manager = app.system_manager
+    monkeypatch.setattr(app, 'EmotionClient', FakeClient)
+    monkeypatch.setattr(app, 'BATCH_WORKERS', 2)
+    monkeypatch.setattr(manager, 'start_emotion_server', lambda: None)
+    monkeypatch.setattr(app, 'analyze_batch_image', lambda k, name, data, debug: (
+        manager.emotion_client(), {'index': k, 'name': name})[1])
+
+    response = app.app.test_client().post('/batch', data={
+        'file': [(io.BytesIO(b'x'), f'{k}.jpg') for k in range(5)]})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(line['index'] for line in lines[:-1]) == list(range(5))
+    assert lines[-1]['done'] is True
+
+    deadline = time.monotonic() + 5
+    while not all(client.closed for client in opened) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert 1 <= len(opened) <= 2
+    assert all(client.closed for client in opened)
+
+
+def test_job_events_stream_each_stage_until_done(monkeypatch):
+    def handler(job, value):
+        job.set_stage('detecting')
+        return {'value': value, 'result_filename': 'result_u.png'}
+
+    manager = JobManager(handler, workers=1)
+    monkeypatch.setattr(app, 'job_manager', manager)
+    job = manager.submit(7)
+    body = app.app.test_client().get(f'/jobs/{job.id}/events').get_data(as_text=True)
+    events = [block.split('\n') for block in body.strip().split('\n\n')]
+    states = [lines[0] for lines in events if lines[0].startswith('event: ')]
+    # Intermediate events may be merged, but the stream always ends done
+    assert states[-1] == 'event: done'
+    result = json.loads(events[-1][1][len('data: '):])['result']
+    assert result['value'] == 7
+    assert result['result_image'].endswith('/uploads/result_u.png')
+    assert app.app.test_client().get('/jobs/unknown/events').status_code == 404
+    manager.shutdown()
+
+
+def test_submit_job_answers_busy_when_the_queue_is_full(monkeypatch, tmp_path):
+    started, release = threading.Event(), threading.Event()
+    manager = JobManager(lambda job, *upload: started.set() or release.wait(5),
+                         workers=1, max_queued=1)
+    monkeypatch.setattr(app, 'job_manager', manager)
+    monkeypatch.setattr(app, 'save_upload', lambda: ((tmp_path / 'u.jpg', 'u', 'u.jpg'), None))
+    client = app.app.test_client()
+    assert client.post('/jobs').status_code == 202
+    assert started.wait(5)
+    assert client.post('/jobs').status_code == 202
+    response = client.post('/jobs')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(app.JOB_RETRY_AFTER)
+    release.set()
+    manager.shutdown()
+
+
+def test_metrics_route_exposes_app_metrics():
+    response = app.app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert '# TYPE facedet_stage_seconds histogram' in text
+    assert 'facedet_queue_depth{queue="jobs",state="queued"}' in text
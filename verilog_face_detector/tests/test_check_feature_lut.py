@@ -0,0 +1,41 @@
+"""
+Tests for check_feature_lut.py against the shipped and corrupted ROMs.
+"""
+
+import shutil
+from pathlib import Path
+
+from check_feature_lut import check
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+XML_FILE = DATA_DIR / 'haarcascade_frontalface_default.xml'
+DATA_FILES = ('cascade_data.mem', 'cascade_data.coe', 'feature_geom.mem',
+              'feature_geom.coe', 'rom_params.vh')
+
+
+def copy_data(tmp_path):
+    for name in DATA_FILES:
+        shutil.copy(DATA_DIR / name, tmp_path / name)
+    return tmp_path
+
+
+def test_shipped_roms_pass():
+    count, errors = check(XML_FILE, DATA_DIR)
+    assert count > 0
+    assert errors == []
+
+
+def test_corrupted_geometry_weight_is_reported(tmp_path):
+    data_dir = copy_data(tmp_path)
+    geom_file = data_dir / 'feature_geom.mem'
+    lines = geom_file.read_text().splitlines()
+    # First record of slot 0: flip the first rect's weight sign bit
+    k = next(i for i, line in enumerate(lines) if line and line[0] not in '@/')
+    words = lines[k].split()
+    words[0] = format(int(words[0], 16) ^ 0x80, '08x')
+    lines[k] = ' '.join(words)
+    geom_file.write_text('\n'.join(lines) + '\n')
+
+    _, errors = check(XML_FILE, data_dir)
+    assert any('feature_geom.coe does not match' in e for e in errors)
+    assert any('geometry' in e and 'expected' in e for e in errors)
@@ -0,0 +1,56 @@
+"""
+Tests for all-faces window parsing and non-max suppression.
+"""
+
+import numpy as np
+import pytest
+
+from detections import iou_matrix, non_max_suppression, parse_windows
+
+
+def test_parse_windows():
+    stdout = ("Window at (24, 20) size 24\nnoise\nWindow at ( 4,  8) size 30\n"
+              "2 windows passed\n")
+    assert parse_windows(stdout).tolist() == [[24, 20, 24], [4, 8, 30]]
+    assert parse_windows("No face detected.\n").shape == (0, 3)
+
+
+def test_iou_matrix():
+    iou = iou_matrix([[0, 0, 10], [5, 0, 10], [20, 20, 10]])
+    assert np.allclose(np.diag(iou), 1.0)
+    # 50 shared pixels out of 150
+    assert iou[0, 1] == pytest.approx(1 / 3)
+    assert iou[1, 0] == iou[0, 1]
+    assert iou[0, 2] == 0
+
+
+def test_overlapping_windows_merge_into_the_best_supported():
+    # A cluster of three around (4, 4) and a lone window far away
+    boxes = [[0, 0, 24], [4, 4, 24], [8, 8, 24], [40, 40, 24]]
+    kept, neighbors = non_max_suppression(boxes)
+    assert kept.tolist() == [[4, 4, 24], [40, 40, 24]]
+    assert neighbors.tolist() == [2, 0]
+
+
+def test_ties_keep_scan_order():
+    kept, _ = non_max_suppression([[0, 0, 24], [4, 0, 24]])
+    assert kept.tolist() == [[0, 0, 24]]
+
+
+def test_min_neighbors_drops_unsupported_windows():
+    boxes = [[0, 0, 24], [4, 4, 24], [40, 40, 24]]
+    kept, neighbors = non_max_suppression(boxes, min_neighbors=1)
+    assert kept.tolist() == [[0, 0, 24]]
+    assert neighbors.tolist() == [1]
+
+
+def test_iou_threshold_controls_merging():
+    boxes = [[0, 0, 24], [12, 0, 24]]
+    assert len(non_max_suppression(boxes, iou_threshold=0.3)[0]) == 1
+    assert len(non_max_suppression(boxes, iou_threshold=0.5)[0]) == 2
+
+
+def test_no_windows():
+    kept, neighbors = non_max_suppression([])
+    assert kept.shape == (0, 3)
+    assert neighbors.shape == (0,)
@@ -0,0 +1,126 @@
+import asyncio
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import emotion_server
+from emotion_client import MOCK_MODEL, EmotionClient, wait_until_ready
+
+
+def _run_until_cancelled(loop, task):
+    try:
+        loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def run_server():
+    """Starts emotion_server.serve() on a background event loop."""
+    servers = []
+
+    def start(port, classifier=None, wait=True, **kwargs):
+        loop = asyncio.new_event_loop()
+        task = loop.create_task(emotion_server.serve(
+            '127.0.0.1', port, classifier or emotion_server.EmotionClassifier(), **kwargs))
+        thread = threading.Thread(target=_run_until_cancelled, args=(loop, task), daemon=True)
+        thread.start()
+        servers.append((loop, task, thread))
+        if wait:
+            wait_until_ready(port=port, timeout=10)
+
+    yield start
+    for loop, task, thread in servers:
+        loop.call_soon_threadsafe(task.cancel)
+        thread.join(timeout=5)
+
+
+def test_metrics_port_in_use_does_not_stop_roi_server(run_server, free_port):
+    with socket.socket() as busy:
+        busy.bind(('127.0.0.1', 0))
+        busy.listen()
+        run_server(free_port, metrics_port=busy.getsockname()[1])
+        with EmotionClient(port=free_port) as client:
+            assert client.request(['READY'])[0].startswith('READY')
+            assert 'confidence' in client.classify(0, 0, 24, 24)
+
+
+def test_ready_reports_model_fingerprint(run_server, free_port, tmp_path):
+    run_server(free_port)
+    with EmotionClient(port=free_port) as client:
+        assert client.model() == MOCK_MODEL
+
+    model = tmp_path / 'mini_xception.h5'
+    model.write_bytes(b'weights v1')
+    first = emotion_server.model_fingerprint(model)
+    assert first.startswith('mini_xception.h5@')
+    model.write_bytes(b'weights v2')
+    assert emotion_server.model_fingerprint(model) != first
+
+
+class GatedClassifier(emotion_server.EmotionClassifier):
+    """Mock classifier that records batch sizes and holds each batch until gate is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.batch_sizes = []
+
+    def predict_batch(self, rois):
+        self.batch_sizes.append(len(rois))
+        self.gate.wait(5)
+        return super().predict_batch(rois)
+
+
+class NullWriter:
+    def get_extra_info(self, name):
+        return ('127.0.0.1', 0)
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def until(predicate):
+    for _ in range(500):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+
+def test_requests_of_a_reset_connection_are_not_classified():
+    async def scenario():
+        classifier = GatedClassifier()
+        executor = ThreadPoolExecutor(max_workers=1)
+        scheduler = emotion_server.BatchScheduler(classifier, executor, max_batch=8, max_wait_ms=1)
+        scheduler.ready.set()
+        scheduler.start()
+
+        # Keep the inference thread busy so the client's ROIs stay queued
+        busy = asyncio.create_task(scheduler.classify())
+        await until(lambda: classifier.batch_sizes)
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"ROI 0 0 24 24\n" * 3)
+        client = asyncio.create_task(emotion_server.handle_client(reader, NullWriter(), scheduler))
+        await until(lambda: scheduler.queue.qsize() == 3)
+
+        reader.set_exception(ConnectionResetError("reset by peer"))
+        await client
+        classifier.gate.set()
+        await busy
+        await scheduler.classify()
+        await scheduler.stop()
+        executor.shutdown()
+        return classifier.batch_sizes
+
+    assert asyncio.run(scenario()) == [1, 1]
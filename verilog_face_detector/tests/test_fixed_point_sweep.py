@@ -0,0 +1,33 @@
+"""
+Tests for the fixed-point sweep's simulation images.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from fixed_point_sweep import write_format
+from parse_cascade import cascade_rom_words, load_ir
+
+IR_FILE = Path(__file__).resolve().parent.parent / 'data' / 'cascade_ir.npz'
+
+
+def read_words(mem_file):
+    return mem_file.read_text().split()
+
+
+def test_narrow_format_is_written_sign_extended_to_32_bits(tmp_path):
+    ir = load_ir(IR_FILE)
+    mem_file = write_format(tmp_path, ir, 'Q4.8', 8)
+    words = read_words(mem_file)
+    assert all(len(word) == 8 for word in words)
+
+    expected = cascade_rom_words(ir, 8)
+    values = np.array([int(word, 16) for word in words], dtype=np.int64)
+    values = np.where(values >= 1 << 31, values - (1 << 32), values)
+    assert (values == expected).all()
+    # Negative leaves must not be zero-extended when +CASCADE loads the file
+    assert (expected < 0).any()
+    assert not list(tmp_path.glob('*.vh'))
+    coe_words = (tmp_path / 'cascade_q4_8.coe').read_text().split('=')[-1]
+    assert all(len(word.strip(' ;\n')) == 8 for word in coe_words.split(','))
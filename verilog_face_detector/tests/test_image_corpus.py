@@ -0,0 +1,33 @@
+"""
+Tests for building packed image corpora.
+"""
+
+import numpy as np
+from PIL import Image
+
+from image_corpus import ImageCorpus, build_corpus, index_path
+
+
+def make_images(directory, count, seed=0):
+    directory.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    for k in range(count):
+        Image.fromarray(rng.integers(0, 256, (80, 80), dtype=np.uint8)).save(
+            directory / f"{k:06d}.png")
+    return directory
+
+
+def test_named_corpus_leaves_the_default_corpus_alone(tmp_path):
+    out = tmp_path / 'prepared'
+    default = build_corpus(make_images(tmp_path / 'a', 3), out / 'corpus.frames')
+    default_bytes = default.read_bytes()
+    default_index = index_path(default).read_text()
+
+    other = build_corpus(make_images(tmp_path / 'b', 2, seed=1), out / 'other.frames')
+    assert other == out / 'other.frames'
+    assert sorted(p.name for p in out.iterdir()) == [
+        'corpus.frames', 'corpus.json', 'other.frames', 'other.json']
+    assert default.read_bytes() == default_bytes
+    assert index_path(default).read_text() == default_index
+    assert len(ImageCorpus(default)) == 3
+    assert len(ImageCorpus(other)) == 2
@@ -0,0 +1,105 @@
+"""
+Tests for the bounded background job queue.
+"""
+
+import threading
+
+import pytest
+
+from jobs import JobManager, QueueFullError
+
+
+def blocked_manager(workers=1, max_queued=2, **kwargs):
+    """A manager whose handler holds every job until release is set."""
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def handler(job, value):
+        started.release()
+        release.wait(5)
+        if value == 'fail':
+            raise RuntimeError('boom')
+        return value * 2
+
+    return JobManager(handler, workers=workers, max_queued=max_queued, **kwargs), release, started
+
+
+def finish(job):
+    while job.state not in ('done', 'failed'):
+        job.wait(job.version, timeout=5)
+
+
+def test_jobs_run_and_record_results():
+    manager, release, _ = blocked_manager()
+    release.set()
+    done, failed = manager.submit(21), manager.submit('fail')
+    finish(done)
+    finish(failed)
+    assert done.snapshot()['result'] == 42
+    assert failed.snapshot()['error'] == 'boom'
+    assert manager.stats()['completed'] == 1
+    assert manager.stats()['failed'] == 1
+    manager.shutdown()
+
+
+def test_full_queue_rejects_without_blocking():
+    manager, release, started = blocked_manager(max_queued=2)
+    running = manager.submit(1)
+    assert started.acquire(timeout=5)
+    queued = [manager.submit(2), manager.submit(3)]
+    with pytest.raises(QueueFullError):
+        manager.submit(4)
+    assert manager.stats()['rejected'] == 1
+    assert manager.position(queued[1]) == 1
+    assert manager.position(running) == 0
+    release.set()
+    manager.shutdown()
+
+
+def test_wait_wakes_on_stage_change():
+    manager, release, started = blocked_manager()
+    job = manager.submit(1)
+    assert started.acquire(timeout=5)
+    version = job.version
+    threading.Timer(0.05, job.set_stage, ['detecting']).start()
+    assert job.wait(version, timeout=5) != version
+    assert job.stage == 'detecting'
+    assert job.wait(job.version, timeout=0.01) == job.version
+    release.set()
+    manager.shutdown()
+
+
+def test_finished_jobs_expire_oldest_first():
+    manager, release, _ = blocked_manager(max_queued=8, keep_finished=2)
+    release.set()
+    jobs = [manager.submit(k) for k in range(4)]
+    for job in jobs:
+        finish(job)
+    # The last job's expiry runs just after it is marked done
+    manager.shutdown()
+    for thread in manager._threads:
+        thread.join(5)
+    assert [manager.get(job.id) for job in jobs[:2]] == [None, None]
+    assert all(manager.get(job.id) is job for job in jobs[2:])
+
+
+def test_shutdown_with_a_full_queue_fails_pending_jobs():
+    manager, release, started = blocked_manager(workers=2, max_queued=2)
+    running = [manager.submit(1), manager.submit(2)]
+    assert started.acquire(timeout=5) and started.acquire(timeout=5)
+    queued = [manager.submit(3), manager.submit(4)]
+
+    stopper = threading.Thread(target=manager.shutdown)
+    stopper.start()
+    stopper.join(2)
+    assert not stopper.is_alive()
+    assert [job.state for job in queued] == ['failed', 'failed']
+    assert queued[0].error == 'Server shutting down'
+    with pytest.raises(QueueFullError):
+        manager.submit(5)
+
+    release.set()
+    for thread in manager._threads:
+        thread.join(5)
+        assert not thread.is_alive()
+    assert [job.state for job in running] == ['done', 'done']
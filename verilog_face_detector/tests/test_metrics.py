@@ -0,0 +1,105 @@
+"""
+Tests for the Prometheus text exposition in metrics.py.
+"""
+
+import asyncio
+
+import pytest
+
+import metrics
+
+
+@pytest.fixture
+def registry():
+    return metrics.Registry()
+
+
+def test_counter_and_gauge(registry):
+    requests = metrics.Counter('requests_total', 'Requests', ['code'], registry=registry)
+    requests.inc(code=200)
+    requests.inc(2, code=200)
+    requests.inc(code=503)
+    depth = metrics.Gauge('depth', 'Queue depth', registry=registry)
+    depth.inc(3)
+    depth.dec()
+    assert registry.render() == (
+        '# HELP requests_total Requests\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{code="200"} 3\n'
+        'requests_total{code="503"} 1\n'
+        '# HELP depth Queue depth\n'
+        '# TYPE depth gauge\n'
+        'depth 2\n')
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    latency = metrics.Histogram('latency_seconds', 'Latency', ['stage'], buckets=(0.1, 1.0),
+                                registry=registry)
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value, stage='detect')
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'latency_seconds_bucket{stage="detect",le="0.1"} 1',
+        'latency_seconds_bucket{stage="detect",le="1.0"} 3',
+        'latency_seconds_bucket{stage="detect",le="+Inf"} 4',
+        'latency_seconds_sum{stage="detect"} 6.05',
+        'latency_seconds_count{stage="detect"} 4']
+
+
+def test_histogram_time_observes_on_error(registry):
+    latency = metrics.Histogram('t_seconds', 'T', registry=registry)
+    with pytest.raises(RuntimeError):
+        with latency.time():
+            raise RuntimeError
+    assert 't_seconds_count 1' in registry.render()
+
+
+def test_function_backed_metrics(registry):
+    metrics.Gauge('queue_depth', 'Depth', ['queue'], registry=registry).set_function(
+        lambda: {('jobs',): 2, ('sims',): 1})
+    metrics.Gauge('up', 'Up', registry=registry).set_function(lambda: 1)
+    text = registry.render()
+    assert 'queue_depth{queue="jobs"} 2\nqueue_depth{queue="sims"} 1\n' in text
+    assert '\nup 1\n' in text
+
+
+def test_labels_are_escaped_and_checked(registry):
+    counter = metrics.Counter('c_total', 'Help with "quotes"\nand lines', ['name'],
+                              registry=registry)
+    counter.inc(name='a"b\\c\nd')
+    text = registry.render()
+    assert '# HELP c_total Help with \\"quotes\\"\\nand lines' in text
+    assert 'c_total{name="a\\"b\\\\c\\nd"} 1' in text
+    with pytest.raises(ValueError):
+        counter.inc(other='x')
+
+
+def test_duplicate_names_are_rejected(registry):
+    metrics.Counter('dup_total', 'A', registry=registry)
+    with pytest.raises(ValueError):
+        metrics.Counter('dup_total', 'B', registry=registry)
+
+
+def scrape(registry, request):
+    async def run():
+        server = await asyncio.start_server(
+            lambda r, w: metrics.handle_scrape(r, w, registry), '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(request)
+        response = await reader.read()
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return response.decode()
+    return asyncio.run(run())
+
+
+def test_handle_scrape_serves_metrics(registry):
+    metrics.Counter('scraped_total', 'S', registry=registry).inc()
+    response = scrape(registry, b'GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n')
+    head, body = response.split('\r\n\r\n', 1)
+    assert head.startswith('HTTP/1.0 200 OK')
+    assert f'Content-Type: {metrics.CONTENT_TYPE}' in head
+    assert body == registry.render()
+    assert scrape(registry, b'GET /other HTTP/1.1\r\n\r\n').startswith('HTTP/1.0 404')
@@ -0,0 +1,63 @@
+"""
+Tests for the cascade compiler's ROM emitters.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from parse_cascade import (GEOM_STRIDE, cascade_rom_words, geometry_rom_words, hex_words, load_ir,
+                           write_mem_file)
+
+IR_FILE = Path(__file__).resolve().parent.parent / 'data' / 'cascade_ir.npz'
+
+
+def decode_weights(header, count):
+    """Rect weights as feature_calculator.v decodes them from a header word."""
+    weights = []
+    for i in range(count):
+        nibble = (header >> (4 + 4 * i)) & 0xF
+        magnitude = ((16 - nibble) if nibble & 8 else nibble) & 7
+        weights.append(-magnitude if nibble & 8 else magnitude)
+    return weights
+
+
+def test_geometry_headers_decode_to_the_cascade_weights():
+    ir = load_ir(IR_FILE)
+    words = geometry_rom_words(ir)
+    offsets = ir['feature_offsets']
+    for f in range(len(offsets) - 1):
+        header = int(words[f * GEOM_STRIDE])
+        count = offsets[f + 1] - offsets[f]
+        assert header & 0xF == count
+        assert decode_weights(header, count) == \
+            (ir['rect_weight'][offsets[f]:offsets[f + 1]]).astype(int).tolist()
+
+
+@pytest.mark.parametrize('weight', [-8.0, 8.0, 0.5])
+def test_unrepresentable_weights_are_rejected(weight):
+    ir = dict(load_ir(IR_FILE))
+    ir['rect_weight'] = np.array(ir['rect_weight'], dtype=np.float64)
+    ir['rect_weight'][0] = weight
+    with pytest.raises(ValueError, match='weight'):
+        geometry_rom_words(ir)
+
+
+def test_cascade_mem_is_one_rom_word_per_line(tmp_path):
+    ir = load_ir(IR_FILE)
+    mem_file = tmp_path / 'cascade_data.mem'
+    write_mem_file(mem_file, ir)
+    lines = mem_file.read_text().splitlines()
+    assert lines == hex_words(cascade_rom_words(ir))
+    assert all(len(line) == 8 for line in lines)
+
+
+def test_shipped_cascade_mem_matches_rom_params():
+    data_dir = IR_FILE.parent
+    lines = (data_dir / 'cascade_data.mem').read_text().splitlines()
+    params = dict(line.split()[1:] for line in (data_dir / 'rom_params.vh').read_text().splitlines()
+                  if line.startswith('`define') and len(line.split()) == 3)
+    assert len(lines) == int(params['CASCADE_ROM_DEPTH'])
+    assert len(lines) <= 1 << int(params['CASCADE_ROM_ADDR_WIDTH'])
+    assert not any(line.startswith('//') for line in lines)
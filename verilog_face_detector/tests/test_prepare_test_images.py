@@ -0,0 +1,116 @@
+"""
+Tests for incremental corpus preparation.
+"""
+
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import prepare_test_images
+from image_corpus import ImageCorpus
+from prepare_test_images import prepare_corpus
+from reference_detector import load_image
+
+
+def save_image(path, seed):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (80, 80), dtype=np.uint8)).save(path)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    directory = tmp_path / 'images'
+    directory.mkdir()
+    for k in range(3):
+        save_image(directory / f"{k:06d}.png", seed=k)
+    return directory
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    """Records the source of every image that actually gets decoded."""
+    converted = []
+    convert_image = prepare_test_images.convert_image
+
+    def recording(task):
+        converted.append(task[0].name)
+        return convert_image(task)
+
+    monkeypatch.setattr(prepare_test_images, 'convert_image', recording)
+    return converted
+
+
+def prepare(sources, out, **kwargs):
+    return prepare_corpus([sources], out, jobs=1, verbose=False, **kwargs)
+
+
+def modify(path, seed):
+    """Rewrites an image with new content and a different mtime."""
+    st = path.stat()
+    save_image(path, seed)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_unchanged_sources_are_not_converted_again(sources, tmp_path, conversions):
+    out = tmp_path / 'out'
+    corpus_path, converted, reused, failed = prepare(sources, out)
+    assert (converted, reused, failed) == (3, 0, 0)
+    frames = np.array(ImageCorpus(corpus_path).frames)
+
+    conversions.clear()
+    assert prepare(sources, out)[1:] == (0, 3, 0)
+    assert conversions == []
+    np.testing.assert_array_equal(ImageCorpus(corpus_path).frames, frames)
+
+    # A new mtime alone is not a change while the content hash matches
+    path = sources / '000001.png'
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert prepare(sources, out)[1:] == (0, 3, 0)
+    assert conversions == []
+
+
+def test_changed_and_deleted_sources(sources, tmp_path, conversions):
+    out = tmp_path / 'out'
+    corpus_path = prepare(sources, out)[0]
+    before = ImageCorpus(corpus_path)
+    first = np.array(before[0])
+    del before
+
+    modify(sources / '000002.png', seed=10)
+    (sources / '000001.png').unlink()
+    conversions.clear()
+    assert prepare(sources, out)[1:] == (1, 1, 0)
+    assert conversions == ['000002.png']
+
+    corpus = ImageCorpus(corpus_path)
+    assert corpus.names == ['000000.png', '000002.png']
+    np.testing.assert_array_equal(corpus[0], first)
+    expected = prepare_test_images.convert_image((sources / '000002.png', 64, 64))[1]
+    np.testing.assert_array_equal(corpus[1], expected)
+
+
+def test_force_converts_everything(sources, tmp_path, conversions):
+    out = tmp_path / 'out'
+    prepare(sources, out)
+    conversions.clear()
+    assert prepare(sources, out, force=True)[1:] == (3, 0, 0)
+    assert sorted(conversions) == ['000000.png', '000001.png', '000002.png']
+
+
+def test_hex_files_follow_a_shrinking_image_set(sources, tmp_path):
+    out = tmp_path / 'out'
+    prepare(sources, out, write_hex_files=True)
+    assert sorted(p.name for p in out.glob('face_*.txt')) == [
+        'face_01.txt', 'face_02.txt', 'face_03.txt']
+
+    modify(sources / '000002.png', seed=10)
+    (sources / '000000.png').unlink()
+    corpus_path = prepare(sources, out, write_hex_files=True)[0]
+
+    assert sorted(p.name for p in out.glob('face_*.txt')) == ['face_01.txt', 'face_02.txt']
+    corpus = ImageCorpus(corpus_path)
+    for k in range(len(corpus)):
+        np.testing.assert_array_equal(load_image(out / f"face_{k + 1:02d}.txt"), corpus[k])
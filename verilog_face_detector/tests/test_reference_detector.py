@@ -0,0 +1,164 @@
+"""
+Cross-checks the vectorized reference detector against a plain per-window
+evaluation of the cascade, written straight from the IR and the RTL rules.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from parse_cascade import load_ir
+from reference_detector import ReferenceDetector, load_image
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+IR_FILE = BASE_DIR / 'data' / 'cascade_ir.npz'
+IMAGE_DIR = BASE_DIR / 'sim' / 'prepared_images'
+
+IMG_SIZE = 64
+MIN_WINDOW = 24
+STEP = 4
+
+
+def q16(value):
+    """Q16.16 as the ROM stores it: scaled by 2^16 and truncated toward zero."""
+    return int(value * 65536)
+
+
+def scaled(coord, scale):
+    """Rect corner offset at a window_scale, in the RTL's 16-bit arithmetic."""
+    return (coord * scale & 0xFFFF) >> 8
+
+
+def load_stages(ir):
+    """[(stage threshold, [(rects, threshold, left, right), ...]), ...] as Python ints."""
+    stage_offsets = ir['stage_offsets'].tolist()
+    feature_offsets = ir['feature_offsets'].tolist()
+    stages = []
+    for s, stage_threshold in enumerate(ir['stage_threshold'].tolist()):
+        classifiers = []
+        for c in range(stage_offsets[s], stage_offsets[s + 1]):
+            f = int(ir['clf_feature'][c])
+            rects = [(ir['rect_xywh'][r].tolist(), int(ir['rect_weight'][r]))
+                     for r in range(feature_offsets[f], feature_offsets[f + 1])]
+            classifiers.append((rects, q16(ir['clf_threshold'][c]),
+                                q16(ir['clf_left'][c]), q16(ir['clf_right'][c])))
+        stages.append((q16(stage_threshold), classifiers))
+    return stages
+
+
+def stage_sum(classifiers, image, wx, wy, scale):
+    """Sum of one stage's weak classifier outputs for a window."""
+    total = 0
+    for rects, threshold, left, right in classifiers:
+        value = 0
+        for (x, y, w, h), weight in rects:
+            x1, y1 = wx + scaled(x, scale), wy + scaled(y, scale)
+            x2, y2 = wx + scaled(x + w, scale), wy + scaled(y + h, scale)
+            assert x2 <= IMG_SIZE and y2 <= IMG_SIZE
+            value += weight * int(image[y1:y2, x1:x2].sum(dtype=np.int64))
+        # The Q16.16 threshold is compared with the integer feature value
+        total += left if value < threshold else right
+    return total
+
+
+def stages_passed(stages, image, wx, wy, scale):
+    """Number of stages one window gets through before the cascade rejects it."""
+    for k, (stage_threshold, classifiers) in enumerate(stages):
+        if stage_sum(classifiers, image, wx, wy, scale) < stage_threshold:
+            return k
+    return len(stages)
+
+
+def scalar_scan(stages, image, scales):
+    """(hits as (x, y, scale) in scan order, windows reaching each stage)."""
+    origins = [0]
+    while origins[-1] + MIN_WINDOW + STEP < IMG_SIZE:
+        origins.append(origins[-1] + STEP)
+    hits = []
+    stage_counts = [0] * len(stages)
+    for scale in scales:
+        for wy in origins:
+            for wx in origins:
+                passed = stages_passed(stages, image, wx, wy, scale)
+                for k in range(min(passed + 1, len(stages))):
+                    stage_counts[k] += 1
+                if passed == len(stages):
+                    hits.append((wx, wy, scale))
+    return hits, stage_counts
+
+
+@pytest.fixture(scope='module')
+def stages():
+    return load_stages(load_ir(IR_FILE))
+
+
+@pytest.fixture(scope='module')
+def detector():
+    return ReferenceDetector(ir_file=IR_FILE)
+
+
+def two_face_frame():
+    """The face window of face_20 pasted at two grid-aligned origins."""
+    face = load_image(IMAGE_DIR / 'face_20.txt')[24:48, 20:44]
+    image = np.full((IMG_SIZE, IMG_SIZE), int(face.mean()), dtype=np.uint8)
+    image[0:24, 0:24] = face
+    image[36:60, 36:60] = face
+    return image
+
+
+FRAMES = {
+    'face': lambda: load_image(IMAGE_DIR / 'face_20.txt'),
+    'other_face': lambda: load_image(IMAGE_DIR / 'face_30.txt'),
+    'no_face': lambda: load_image(IMAGE_DIR / 'face_01.txt'),
+    'noise': lambda: np.random.default_rng(7).integers(0, 256, (IMG_SIZE, IMG_SIZE), dtype=np.uint8),
+    'two_faces': two_face_frame,
+}
+
+
+@pytest.mark.parametrize('name', sorted(FRAMES))
+def test_detect_matches_scalar_evaluation(name, stages, detector):
+    image = FRAMES[name]()
+    hits, expected_counts = scalar_scan(stages, image, detector.scales)
+
+    stage_counts = [0] * len(detector.stages)
+    assert detector.scan(image, stage_counts) == hits
+    assert stage_counts == expected_counts
+
+    detection = detector.detect(image)
+    if hits:
+        x, y, scale = hits[0]
+        assert detection == (True, x, y, scale)
+    else:
+        assert detection == (False, None, None, None)
+
+
+def test_scan_all_reports_every_window(stages, detector):
+    image = two_face_frame()
+    hits, _ = scalar_scan(stages, image, detector.scales)
+    assert len(hits) == 2
+    assert detector.detect_all(image) == [(x, y, (MIN_WINDOW * (scale + 1)) >> 8)
+                                          for x, y, scale in hits]
+
+
+def test_frames_cover_faces_and_rejections(stages, detector):
+    # Guards the fixtures above: the comparison is only meaningful if some
+    # frames pass the whole cascade and others exit early
+    assert scalar_scan(stages, FRAMES['face'](), detector.scales)[0]
+    assert not scalar_scan(stages, FRAMES['no_face'](), detector.scales)[0]
+
+
+def test_thresholds_truncate_to_q16(stages):
+    # Put every stage threshold a fraction of an LSB away from the face
+    # window's stage sum, so the window only passes if the conversion
+    # truncates toward zero like the ROM emitter
+    ir = dict(load_ir(IR_FILE))
+    image = FRAMES['face']()
+    sums = [stage_sum(classifiers, image, 20, 24, 255) for _, classifiers in stages]
+    ir['stage_threshold'] = np.array([(s + (0.75 if s >= 0 else -0.75)) / 65536 for s in sums])
+
+    margin_stages = load_stages(ir)
+    assert [threshold for threshold, _ in margin_stages] == sums
+    hits, _ = scalar_scan(margin_stages, image, (255,))
+    assert (20, 24, 255) in hits
+    assert ReferenceDetector(ir=ir).scan(image) == hits
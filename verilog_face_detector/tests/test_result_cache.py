@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+import result_cache
+from result_cache import ResultCache, design_version
+
+FRAME = np.arange(64 * 64, dtype=np.uint8).reshape(64, 64)
+
+
+def test_key_depends_on_frame_backend_and_version():
+    cache = ResultCache(version='v1')
+    key = cache.key(FRAME, 'reference/first/m@1')
+    assert key == cache.key(FRAME.copy(), 'reference/first/m@1')
+    assert key != cache.key(FRAME, 'reference/first/m@2')
+    assert key != cache.key(FRAME, 'rtl/first/m@1')
+    assert key != ResultCache(version='v2').key(FRAME, 'reference/first/m@1')
+    other = FRAME.copy()
+    other[0, 0] ^= 1
+    assert key != cache.key(other, 'reference/first/m@1')
+
+
+def test_lru_eviction_and_stats():
+    cache = ResultCache(max_entries=2, version='v')
+    cache.put('a', {'v': 1})
+    cache.put('b', {'v': 2})
+    assert cache.get('a') == {'v': 1}     # a is now most recent
+    cache.put('c', {'v': 3})              # evicts b
+    assert cache.get('b') is None
+    assert cache.get('c') == {'v': 3}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (2, 1, 1, 2)
+
+
+def test_disk_store_survives_restart(tmp_path):
+    ResultCache(version='v', disk_dir=tmp_path).put('k', {'emotion': 'Happy'})
+    cache = ResultCache(version='v', disk_dir=tmp_path)
+    assert cache.get('k') == {'emotion': 'Happy'}
+    assert cache.stats()['disk_hits'] == 1
+
+
+@pytest.mark.parametrize('source', ['vpi/verilog_python_interface.c', 'sim/wave_trace.vh'])
+def test_design_version_covers_emotion_path_sources(source):
+    assert source in result_cache.DESIGN_FILES
+
+
+def test_design_version_changes_with_sources(tmp_path):
+    (tmp_path / 'src').mkdir()
+    rtl = tmp_path / 'src' / 'top.v'
+    rtl.write_text('module top; endmodule\n')
+    before = design_version(tmp_path, ['src/*.v'])
+    rtl.write_text('module top; wire x; endmodule\n')
+    assert design_version(tmp_path, ['src/*.v']) != before
@@ -0,0 +1,118 @@
+"""
+Tests for the simulation daemon's job queue protocol, against a fake
+simulator speaking the $fetch_frame / $report_detection side over a
+socket pair instead of vvp.
+"""
+
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+import sim_daemon
+from sim_daemon import DaemonResult, SimulationDaemon
+from sim_pool import PoolBusyError
+
+FRAME = np.arange(64 * 64, dtype=np.uint8).reshape(64, 64)
+
+
+def run_fake_simulator(conn, reply, log):
+    """Asks for frames until QUIT; reply(job_id, frame) gives the RESULT line."""
+    reader = conn.makefile('rb')
+    with conn:
+        while True:
+            try:
+                conn.sendall(b"NEXT\n")
+                header = reader.readline().split()
+            except OSError:
+                # The daemon dropped the connection to restart the simulator
+                return
+            log.append(header[:1])
+            if not header or header[0] == b'QUIT':
+                return
+            job_id, size = int(header[1]), int(header[2])
+            frame = np.frombuffer(reader.read(size), dtype=np.uint8)
+            conn.sendall(reply(job_id, frame).encode())
+
+
+@pytest.fixture
+def fake_daemon(monkeypatch, tmp_path):
+    """Builds a SimulationDaemon whose workers talk to fake simulators."""
+    daemons = []
+
+    def make(reply, **kwargs):
+        spawned = []
+        log = []
+
+        def spawn(worker):
+            ours, theirs = socket.socketpair()
+            simulator = threading.Thread(target=run_fake_simulator, args=(theirs, reply, log),
+                                         daemon=True)
+            simulator.start()
+            spawned.append(simulator)
+            return ours
+
+        monkeypatch.setattr(sim_daemon._Worker, '_spawn', spawn)
+        exe = tmp_path / 'run_daemon'
+        exe.touch()
+        daemon = SimulationDaemon(sim_exec=exe, vpi_dir=tmp_path, **kwargs)
+        daemons.append(daemon)
+        return daemon, spawned, log
+
+    yield make
+    for daemon in daemons:
+        daemon.stop()
+
+
+def test_frames_round_trip(fake_daemon):
+    # The fake reports the frame's first pixel and its size as the detection
+    daemon, _, _ = fake_daemon(lambda job_id, frame: (
+        f"RESULT {job_id} 0 1 {frame[1]} {frame[2]} 255 {frame.size}\n"))
+    daemon.start()
+    assert daemon.detect(FRAME, timeout=5) == DaemonResult(True, 1, 2, 255, 4096, False)
+    assert daemon.detect(np.zeros((64, 64)), timeout=5) == DaemonResult(True, 0, 0, 255, 4096,
+                                                                         False)
+
+
+def test_timed_out_frame_is_reported(fake_daemon):
+    daemon, _, _ = fake_daemon(lambda job_id, frame: f"RESULT {job_id} 1 0 0 0 0 900000\n")
+    daemon.start()
+    result = daemon.detect(FRAME, timeout=5)
+    assert result.timed_out and not result.face_detected
+    assert result.cycles == 900000
+
+
+def test_bad_reply_fails_the_job_and_restarts_the_simulator(fake_daemon):
+    daemon, spawned, _ = fake_daemon(lambda job_id, frame: f"RESULT {job_id + 1} 0 0 0 0 0 1\n")
+    daemon.start()
+    with pytest.raises(TimeoutError, match='Unexpected reply'):
+        daemon.detect(FRAME, timeout=5)
+    for _ in range(50):
+        if len(spawned) > 1:
+            break
+        threading.Event().wait(0.05)
+    assert len(spawned) > 1
+
+
+def test_stop_sends_quit(fake_daemon):
+    daemon, spawned, log = fake_daemon(lambda job_id, frame: f"RESULT {job_id} 0 0 0 0 0 1\n")
+    daemon.start()
+    daemon.detect(FRAME, timeout=5)
+    daemon.stop()
+    spawned[0].join(5)
+    assert log == [[b'FRAME'], [b'QUIT']]
+
+
+def test_full_queue_raises_busy(fake_daemon):
+    daemon, _, _ = fake_daemon(lambda job_id, frame: "", max_pending=1)
+    # Not started, so nothing drains the queue
+    daemon.submit(FRAME)
+    assert daemon.queued == 1
+    with pytest.raises(PoolBusyError):
+        daemon.submit(FRAME)
+
+
+def test_start_requires_the_compiled_simulator(tmp_path):
+    with pytest.raises(RuntimeError, match='make compile-daemon'):
+        SimulationDaemon(sim_exec=tmp_path / 'missing').start()
@@ -0,0 +1,140 @@
+"""
+Tests for the simulation pool, with a shell script standing in for the
+simulator (interpreter=None runs it like a native Verilator build).
+"""
+
+import os
+import time
+from concurrent.futures import CancelledError
+from pathlib import Path
+
+import pytest
+
+from sim_pool import DATA_DIR, PoolBusyError, SimulationPool, make_scratch_dir
+
+# Reports where it ran, then optionally waits for a file or sleeps
+STUB = """#!/bin/sh
+pwd
+cat image.txt 2>/dev/null
+[ -e ../data/cascade_data.mem ] && echo data
+case "$1" in
+  +WAIT=*) while [ ! -e "${1#+WAIT=}" ]; do sleep 0.02; done ;;
+  +SLEEP=*) exec sleep "${1#+SLEEP=}" ;;
+esac
+"""
+
+
+@pytest.fixture
+def stub(tmp_path):
+    path = tmp_path / 'run_stub'
+    path.write_text(STUB)
+    path.chmod(0o755)
+    return path
+
+
+@pytest.fixture
+def make_pool(stub, tmp_path):
+    pools = []
+    scratch = tmp_path / 'scratch'
+    scratch.mkdir()
+
+    def make(**kwargs):
+        kwargs.setdefault('scratch_root', scratch)
+        pool = SimulationPool(sim_exec=stub, vpi_dir=None, interpreter=None, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.shutdown()
+
+
+def image(tmp_path, name):
+    path = tmp_path / f'{name}.txt'
+    path.write_text(f'{name}\n')
+    return path
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting for the pool"
+        time.sleep(0.01)
+
+
+def test_scratch_dir_links_the_rom_data(tmp_path):
+    root, workdir = make_scratch_dir('sim_test_', tmp_path)
+    assert root.parent == tmp_path
+    assert workdir == root / 'sim' and workdir.is_dir()
+    assert (root / 'data').is_symlink()
+    assert (root / 'data').resolve() == DATA_DIR
+    assert (workdir / '..' / 'data' / 'cascade_data.mem').exists()
+
+
+def test_concurrent_runs_get_private_workdirs(make_pool, tmp_path):
+    pool = make_pool(max_workers=2)
+    release = tmp_path / 'release'
+    jobs = [pool.submit(image(tmp_path, name), [f'+WAIT={release}']) for name in ('a', 'b')]
+    wait_for(lambda: pool.running == 2)
+    release.touch()
+
+    outputs = [job.result(5).stdout.split() for job in jobs]
+    assert [out[1:] for out in outputs] == [['a', 'data'], ['b', 'data']]
+    workdirs = [Path(out[0]) for out in outputs]
+    assert workdirs[0] != workdirs[1]
+    assert all(w.name == 'sim' for w in workdirs)
+
+
+def test_workdirs_are_removed_unless_kept(make_pool, tmp_path):
+    result = make_pool().submit(image(tmp_path, 'a')).result(5)
+    assert result.returncode == 0
+    assert not Path(result.stdout.split()[0]).parent.exists()
+
+    result = make_pool(keep_workdirs=True).submit(image(tmp_path, 'a')).result(5)
+    workdir = Path(result.stdout.split()[0])
+    assert (workdir / 'image.txt').read_text() == 'a\n'
+    assert (workdir.parent / 'data').is_symlink()
+
+
+def test_full_queue_raises_pool_busy(make_pool, tmp_path):
+    pool = make_pool(max_workers=1, max_pending=1)
+    release = tmp_path / 'release'
+    running = pool.submit(image(tmp_path, 'a'), [f'+WAIT={release}'], block=False)
+    wait_for(lambda: pool.running == 1)
+    queued = pool.submit(image(tmp_path, 'b'), [f'+WAIT={release}'], block=False)
+    assert pool.queued == 1
+    with pytest.raises(PoolBusyError):
+        pool.submit(image(tmp_path, 'c'), block=False)
+
+    release.touch()
+    assert running.result(5).returncode == 0
+    assert queued.result(5).returncode == 0
+    # Finished jobs hand their slots back
+    assert pool.submit(image(tmp_path, 'c'), block=False).result(5).returncode == 0
+    assert pool.queued == pool.running == 0
+
+
+def test_timeout_kills_the_simulator(make_pool, tmp_path):
+    pool = make_pool()
+    start = time.monotonic()
+    result = pool.submit(image(tmp_path, 'a'), ['+SLEEP=30'], timeout=0.5).result(10)
+    assert result.timed_out
+    assert result.returncode == -9
+    assert time.monotonic() - start < 10
+
+
+def test_cancel_drops_queued_jobs_and_kills_running_ones(make_pool, tmp_path):
+    pool = make_pool(max_workers=1)
+    running = pool.submit(image(tmp_path, 'a'), ['+SLEEP=30'])
+    wait_for(lambda: running.process is not None)
+    queued = pool.submit(image(tmp_path, 'b'))
+
+    queued.cancel()
+    with pytest.raises(CancelledError):
+        queued.result(5)
+    running.cancel()
+    result = running.result(10)
+    assert result.cancelled and not result.timed_out
+    assert result.returncode == -9
+    wait_for(lambda: pool.queued == pool.running == 0)
+    assert os.listdir(pool.scratch_root) == []
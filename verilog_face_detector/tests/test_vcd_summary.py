@@ -0,0 +1,88 @@
+"""
+Tests for the streaming VCD summary on a small handwritten trace.
+"""
+
+from vcd_summary import summarize
+
+# clk toggles every 5ns up to #40; bus goes 0, 3, x, 10, 15
+TRACE = """$timescale 1ns $end
+$scope module tb $end
+$var wire 1 ! clk $end
+$scope module dut $end
+$var wire 4 " bus [3:0] $end
+$var wire 1 ! clk $end
+$upscope $end
+$upscope $end
+$enddefinitions $end
+#0
+$dumpvars
+0!
+b0 "
+$end
+#5
+1!
+#10
+0!
+#12
+b11 "
+#15
+1!
+#18
+bx "
+#20
+0!
+#22
+b1010 "
+#25
+1!
+#30
+0!
+#35
+1!
+b1111 "
+#40
+0!
+"""
+
+
+def signals(summary):
+    return {s['name']: s for s in summary['signals']}
+
+
+def test_whole_trace():
+    summary = summarize(iter(TRACE.splitlines()))
+    assert summary['timescale'] == '1ns'
+    assert (summary['start'], summary['end']) == (0, 40)
+    clk, bus = signals(summary)['tb.clk'], signals(summary)['tb.dut.bus']
+
+    assert clk['aliases'] == ['tb.dut.clk']
+    assert (clk['changes'], clk['rises'], clk['period']) == (8, 4, 10)
+    assert clk['high_fraction'] == 0.5
+    assert (bus['width'], bus['changes'], bus['unknown']) == (4, 4, 1)
+    assert (bus['min'], bus['max']) == (0, 15)
+
+
+def test_time_window_limits_every_statistic():
+    summary = summarize(iter(TRACE.splitlines()), start=10, end=30)
+    assert (summary['start'], summary['end']) == (10, 30)
+    clk, bus = signals(summary)['tb.clk'], signals(summary)['tb.dut.bus']
+
+    # Edges at 10..30 count; clk is high over 15-20 and 25-30
+    assert (clk['changes'], clk['rises'], clk['period']) == (5, 2, 10)
+    assert clk['high_fraction'] == 0.5
+    # 0 is still held at #10, and 15 only appears after the window
+    assert (bus['changes'], bus['unknown']) == (3, 1)
+    assert (bus['min'], bus['max']) == (0, 10)
+
+
+def test_window_before_the_first_change():
+    clk = signals(summarize(iter(TRACE.splitlines()), start=1, end=4))['tb.clk']
+    assert (clk['changes'], clk['rises'], clk['high_fraction']) == (0, 0, 0)
+    assert (clk['min'], clk['max']) == (0, 0)
+
+
+def test_scope_and_match_filters():
+    scoped = summarize(iter(TRACE.splitlines()), scope='tb.dut')
+    assert sorted(signals(scoped)) == ['tb.dut.bus', 'tb.dut.clk']
+    matched = summarize(iter(TRACE.splitlines()), match='*bus*')
+    assert list(signals(matched)) == ['tb.dut.bus']
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+vcd_summary.py
+Streams a VCD trace once and prints per-signal statistics.
+
+The trace is read line by line, so its size does not matter. For each
+traced signal the summary gives:
+- value changes and unknown (x/z) values;
+- rising edges, the fraction of time high and the clock period (1-bit
+  signals);
+- the min and max value (vectors).
+
+Signals can be limited to a scope or a name pattern, and the statistics to
+a time window. Inputs ending in .gz are decompressed on the fly. FST traces
+are piped through GTKWave's fst2vcd, and '-' reads stdin.
+
+Usage:
+    python3 vcd_summary.py sim/waveform.vcd
+    python3 vcd_summary.py trace.fst --scope tb_face_detector.dut.control --top 20
+    python3 vcd_summary.py waveform.vcd --match '*cascade_addr*' --from 1000 --to 500000 --json s.json
+"""
+
+import argparse
+import fnmatch
+import gzip
+import json
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+UNSET = object()
+
+
+class SignalStats:
+    """Running statistics of one VCD identifier (all its aliases)."""
+
+    __slots__ = ('names', 'width', 'value', 'since', 'changes', 'unknown', 'rises',
+                 'first_rise', 'last_rise', 'high_time', 'min', 'max')
+
+    def __init__(self, name, width):
+        self.names = [name]
+        self.width = width
+        self.value = UNSET
+        self.since = 0
+        self.changes = 0
+        self.unknown = 0
+        self.rises = 0
+        self.first_rise = self.last_rise = None
+        self.high_time = 0
+        self.min = self.max = None
+
+    def _held(self, start, end):
+        """Accounts for the current value being held from self.since to end."""
+        lo, hi = max(self.since, start), end
+        if hi < lo or self.value is UNSET or self.value is None:
+            return
+        if self.width == 1 and self.value == 1:
+            self.high_time += hi - lo
+        if self.min is None or self.value < self.min:
+            self.min = self.value
+        if self.max is None or self.value > self.max:
+            self.max = self.value
+
+    def update(self, value, t, start, end):
+        if value == self.value:
+            return
+        if self.value is not UNSET and self.since <= end:
+            self._held(start, min(t, end))
+        if start <= t <= end and self.value is not UNSET:
+            self.changes += 1
+            if value is None:
+                self.unknown += 1
+            elif self.width == 1 and value == 1 and self.value == 0:
+                self.rises += 1
+                if self.first_rise is None:
+                    self.first_rise = t
+                self.last_rise = t
+        self.value = value
+        self.since = t
+
+    def finish(self, start, end):
+        if self.value is not UNSET and self.since <= end:
+            self._held(start, end)
+
+    def summary(self, duration):
+        record = {
+            'name': self.names[0],
+            'width': self.width,
+            'changes': self.changes,
+            'unknown': self.unknown,
+            'min': self.min,
+            'max': self.max,
+        }
+        if len(self.names) > 1:
+            record['aliases'] = self.names[1:]
+        if self.width == 1:
+            record['rises'] = self.rises
+            record['high_fraction'] = round(self.high_time / duration, 4) if duration else None
+            record['period'] = ((self.last_rise - self.first_rise) / (self.rises - 1)
+                                if self.rises > 1 else None)
+        return record
+
+
+def parse_value(text):
+    """Scalar '0'/'1'/'x', vector 'b0101' or real 'r1.5' -> number, or None if unknown."""
+    kind = text[0]
+    if kind in 'bB':
+        bits = text[1:]
+        return int(bits, 2) if bits.strip('01') == '' else None
+    if kind in 'rR':
+        return float(text[1:])
+    return int(kind) if kind in '01' else None
+
+
+def read_header(lines, scope=None, match=None):
+    """
+    Reads the declarations up to $enddefinitions. Returns (timescale,
+    {identifier: SignalStats}) for the signals that pass the filters.
+    """
+    signals = {}
+    scopes = []
+    timescale = ''
+    tokens = []
+    for line in lines:
+        tokens.extend(line.split())
+        if not tokens or tokens[-1] != '$end':
+            continue
+        keyword = tokens[0]
+        if keyword == '$scope':
+            scopes.append(tokens[2])
+        elif keyword == '$upscope':
+            scopes.pop()
+        elif keyword == '$timescale':
+            timescale = ''.join(tokens[1:-1])
+        elif keyword == '$var':
+            width, ident, name = int(tokens[2]), tokens[3], tokens[4]
+            full = '.'.join(scopes + [name])
+            if ((scope is None or full.startswith(scope + '.')) and
+                    (match is None or fnmatch.fnmatchcase(full, match))):
+                if ident in signals:
+                    signals[ident].names.append(full)
+                else:
+                    signals[ident] = SignalStats(full, width)
+        elif keyword == '$enddefinitions':
+            return timescale, signals
+        tokens = []
+    raise ValueError("No $enddefinitions in trace header")
+
+
+def summarize(lines, scope=None, match=None, start=0, end=None):
+    """Streams a VCD and returns the per-signal statistics."""
+    timescale, signals = read_header(lines, scope, match)
+    end = float('inf') if end is None else end
+    t = 0
+    changes = 0
+    dumpoff = False
+    for line in lines:
+        tokens = line.split()
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            head = token[0]
+            if head == '#':
+                t = int(token[1:])
+            elif head == '$':
+                if token == '$dumpoff':
+                    dumpoff = True
+                elif token == '$end':
+                    dumpoff = False
+            elif head in 'bBrR':
+                i += 1
+                stats = signals.get(tokens[i]) if i < len(tokens) else None
+                if stats is not None and not dumpoff:
+                    stats.update(parse_value(token), t, start, end)
+                    changes += 1
+            else:
+                stats = signals.get(token[1:])
+                if stats is not None and not dumpoff:
+                    stats.update(parse_value(head), t, start, end)
+                    changes += 1
+            i += 1
+
+    stop = min(t, end)
+    for stats in signals.values():
+        stats.finish(start, stop)
+    duration = max(stop - start, 0)
+    return {
+        'timescale': timescale,
+        'start': start,
+        'end': stop,
+        'value_changes': changes,
+        'signals': [s.summary(duration) for s in signals.values()],
+    }
+
+
+@contextmanager
+def open_trace(path):
+    """Yields the lines of a .vcd, .vcd.gz, .fst (through fst2vcd) or stdin ('-')."""
+    if path == '-':
+        yield sys.stdin
+    elif path.endswith('.fst'):
+        process = subprocess.Popen(['fst2vcd', path], stdout=subprocess.PIPE, text=True)
+        try:
+            yield process.stdout
+        finally:
+            process.stdout.close()
+            process.wait()
+    elif path.endswith('.gz'):
+        with gzip.open(path, 'rt') as f:
+            yield f
+    else:
+        with open(path) as f:
+            yield f
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a VCD/FST trace in one streaming pass')
+    parser.add_argument('trace', help='.vcd, .vcd.gz, .fst (needs fst2vcd) or - for stdin')
+    parser.add_argument('--scope', help='Only signals below this scope, e.g. tb_face_detector.dut.control')
+    parser.add_argument('--match', help='Only signals whose full name matches this glob')
+    parser.add_argument('--from', dest='start', type=int, default=0, help='Window start (trace time units)')
+    parser.add_argument('--to', dest='end', type=int, help='Window end (trace time units)')
+    parser.add_argument('--top', type=int, default=40, help='Print the N most active signals (0: all)')
+    parser.add_argument('--json', type=Path, help='Also write the full summary as JSON')
+    args = parser.parse_args()
+
+    if args.trace != '-' and not Path(args.trace).exists():
+        parser.error(f"{args.trace} not found")
+    began = time.monotonic()
+    with open_trace(args.trace) as lines:
+        summary = summarize(iter(lines), args.scope, args.match, args.start, args.end)
+    elapsed = time.monotonic() - began
+
+    signals = sorted(summary['signals'], key=lambda s: s['changes'], reverse=True)
+    print(f"{len(signals)} signals, {summary['value_changes']} value changes, "
+          f"time {summary['start']}..{summary['end']} ({summary['timescale'] or 'unknown units'}), "
+          f"read in {elapsed:.2f}s")
+    print(f"\n{'Changes':>9} {'Unknown':>7} {'Rises':>7} {'High%':>6} {'Period':>8} "
+          f"{'Min':>10} {'Max':>10}  Signal")
+    for s in signals[:args.top or None]:
+        high = f"{100 * s['high_fraction']:5.1f}%" if s.get('high_fraction') is not None else ''
+        period = f"{s['period']:8.1f}" if s.get('period') else ''
+        rises = s.get('rises', '')
+        low = '' if s['min'] is None else s['min']
+        high_value = '' if s['max'] is None else s['max']
+        print(f"{s['changes']:9d} {s['unknown']:7d} {rises:>7} {high:>6} {period:>8} "
+              f"{low!s:>10} {high_value!s:>10}  {s['name']}[{s['width']}]")
+
+    if args.json:
+        args.json.write_text(json.dumps(dict(summary, signals=signals), indent=1) + '\n')
+        print(f"\nSummary: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,11 @@
 #include <string.h>
 #include <unistd.h>
 #include <arpa/inet.h>
+#include <errno.h>
+#include <netdb.h>
 #include <sys/socket.h>
+#include <sys/time.h>
+#include <netinet/in.h>
 
 // Helper to get integer value from argument
 int get_arg_val(vpiHandle arg) {
@@ -14,14 +18,228 @@ int get_arg_val(vpiHandle arg) {
     return val.value.integer;
 }
 
+// Sends the whole buffer, retrying on partial writes. MSG_NOSIGNAL: a
+// peer that went away must not kill the simulator with SIGPIPE.
+static int send_all(int sock, const char *buf, size_t len) {
+    while (len > 0) {
+        ssize_t sent = send(sock, buf, len, MSG_NOSIGNAL);
+        if (sent <= 0)
+            return -1;
+        buf += sent;
+        len -= sent;
+    }
+    return 0;
+}
+
+// Returns the value of a "+NAME=value" plusarg, or NULL if absent
+static const char *get_plusarg(const char *prefix) {
+    s_vpi_vlog_info info;
+    size_t len = strlen(prefix);
+    int i;
+
+    if (!vpi_get_vlog_info(&info))
+        return NULL;
+    for (i = 0; i < info.argc; i++) {
+        if (info.argv[i] && strncmp(info.argv[i], prefix, len) == 0)
+            return info.argv[i] + len;
+    }
+    return NULL;
+}
+
+// Setting from a plusarg, then an environment variable, then a default
+static const char *get_setting(const char *plusarg, const char *env, const char *fallback) {
+    const char *value = get_plusarg(plusarg);
+    if (value == NULL)
+        value = getenv(env);
+    return (value != NULL && *value) ? value : fallback;
+}
+
+// A persistent TCP connection with a receive buffer, so a line and the
+// payload that follows it can be read without a syscall per byte
+typedef struct {
+    int sock;
+    int timed_out;  // Last read failed on SO_RCVTIMEO rather than EOF
+    int len;
+    int pos;
+    char buf[4096];
+} line_conn;
+
+static void conn_close(line_conn *conn) {
+    if (conn->sock >= 0)
+        close(conn->sock);
+    conn->sock = -1;
+    conn->len = conn->pos = 0;
+}
+
+// Connects to host:port; timeout_sec > 0 bounds every send and receive
+static int conn_open(line_conn *conn, const char *host, const char *port, int timeout_sec) {
+    struct addrinfo hints, *res, *ai;
+    struct timeval tv;
+    int sock = -1;
+
+    memset(&hints, 0, sizeof(hints));
+    hints.ai_family = AF_INET;
+    hints.ai_socktype = SOCK_STREAM;
+    if (getaddrinfo(host, port, &hints, &res) != 0) {
+        vpi_printf("VPI ERROR: Invalid address %s:%s\n", host, port);
+        return -1;
+    }
+
+    for (ai = res; ai != NULL; ai = ai->ai_next) {
+        if ((sock = socket(ai->ai_family, ai->ai_socktype, ai->ai_protocol)) < 0)
+            continue;
+        if (timeout_sec > 0) {
+            tv.tv_sec = timeout_sec;
+            tv.tv_usec = 0;
+            setsockopt(sock, SOL_SOCKET, SO_RCVTIMEO, &tv, sizeof(tv));
+            setsockopt(sock, SOL_SOCKET, SO_SNDTIMEO, &tv, sizeof(tv));
+        }
+        if (connect(sock, ai->ai_addr, ai->ai_addrlen) == 0)
+            break;
+        close(sock);
+        sock = -1;
+    }
+    freeaddrinfo(res);
+
+    if (sock < 0)
+        return -1;
+    conn->sock = sock;
+    conn->timed_out = 0;
+    conn->len = conn->pos = 0;
+    return 0;
+}
+
+static int conn_getc(line_conn *conn) {
+    if (conn->pos >= conn->len) {
+        conn->len = recv(conn->sock, conn->buf, sizeof(conn->buf), 0);
+        conn->pos = 0;
+        if (conn->len <= 0) {
+            conn->timed_out = conn->len < 0 && (errno == EAGAIN || errno == EWOULDBLOCK);
+            conn->len = 0;
+            return -1;
+        }
+    }
+    return (unsigned char)conn->buf[conn->pos++];
+}
+
+// Reads up to and including '\n' (stripped); returns -1 if the
+// connection closed or timed out first
+static int conn_read_line(line_conn *conn, char *out, int max) {
+    int n = 0;
+    int c;
+    while ((c = conn_getc(conn)) >= 0 && c != '\n') {
+        if (n < max - 1)
+            out[n++] = (char)c;
+    }
+    out[n] = '\0';
+    return c < 0 ? -1 : n;
+}
+
+static int conn_read_exact(line_conn *conn, unsigned char *out, int len) {
+    int i, c;
+    for (i = 0; i < len; i++) {
+        if ((c = conn_getc(conn)) < 0)
+            return -1;
+        out[i] = (unsigned char)c;
+    }
+    return 0;
+}
+
+// Reads the w x h window at (x, y) out of a 1-D, row-major image memory
+// (one pixel per word, img_width pixels per row). Pixels outside the
+// image read as 0. Returns a malloc'd buffer of w*h bytes.
+static unsigned char *read_roi_pixels(vpiHandle mem, int img_width,
+                                      int x, int y, int w, int h) {
+    s_vpi_value val;
+    vpiHandle word;
+    unsigned char *pixels;
+    int depth, r, c, px, py;
+
+    pixels = calloc((size_t)w * h, 1);
+    if (pixels == NULL)
+        return NULL;
+
+    depth = vpi_get(vpiSize, mem);
+    val.format = vpiIntVal;
+    for (r = 0; r < h; r++) {
+        py = y + r;
+        for (c = 0; c < w; c++) {
+            px = x + c;
+            if (px < 0 || py < 0 || px >= img_width || py * img_width + px >= depth)
+                continue;
+            word = vpi_handle_by_index(mem, py * img_width + px);
+            if (word == NULL)
+                continue;
+            vpi_get_value(word, &val);
+            pixels[r * w + c] = (unsigned char)val.value.integer;
+        }
+    }
+    return pixels;
+}
+
+// --------------------------------------------------------------------------
+// Emotion server client
+// --------------------------------------------------------------------------
+// One connection is opened on the first $send_roi_for_emotion and reused
+// for the rest of the simulation. Settings (plusarg, then environment):
+//   +EMOTION_HOST=<host>    / EMOTION_HOST     (default 127.0.0.1)
+//   +EMOTION_PORT=<port>    / EMOTION_PORT     (default 8888)
+//   +EMOTION_TIMEOUT=<sec>  / EMOTION_TIMEOUT  (default 10, send/receive)
+
+static line_conn emotion_conn = { .sock = -1 };
+
+static int emotion_connect(void) {
+    const char *host = get_setting("+EMOTION_HOST=", "EMOTION_HOST", "127.0.0.1");
+    const char *port = get_setting("+EMOTION_PORT=", "EMOTION_PORT", "8888");
+    int timeout = atoi(get_setting("+EMOTION_TIMEOUT=", "EMOTION_TIMEOUT", "10"));
+
+    if (conn_open(&emotion_conn, host, port, timeout) < 0) {
+        vpi_printf("VPI ERROR: Connection to %s:%s failed. Is emotion_server.py running?\n",
+                   host, port);
+        return -1;
+    }
+    return 0;
+}
+
+// Sends one request and reads the response line. A request on a reused
+// connection that the server has since closed is retried once on a new
+// one; a timeout is not retried, the server may still be working on it.
+static int emotion_request(const char *msg, size_t len, char *response, int max) {
+    int attempt, reused;
+
+    emotion_conn.timed_out = 0;
+    for (attempt = 0; attempt < 2; attempt++) {
+        reused = emotion_conn.sock >= 0;
+        if (!reused && emotion_connect() < 0)
+            return -1;
+
+        if (send_all(emotion_conn.sock, msg, len) == 0 &&
+            conn_read_line(&emotion_conn, response, max) >= 0)
+            return 0;
+
+        conn_close(&emotion_conn);
+        if (!reused || emotion_conn.timed_out)
+            break;
+    }
+    return -1;
+}
+
 // Task to send ROI to Python server
 // Usage: $send_roi_for_emotion(x, y, w, h);
-// Note: We are omitting the memory argument for simplicity in this VPI 
-// and assuming the Python side just needs coordinates or we rely on the test setup.
-// To truly send pixels, we'd need to iterate the Verilog memory array.
+//        $send_roi_for_emotion(x, y, w, h, image_mem, img_width);
+// With an image memory (1-D, row-major, one pixel per word) the face
+// window is sent as a binary payload:
+//   -> "ROI <x> <y> <w> <h> <nbytes>\n" followed by nbytes 8-bit pixels
+// Without one only "ROI <x> <y> <w> <h>\n" is sent, as before.
 static PLI_INT32 send_roi_calltf(PLI_BYTE8* user_data) {
-    vpiHandle systf_handle, args_iter, arg;
-    int x, y, w, h;
+    vpiHandle systf_handle, args_iter, arg, mem = NULL;
+    int x, y, w, h, img_width = 64;
+    unsigned char *pixels = NULL;
+    int nbytes = 0;
+    char header[128];
+    char response[1024];
+    char *msg;
+    size_t header_len;
     
     (void)user_data;  // Mark as unused to avoid warning
     
@@ -39,55 +257,247 @@ static PLI_INT32 send_roi_calltf(PLI_BYTE8* user_data) {
     arg = vpi_scan(args_iter); w = get_arg_val(arg);
     arg = vpi_scan(args_iter); h = get_arg_val(arg);
     
-    vpi_free_object(args_iter);
-    
-    vpi_printf("VPI: Sending ROI (x=%d, y=%d, w=%d, h=%d)\n", x, y, w, h);
-    
-    // Connect to Python server
-    int sock = 0;
-    struct sockaddr_in serv_addr;
-    char buffer[1024] = {0};
-    
-    if ((sock = socket(AF_INET, SOCK_STREAM, 0)) < 0) {
-        vpi_printf("VPI ERROR: Socket creation error\n");
-        return 0;
+    // Optional image memory and row width; scanning to the end of the
+    // argument list frees the iterator
+    if ((arg = vpi_scan(args_iter)) != NULL) {
+        mem = arg;
+        while ((arg = vpi_scan(args_iter)) != NULL)
+            img_width = get_arg_val(arg);
     }
     
-    serv_addr.sin_family = AF_INET;
-    serv_addr.sin_port = htons(8888);
-    
-    if(inet_pton(AF_INET, "127.0.0.1", &serv_addr.sin_addr) <= 0) {
-        vpi_printf("VPI ERROR: Invalid address\n");
-        return 0;
+    if (mem != NULL && w > 0 && h > 0) {
+        pixels = read_roi_pixels(mem, img_width, x, y, w, h);
+        if (pixels != NULL)
+            nbytes = w * h;
     }
     
-    if (connect(sock, (struct sockaddr *)&serv_addr, sizeof(serv_addr)) < 0) {
-        vpi_printf("VPI ERROR: Connection Failed. Is emotion_server.py running?\n");
+    vpi_printf("VPI: Sending ROI (x=%d, y=%d, w=%d, h=%d, %d bytes)\n", x, y, w, h, nbytes);
+    
+    // ROI command, followed by the pixel payload if we have one, in one send
+    if (nbytes > 0)
+        snprintf(header, sizeof(header), "ROI %d %d %d %d %d\n", x, y, w, h, nbytes);
+    else
+        snprintf(header, sizeof(header), "ROI %d %d %d %d\n", x, y, w, h);
+    header_len = strlen(header);
+    msg = malloc(header_len + nbytes);
+    if (msg == NULL) {
+        vpi_printf("VPI ERROR: Out of memory\n");
+        free(pixels);
         return 0;
     }
+    memcpy(msg, header, header_len);
+    if (nbytes > 0)
+        memcpy(msg + header_len, pixels, nbytes);
+    free(pixels);
     
-    // Send ROI command
-    char msg[256];
-    sprintf(msg, "ROI %d %d %d %d\n", x, y, w, h);
-    send(sock, msg, strlen(msg), 0);
-    
-    // Wait for response
-    int valread = read(sock, buffer, 1024);
-    if (valread > 0) {
-        buffer[valread] = '\0';
-        // Remove newline
-        char *pos;
-        if ((pos=strchr(buffer, '\n')) != NULL)
-            *pos = '\0';
-            
+    if (emotion_request(msg, header_len + nbytes, response, sizeof(response)) == 0) {
         vpi_printf("\n--------------------------------------------------\n");
-        vpi_printf("VPI: Received Result: %s\n", buffer);
+        vpi_printf("VPI: Received Result: %s\n", response);
         vpi_printf("--------------------------------------------------\n\n");
+    } else if (emotion_conn.timed_out) {
+        vpi_printf("VPI ERROR: Timed out waiting for the emotion server\n");
     } else {
         vpi_printf("VPI ERROR: No response from server\n");
     }
     
-    close(sock);
+    free(msg);
+    return 0;
+}
+
+// --------------------------------------------------------------------------
+// Detector daemon: job queue client
+// --------------------------------------------------------------------------
+// sim/tb_detector_daemon.v keeps one vvp process alive and pulls frames
+// from sim_daemon.py over a single persistent connection:
+//   -> "NEXT\n"
+//   <- "FRAME <job_id> <nbytes>\n" followed by nbytes 8-bit pixels, or "QUIT\n"
+//   -> "RESULT <job_id> <timed_out> <found> <x> <y> <scale> <cycles>\n"
+// The job queue address comes from +JOBQ_HOST=<ip> (default 127.0.0.1)
+// and +JOBQ_PORT=<port>.
+
+static line_conn jobq = { .sock = -1 };
+
+static int jobq_connect(void) {
+    const char *host = get_plusarg("+JOBQ_HOST=");
+    const char *port = get_plusarg("+JOBQ_PORT=");
+
+    if (port == NULL) {
+        vpi_printf("VPI ERROR: +JOBQ_PORT=<port> is required in daemon mode\n");
+        return -1;
+    }
+    // No timeout: NEXT blocks until the queue has a frame
+    if (conn_open(&jobq, host ? host : "127.0.0.1", port, 0) < 0) {
+        vpi_printf("VPI ERROR: Could not connect to job queue on port %s\n", port);
+        return -1;
+    }
+    return 0;
+}
+
+static void put_int(vpiHandle handle, int value) {
+    s_vpi_value val;
+    val.format = vpiIntVal;
+    val.value.integer = value;
+    vpi_put_value(handle, &val, NULL, vpiNoDelay);
+}
+
+// Task to fetch the next frame from the job queue
+// Usage: $fetch_frame(frame_mem, job_id);
+// Fills frame_mem (1-D, one pixel per word) and sets job_id, or sets
+// job_id to -1 when the queue is closed or unreachable.
+static PLI_INT32 fetch_frame_calltf(PLI_BYTE8* user_data) {
+    vpiHandle systf_handle, args_iter, mem, job_arg;
+    char line[256];
+    int job_id = -1, nbytes = 0, depth, i;
+    unsigned char *pixels;
+
+    (void)user_data;
+
+    systf_handle = vpi_handle(vpiSysTfCall, NULL);
+    args_iter = vpi_iterate(vpiArgument, systf_handle);
+    if (args_iter == NULL) {
+        vpi_printf("ERROR: $fetch_frame requires arguments (frame_mem, job_id)\n");
+        return 0;
+    }
+    mem = vpi_scan(args_iter);
+    job_arg = vpi_scan(args_iter);
+    vpi_free_object(args_iter);
+
+    if (jobq.sock < 0 && jobq_connect() < 0) {
+        put_int(job_arg, -1);
+        return 0;
+    }
+
+    if (send_all(jobq.sock, "NEXT\n", 5) < 0 || conn_read_line(&jobq, line, sizeof(line)) < 0) {
+        vpi_printf("VPI ERROR: Lost connection to job queue\n");
+        conn_close(&jobq);
+        put_int(job_arg, -1);
+        return 0;
+    }
+
+    if (sscanf(line, "FRAME %d %d", &job_id, &nbytes) == 2 && nbytes > 0) {
+        depth = vpi_get(vpiSize, mem);
+        pixels = malloc(nbytes);
+        if (pixels == NULL || conn_read_exact(&jobq, pixels, nbytes) < 0) {
+            vpi_printf("VPI ERROR: Incomplete frame from job queue\n");
+            free(pixels);
+            conn_close(&jobq);
+            put_int(job_arg, -1);
+            return 0;
+        }
+        for (i = 0; i < nbytes && i < depth; i++)
+            put_int(vpi_handle_by_index(mem, i), pixels[i]);
+        free(pixels);
+    } else {
+        // "QUIT" or anything unexpected ends the daemon loop
+        job_id = -1;
+    }
+
+    put_int(job_arg, job_id);
+    return 0;
+}
+
+// Task to report a detection result back to the job queue
+// Usage: $report_detection(job_id, timed_out, found, x, y, scale, cycles);
+static PLI_INT32 report_detection_calltf(PLI_BYTE8* user_data) {
+    vpiHandle systf_handle, args_iter, arg;
+    int vals[7];
+    int i;
+    char msg[256];
+
+    (void)user_data;
+
+    systf_handle = vpi_handle(vpiSysTfCall, NULL);
+    args_iter = vpi_iterate(vpiArgument, systf_handle);
+    if (args_iter == NULL) {
+        vpi_printf("ERROR: $report_detection requires 7 arguments\n");
+        return 0;
+    }
+    for (i = 0; i < 7; i++) {
+        arg = vpi_scan(args_iter);
+        if (arg == NULL) {
+            vpi_printf("ERROR: $report_detection requires 7 arguments\n");
+            return 0;
+        }
+        vals[i] = get_arg_val(arg);
+    }
+    vpi_free_object(args_iter);
+
+    if (jobq.sock < 0)
+        return 0;
+
+    snprintf(msg, sizeof(msg), "RESULT %d %d %d %d %d %d %d\n",
+             vals[0], vals[1], vals[2], vals[3], vals[4], vals[5], vals[6]);
+    if (send_all(jobq.sock, msg, strlen(msg)) < 0) {
+        vpi_printf("VPI ERROR: Could not report result to job queue\n");
+        conn_close(&jobq);
+    }
+    return 0;
+}
+
+// --------------------------------------------------------------------------
+// Packed image corpus (image_corpus.py)
+// --------------------------------------------------------------------------
+// A corpus file holds N frames as raw 8-bit pixels, back to back, so
+// frame k of a W x H corpus starts at byte k*W*H. The path comes from
+// +CORPUS=<file>; the file stays open for later frames.
+
+static FILE *corpus_file = NULL;
+
+// Task to load one frame of the corpus into an image memory
+// Usage: $load_corpus_frame(image_mem, frame_index, ok);
+// image_mem is 1-D, one pixel per word; its size is the frame size.
+// Sets ok to 1 on success, 0 otherwise.
+static PLI_INT32 load_corpus_frame_calltf(PLI_BYTE8* user_data) {
+    vpiHandle systf_handle, args_iter, mem, index_arg, ok_arg;
+    const char *path;
+    unsigned char *pixels;
+    int frame_index, depth, i;
+
+    (void)user_data;
+
+    systf_handle = vpi_handle(vpiSysTfCall, NULL);
+    args_iter = vpi_iterate(vpiArgument, systf_handle);
+    if (args_iter == NULL) {
+        vpi_printf("ERROR: $load_corpus_frame requires arguments (image_mem, frame_index, ok)\n");
+        return 0;
+    }
+    mem = vpi_scan(args_iter);
+    index_arg = vpi_scan(args_iter);
+    ok_arg = vpi_scan(args_iter);
+    if (ok_arg == NULL) {
+        vpi_printf("ERROR: $load_corpus_frame requires arguments (image_mem, frame_index, ok)\n");
+        return 0;
+    }
+    vpi_free_object(args_iter);
+
+    frame_index = get_arg_val(index_arg);
+    depth = vpi_get(vpiSize, mem);
+    put_int(ok_arg, 0);
+
+    if (corpus_file == NULL) {
+        if ((path = get_plusarg("+CORPUS=")) == NULL) {
+            vpi_printf("VPI ERROR: +CORPUS=<file> is required by $load_corpus_frame\n");
+            return 0;
+        }
+        if ((corpus_file = fopen(path, "rb")) == NULL) {
+            vpi_printf("VPI ERROR: Cannot open corpus %s\n", path);
+            return 0;
+        }
+    }
+
+    pixels = malloc(depth);
+    if (pixels == NULL || frame_index < 0 ||
+        fseek(corpus_file, (long)frame_index * depth, SEEK_SET) != 0 ||
+        fread(pixels, 1, depth, corpus_file) != (size_t)depth) {
+        vpi_printf("VPI ERROR: Corpus has no frame %d of %d pixels\n", frame_index, depth);
+        free(pixels);
+        return 0;
+    }
+
+    for (i = 0; i < depth; i++)
+        put_int(vpi_handle_by_index(mem, i), pixels[i]);
+    free(pixels);
+    put_int(ok_arg, 1);
     return 0;
 }
 
@@ -104,7 +514,38 @@ void send_roi_register(void) {
     vpi_register_systf(&tf_data);
 }
 
+void daemon_register(void) {
+    s_vpi_systf_data tf_data;
+    tf_data.type = vpiSysTask;
+    tf_data.sysfunctype = 0;
+    tf_data.compiletf = 0;
+    tf_data.sizetf = 0;
+    tf_data.user_data = 0;
+
+    tf_data.tfname = "$fetch_frame";
+    tf_data.calltf = fetch_frame_calltf;
+    vpi_register_systf(&tf_data);
+
+    tf_data.tfname = "$report_detection";
+    tf_data.calltf = report_detection_calltf;
+    vpi_register_systf(&tf_data);
+}
+
+void corpus_register(void) {
+    s_vpi_systf_data tf_data;
+    tf_data.type = vpiSysTask;
+    tf_data.sysfunctype = 0;
+    tf_data.tfname = "$load_corpus_frame";
+    tf_data.calltf = load_corpus_frame_calltf;
+    tf_data.compiletf = 0;
+    tf_data.sizetf = 0;
+    tf_data.user_data = 0;
+    vpi_register_systf(&tf_data);
+}
+
 void (*vlog_startup_routines[])(void) = {
     send_roi_register,
+    daemon_register,
+    corpus_register,
     0
 };